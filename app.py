@@ -1,4 +1,6 @@
-from genre_api.models.meta import sqlite_db as database
+from flask import request
+from genre_api.models.meta import sqlite_db as database, use_role, READ, WRITE
+from genre_api.models.group_commit import group_commit_writer
 from genre_api.api import create_app, create_api, create_routes, create_tables
 from genre_api.config.config import CONFIG
 
@@ -8,15 +10,27 @@ create_tables()
 create_routes(api)
 
 
+# Methods served by read-only connections.
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
 @app.before_request
 def before_request():
+    # With group commit, requests only read: their writes run on the writer
+    # thread.
+    if request.method in READ_METHODS or group_commit_writer is not None:
+        use_role(database, READ)
+    else:
+        use_role(database, WRITE)
     database.connect()
 
 
-@app.after_request
-def after_request(response):
-    database.close()
-    return response
+@app.teardown_request
+def teardown_request(exception):
+    # Unlike after_request, also called when the request raised. With the
+    # connection pool, closing returns the connection to the pool.
+    if not database.is_closed():
+        database.close()
 
 
 if __name__ == '__main__':
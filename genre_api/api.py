@@ -8,22 +8,35 @@ from genre_api.models.singer import Singer
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
 from genre_api.routes.genre import *
 from genre_api.routes.singer import *
 from genre_api.routes.song import *
 from genre_api.routes.playlist import *
+from genre_api.routes.database import *
+from genre_api.routes.response_cache import ResponseCacheRoute
+from genre_api.routes.export import ExportRoute
+from genre_api.routes.server_timing import register_server_timing
+from genre_api.routes.metrics import MetricsRoute, register_metrics
+from genre_api.routes.profiling import register_profiling
+from genre_api.scripts.migrate import migrate, set_schema_version, MIGRATIONS
 
 
 def create_routes(api):
     api.add_resource(SingerRoute, '/singers')
+    api.add_resource(SingerBulkRoute, '/singers/bulk')
     api.add_resource(SingerByIDRoute, '/singers/<singer_id>')
     api.add_resource(SingerSongsRoute, '/singers/<singer_id>/songs')
     api.add_resource(SingerPlaylistsRoute, '/singers/<singer_id>/playlists')
 
     api.add_resource(GenreRoute, '/genres')
+    api.add_resource(GenreBulkRoute, '/genres/bulk')
     api.add_resource(GenreByIDRoute, '/genres/<genre_id>')
 
     api.add_resource(SongRoute, '/songs')
+    api.add_resource(SongBulkRoute, '/songs/bulk')
     api.add_resource(SongByIDRoute, '/songs/<song_id>')
     api.add_resource(SongPlaylistsRoute, '/songs/<song_id>/playlists')
 
@@ -32,9 +45,19 @@ def create_routes(api):
     api.add_resource(PlaylistAddSongsRoute, '/playlists/<playlist_id>/songs')
     api.add_resource(PlaylistSingerRoute, '/playlists/<playlist_id>/singers')
 
+    api.add_resource(ExportRoute, '/export')
+
+    api.add_resource(GenreCacheRoute, '/caches/genres')
+    api.add_resource(ResponseCacheRoute, '/caches/responses')
+    api.add_resource(LockWaitsRoute, '/database/lock_waits')
+    api.add_resource(MetricsRoute, '/metrics')
+
 
 def create_app():
     app = Flask(__name__)
+    register_server_timing(app)
+    register_metrics(app)
+    register_profiling(app)
     return app
 
 
@@ -45,4 +68,17 @@ def create_api(app):
 
 def create_tables():
     with database:
-        database.create_tables([Genre, Singer, Song, Playlist, SongToPlaylist])
+        # Existing databases are migrated before the tables added since they
+        # were created, which already have the current schema.
+        new_database = not Genre.table_exists()
+        if not new_database:
+            migrate(database)
+        database.create_tables([Genre, Singer, Song, Playlist, SongToPlaylist,
+                                SingerGenreCount, PlaylistGenreCount,
+                                TableVersion])
+        if new_database:
+            set_schema_version(database, len(MIGRATIONS))
+        # Versioning genres of an existing database lets them be cached.
+        TableVersion.insert(table_name=Genre._meta.table_name, version=1)\
+                    .on_conflict_ignore()\
+                    .execute()
@@ -0,0 +1,180 @@
+import argparse
+import itertools
+import random
+import time
+from peewee import SqliteDatabase, chunked
+from genre_api.models.meta import PRAGMAS
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+# Rows generated before being inserted together.
+INSERT_CHUNK_SIZE = 10000
+
+DEFAULT_SIZES = {
+    'genres': 20,
+    'singers': 2000,
+    'songs': 50000,
+    'playlists': 2000,
+    'memberships': 100000
+}
+
+
+def zipf_cum_weights(count, exponent):
+    """
+    Get the cumulative weights of ranks 1 to count under a Zipf law, rank r
+    weighing 1 / r ** exponent, for random.choices.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent
+                                     for rank in range(1, count + 1)))
+
+
+def zipf_sizes(total, count, exponent, max_size):
+    """
+    Split total into count sizes of at least 1 and at most max_size, the
+    size of rank r being proportional to 1 / r ** exponent.
+    """
+    weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    weights_sum = sum(weights)
+
+    return [min(max_size, max(1, round(total * weight / weights_sum)))
+            for weight in weights]
+
+
+def insert_chunked(model, rows):
+    """
+    Insert rows, an iterable of row dictionaries, INSERT_CHUNK_SIZE at a
+    time.
+    """
+    for rows_chunk in chunked(rows, INSERT_CHUNK_SIZE):
+        with model._meta.database.atomic():
+            model.insert_rows(rows_chunk)
+
+
+def generate_catalog(sizes=DEFAULT_SIZES, exponent=1.1, seed=0):
+    """
+    Fill the models' database with a synthetic catalog of the given sizes,
+    the same seed always giving the same catalog.
+    Singers' number of songs, songs' popularity and playlists' size follow
+    Zipf laws of the given exponent: a few singers have most songs, a few
+    songs are in most playlists and a few playlists hold most memberships.
+    The genre counts, playlists' genre and singers' inferred genre are then
+    computed from the memberships.
+    Returns the ranks of the entities, ids by decreasing popularity, as a
+    dictionary of id lists for singers, songs and playlists.
+    """
+    rng = random.Random(seed)
+    genre_ids = range(1, sizes['genres'] + 1)
+
+    insert_chunked(Genre, ({'name': f'Genre {genre_id}'}
+                           for genre_id in genre_ids))
+
+    singer_genres = [rng.choice(genre_ids)
+                     for _ in range(sizes['singers'])]
+    insert_chunked(Singer, ({'name': f'Singer {index}', 'genre_id': genre_id,
+                             'inferred_genre_id': None}
+                            for index, genre_id in enumerate(singer_genres,
+                                                             1)))
+
+    # Singers and songs are ranked in a random order, so that popularity is
+    # not tied to ids.
+    singer_ranks = rng.sample(range(1, sizes['singers'] + 1),
+                              sizes['singers'])
+    song_singers = rng.choices(singer_ranks,
+                               cum_weights=zipf_cum_weights(sizes['singers'],
+                                                            exponent),
+                               k=sizes['songs'])
+    # Most songs share their singer's genre.
+    insert_chunked(Song, ({'title': f'Song {index}', 'singer_id': singer_id,
+                           'genre_id': singer_genres[singer_id - 1]
+                           if rng.random() < 0.8 else rng.choice(genre_ids)}
+                          for index, singer_id in enumerate(song_singers, 1)))
+
+    insert_chunked(Playlist, ({'name': f'Playlist {index}', 'genre_id': None}
+                              for index in range(1, sizes['playlists'] + 1)))
+
+    song_ranks = rng.sample(range(1, sizes['songs'] + 1), sizes['songs'])
+    song_cum_weights = zipf_cum_weights(sizes['songs'], exponent)
+    playlist_ranks = rng.sample(range(1, sizes['playlists'] + 1),
+                                sizes['playlists'])
+    # A song is in a playlist at most once: playlists hold at most half of
+    # the songs, so that drawing distinct ones stays quick.
+    playlist_sizes = zipf_sizes(sizes['memberships'], sizes['playlists'],
+                                exponent, max(1, sizes['songs'] // 2))
+
+    def generate_memberships():
+        for playlist_id, size in zip(playlist_ranks, playlist_sizes):
+            song_ids = set()
+            while len(song_ids) < size:
+                song_ids.update(rng.choices(song_ranks,
+                                            cum_weights=song_cum_weights,
+                                            k=size - len(song_ids)))
+            for song_id in sorted(song_ids):
+                yield {'song_id': song_id, 'playlist_id': playlist_id}
+
+    insert_chunked(SongToPlaylist, generate_memberships())
+
+    check_playlist_genre_counts(repair=True)
+    check_singer_genre_counts(repair=True)
+    TableVersion.bump(*MODELS)
+
+    return {
+        'singers': singer_ranks,
+        'songs': song_ranks,
+        'playlists': playlist_ranks
+    }
+
+
+def create_catalog_database(database_file, sizes=DEFAULT_SIZES,
+                            exponent=1.1, seed=0):
+    """
+    Create a database file holding a synthetic catalog, the models being
+    bound to it.
+    Returns the database, connected, and the ranks of generate_catalog.
+    """
+    database = SqliteDatabase(database_file, pragmas=PRAGMAS)
+    database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+    database.connect()
+    database.create_tables(MODELS)
+
+    return database, generate_catalog(sizes, exponent, seed)
+
+
+def add_size_arguments(parser):
+    for name, size in DEFAULT_SIZES.items():
+        parser.add_argument(f'--{name}', type=int, default=size,
+                            help=f'number of {name} generated')
+    parser.add_argument('--exponent', type=float, default=1.1,
+                        help='exponent of the Zipf laws')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random generator')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Generate a database file holding a synthetic catalog.')
+    parser.add_argument('database_file', help='path of the created database')
+    add_size_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    start_time = time.perf_counter()
+    database, _ = create_catalog_database(
+        args.database_file, {name: getattr(args, name)
+                             for name in DEFAULT_SIZES},
+        args.exponent, args.seed)
+    database.close()
+    print(f'Generated {args.database_file} in '
+          f'{time.perf_counter() - start_time:.1f}s')
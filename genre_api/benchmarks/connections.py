@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+from peewee import SqliteDatabase
+from genre_api.models.meta import (
+    HealthCheckedPooledSqliteDatabase, PRAGMAS)
+
+QUERY = 'SELECT id, name FROM genre WHERE id = ?'
+
+
+def create_database_file(database_file, rows_count):
+    """
+    Create a genre table of rows_count rows in database_file.
+    """
+    database = SqliteDatabase(database_file, pragmas=PRAGMAS)
+    with database:
+        database.execute_sql(
+            'CREATE TABLE genre (id INTEGER PRIMARY KEY, name TEXT)')
+        with database.atomic():
+            for row_id in range(1, rows_count + 1):
+                database.execute_sql('INSERT INTO genre VALUES (?, ?)',
+                                     (row_id, f'Genre {row_id}'))
+
+
+def time_per_request(database, requests_count, rows_count):
+    """
+    Get the mean time of a request connecting, reading a row and closing,
+    like the app's request hooks do.
+    """
+    start_time = time.perf_counter()
+    for request_id in range(requests_count):
+        database.connect()
+        database.execute_sql(QUERY, (request_id % rows_count + 1,)).fetchone()
+        database.close()
+
+    return (time.perf_counter() - start_time) / requests_count
+
+
+def benchmark_connections(requests_count, rows_count):
+    """
+    Compare connecting on every request with the connection pool.
+    """
+    with tempfile.TemporaryDirectory() as database_dir:
+        database_file = os.path.join(database_dir, 'benchmark.db')
+        create_database_file(database_file, rows_count)
+
+        before = time_per_request(
+            SqliteDatabase(database_file, pragmas=PRAGMAS),
+            requests_count, rows_count)
+        pool = HealthCheckedPooledSqliteDatabase(
+            database_file, pragmas=PRAGMAS, max_connections=1,
+            check_same_thread=False)
+        after = time_per_request(pool, requests_count, rows_count)
+        pool.close_all()
+
+    return {
+        'requests': requests_count,
+        'connect_seconds_per_request': before,
+        'pool_seconds_per_request': after,
+        'saving_seconds_per_request': before - after
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark connecting on every request against the '
+                    'connection pool.')
+    parser.add_argument('--requests', type=int, default=5000,
+                        help='number of requests simulated per mode')
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='number of rows of the queried table')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    result = benchmark_connections(args.requests, args.rows)
+    print(f"connect {result['connect_seconds_per_request'] * 1e6:>8.1f} "
+          f"us/request")
+    print(f"pool    {result['pool_seconds_per_request'] * 1e6:>8.1f} "
+          f"us/request")
+    print(f"saving  {result['saving_seconds_per_request'] * 1e6:>8.1f} "
+          f"us/request")
@@ -0,0 +1,91 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from playhouse.pool import PooledSqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.meta import PRAGMAS
+from genre_api.models.group_commit import GroupCommitWriter
+
+
+def time_writes(database, write, threads_count, writes_count):
+    """
+    Get the writes per second rate of threads_count threads each calling
+    write writes_count times.
+    """
+    def write_many(thread_id):
+        for write_id in range(writes_count):
+            write(f'Genre {thread_id} {write_id}')
+
+    threads = [threading.Thread(target=write_many, args=(thread_id,))
+               for thread_id in range(threads_count)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return threads_count * writes_count / (time.perf_counter() - start_time)
+
+
+def benchmark_group_commit(threads_count, writes_count, max_batch, max_delay):
+    """
+    Compare one transaction per write with the group commit writer.
+    """
+    rates = {}
+    for mode in ('transaction', 'group_commit'):
+        with tempfile.TemporaryDirectory() as database_dir:
+            database = PooledSqliteDatabase(
+                os.path.join(database_dir, 'benchmark.db'),
+                pragmas=dict(PRAGMAS, busy_timeout=60000),
+                max_connections=threads_count + 1, check_same_thread=False)
+            database.bind([Genre])
+            with database.connection_context():
+                database.create_tables([Genre])
+
+            if mode == 'transaction':
+                def write(name):
+                    with database.connection_context(), database.atomic():
+                        Genre.create(name=name)
+            else:
+                writer = GroupCommitWriter(database, max_batch, max_delay)
+
+                def write(name):
+                    writer.submit(Genre.create, name=name).result()
+
+            rates[mode] = time_writes(database, write, threads_count,
+                                      writes_count)
+            database.close_all()
+
+    return {
+        'writes': threads_count * writes_count,
+        'transaction_writes_per_second': rates['transaction'],
+        'group_commit_writes_per_second': rates['group_commit'],
+        'speedup': rates['group_commit'] / rates['transaction']
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark one transaction per write against the group '
+                    'commit writer.')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='number of concurrent writing threads')
+    parser.add_argument('--writes', type=int, default=200,
+                        help='number of writes per thread')
+    parser.add_argument('--max-batch', type=int, default=64,
+                        help='maximum number of writes per commit')
+    parser.add_argument('--max-delay', type=float, default=0.002,
+                        help='seconds a batch waits for more writes')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    result = benchmark_group_commit(args.threads, args.writes, args.max_batch,
+                                    args.max_delay)
+    print(f"transaction  {result['transaction_writes_per_second']:>10,.0f} "
+          f"writes/s")
+    print(f"group commit {result['group_commit_writes_per_second']:>10,.0f} "
+          f"writes/s  x{result['speedup']:.1f}")
@@ -0,0 +1,93 @@
+import argparse
+import json
+import time
+from flask_restful import marshal
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.routes.serializers import Serializer
+
+MODELS = [Genre, Singer, Song, Playlist]
+
+
+def generate_rows(model, rows_count):
+    """
+    Generate rows shaped like the ones the routes select for model, every
+    other foreign key being NULL.
+    """
+    rows = []
+    for row_id in range(1, rows_count + 1):
+        row = {}
+        for key, field in model.resource_fields.items():
+            if key == 'id':
+                row[key] = row_id
+            elif key.endswith('_id'):
+                row[key] = row_id % 50 if row_id % 2 else None
+            else:
+                row[key] = f'{model.__name__} {row_id} é'
+        rows.append(row)
+
+    return rows
+
+
+def time_rows_per_second(serialize, rows, repeat):
+    """
+    Get the best rows per second rate of serialize(rows) over repeat runs.
+    """
+    best_time = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        serialize(rows)
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return len(rows) / best_time
+
+
+def benchmark_serializers(rows_count, repeat):
+    """
+    Compare, for every model, flask_restful's marshal followed by json.dumps
+    with the model's compiled serializer.
+    Returns a list of results, one per model.
+    """
+    results = []
+    for model in MODELS:
+        rows = generate_rows(model, rows_count)
+        serializer = Serializer(model.resource_fields)
+
+        def marshal_dumps(rows):
+            return json.dumps(marshal(rows, model.resource_fields)) + '\n'
+
+        if marshal_dumps(rows) != serializer.dumps(rows):
+            raise AssertionError(f'{model.__name__} serializer output differs')
+
+        before = time_rows_per_second(marshal_dumps, rows, repeat)
+        after = time_rows_per_second(serializer.dumps, rows, repeat)
+        results.append({
+            'model': model.__name__,
+            'rows': rows_count,
+            'marshal_rows_per_second': before,
+            'compiled_rows_per_second': after,
+            'speedup': after / before
+        })
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the compiled serializers against marshal.')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='number of rows serialized per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs, the best one being kept')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    for result in benchmark_serializers(args.rows, args.repeat):
+        print(f"{result['model']:<10} "
+              f"marshal {result['marshal_rows_per_second']:>12,.0f} rows/s  "
+              f"compiled {result['compiled_rows_per_second']:>12,.0f} "
+              f"rows/s  x{result['speedup']:.1f}")
@@ -0,0 +1,200 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from genre_api.api import create_app, create_api, create_routes
+from genre_api.models.singer import Singer
+from genre_api.benchmarks.catalog import (
+    DEFAULT_SIZES, create_catalog_database, add_size_arguments)
+from genre_api.scripts.calc_inferred_genre import calc_inferred_genre_engine
+
+# Relative slowdown of a benchmark's median over its baseline reported as a
+# regression.
+DEFAULT_THRESHOLD = 0.2
+
+
+def get_route_urls(ranks):
+    """
+    Get the URL of every route benchmark, the routes about a singer, song or
+    playlist being called for the most popular one.
+    """
+    singer_id = ranks['singers'][0]
+    song_id = ranks['songs'][0]
+    playlist_id = ranks['playlists'][0]
+
+    return {
+        'genres': '/genres',
+        'songs_page': '/songs?limit=100',
+        'singer_songs': f'/singers/{singer_id}/songs',
+        'singer_playlists': f'/singers/{singer_id}/playlists',
+        'song_playlists': f'/songs/{song_id}/playlists',
+        'playlist_songs': f'/playlists/{playlist_id}/songs',
+        'playlist_songs_stream': f'/playlists/{playlist_id}/songs?stream=1',
+        'playlist_singers': f'/playlists/{playlist_id}/singers'
+    }
+
+
+def summarize(durations):
+    """
+    Summarize a list of durations in seconds, in milliseconds.
+    """
+    durations = sorted(durations)
+
+    return {
+        'runs': len(durations),
+        'median_ms': statistics.median(durations) * 1000,
+        # Nearest rank percentile.
+        'p95_ms': durations[math.ceil(0.95 * len(durations)) - 1] * 1000,
+        'min_ms': durations[0] * 1000
+    }
+
+
+def time_calls(function, repeat, warmup):
+    """
+    Get the durations in seconds of repeat calls of function, after warmup
+    calls which are not timed.
+    """
+    for _ in range(warmup):
+        function()
+
+    durations = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start_time)
+
+    return durations
+
+
+def benchmark_routes(client, urls, repeat, warmup):
+    """
+    Time GET requests of every URL through the Flask test client, body
+    included.
+    """
+    results = {}
+    for name, url in urls.items():
+        def get():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise AssertionError(f'{url} answered {response.status_code}')
+            # Streamed bodies are produced while being read.
+            response.get_data()
+
+        results[f'route:{name}'] = summarize(time_calls(get, repeat, warmup))
+
+    return results
+
+
+def benchmark_inference(repeat):
+    """
+    Time the engine mode of calc_inferred_genre computing every singer's
+    inferred genre, from singers without one.
+    """
+    durations = []
+    for _ in range(repeat):
+        Singer.update(inferred_genre_id=None).execute()
+        start_time = time.perf_counter()
+        calc_inferred_genre_engine()
+        durations.append(time.perf_counter() - start_time)
+
+    return {'inference:engine': summarize(durations)}
+
+
+def run_suite(sizes=DEFAULT_SIZES, exponent=1.1, seed=0, repeat=50,
+              warmup=5):
+    """
+    Generate a synthetic catalog in a temporary database and run every
+    benchmark on it.
+    Returns the benchmark parameters and results, ready to be dumped as
+    JSON.
+    """
+    app = create_app()
+    create_routes(create_api(app))
+    client = app.test_client()
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        database, ranks = create_catalog_database(
+            os.path.join(database_dir, 'benchmark.db'), sizes, exponent, seed)
+        try:
+            results = benchmark_routes(client, get_route_urls(ranks), repeat,
+                                       warmup)
+            results.update(benchmark_inference(max(1, repeat // 10)))
+        finally:
+            database.close()
+
+    return {
+        'parameters': {
+            'sizes': sizes,
+            'exponent': exponent,
+            'seed': seed,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the median of every benchmark of report with the one of
+    baseline, a report of an earlier run.
+    Returns a list of (name, baseline median, median, relative change,
+    regressed) tuples, regressed telling whether the change exceeds
+    threshold. Benchmarks missing from baseline are left out.
+    """
+    comparisons = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        baseline_median = baseline['results'][name]['median_ms']
+        change = result['median_ms'] / baseline_median - 1
+        comparisons.append((name, baseline_median, result['median_ms'],
+                            change, change > threshold))
+
+    return comparisons
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the routes and the inferred genre computation '
+                    'on a synthetic catalog.')
+    add_size_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=50,
+                        help='number of timed runs per route')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='number of untimed runs per route')
+    parser.add_argument('--output', help='file the JSON report is written to')
+    parser.add_argument('--baseline',
+                        help='JSON report of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown reported as a regression')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = run_suite({name: getattr(args, name) for name in DEFAULT_SIZES},
+                       args.exponent, args.seed, args.repeat, args.warmup)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if not args.baseline:
+        for name, result in report['results'].items():
+            print(f"{name:<30} median {result['median_ms']:>9.3f} ms  "
+                  f"p95 {result['p95_ms']:>9.3f} ms")
+        sys.exit(0)
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline['parameters'] != report['parameters']:
+        print('Warning: the baseline ran with other parameters')
+    comparisons = compare(report, baseline, args.threshold)
+    for name, baseline_median, median, change, regressed in comparisons:
+        print(f"{name:<30} {baseline_median:>9.3f} ms -> {median:>9.3f} ms  "
+              f"{change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    if any(regressed for *_, regressed in comparisons):
+        sys.exit(1)
@@ -0,0 +1,124 @@
+import threading
+import time
+from flask import g, has_request_context
+from flask_restful_swagger import swagger
+from flask_restful import fields as flask_fields
+from genre_api.config.config import CONFIG
+from genre_api.models.genre import Genre
+from genre_api.models.table_version import TableVersion
+
+GENRE_CACHE_CONFIG = CONFIG.get('genre_cache', {})
+
+
+@swagger.model
+class GenreCacheStats:
+    resource_fields = {
+        'hits': flask_fields.Integer(),
+        'misses': flask_fields.Integer(),
+        'hit_ratio': flask_fields.Float(),
+        'version': flask_fields.Integer(),
+        'size': flask_fields.Integer()
+    }
+
+
+class GenreCache:
+    """
+    In-process cache of the genre table, loaded lazily.
+    Every lookup compares the cached version with the genre table version
+    stored in the database, read at most once per request and, when
+    check_interval is set, once every check_interval seconds, so that writes
+    made by other worker processes are seen. Writes made by this process
+    invalidate the cache directly.
+    A table that was never versioned is not cached, since nothing would tell
+    when it changes.
+    """
+
+    def __init__(self, check_interval=0):
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._genres = None
+        self._version = None
+        self._checked_at = 0
+
+    def _get_version(self):
+        if has_request_context():
+            if 'genre_table_version' not in g:
+                g.genre_table_version = TableVersion.get_version(Genre)
+            return g.genre_table_version
+
+        return TableVersion.get_version(Genre)
+
+    def _get_genres(self):
+        """
+        Get the cached genres by id, reloading them when they are stale.
+        """
+        genres = self._genres
+        if genres is not None and \
+                time.monotonic() - self._checked_at < self.check_interval:
+            self.hits += 1
+            return genres
+
+        version = self._get_version()
+        if genres is not None and version is not None and \
+                version == self._version:
+            self._checked_at = time.monotonic()
+            self.hits += 1
+            return genres
+
+        self.misses += 1
+        query = Genre.select().order_by(Genre.id).dicts()
+        genres = {genre['id']: genre for genre in query}
+        if version is not None:
+            with self._lock:
+                self._genres = genres
+                self._version = version
+                self._checked_at = time.monotonic()
+
+        return genres
+
+    def get(self, genre_id):
+        """
+        Get a genre by id, None when it does not exist.
+        """
+        try:
+            genre_id = int(genre_id)
+        except (TypeError, ValueError):
+            return None
+
+        return self._get_genres().get(genre_id)
+
+    def get_all(self):
+        """
+        Get every genre, ordered by id.
+        """
+        return list(self._get_genres().values())
+
+    def existing_ids(self, genre_ids):
+        """
+        Get the subset of genre_ids found in the genre table.
+        """
+        genres = self._get_genres()
+
+        return {genre_id for genre_id in genre_ids if genre_id in genres}
+
+    def invalidate(self):
+        with self._lock:
+            self._genres = None
+            self._version = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'version': self._version,
+            'size': len(self._genres) if self._genres is not None else 0
+        }
+
+
+genre_cache = GenreCache(
+    check_interval=GENRE_CACHE_CONFIG.get('check_interval', 0))
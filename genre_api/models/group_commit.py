@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from genre_api.config.config import CONFIG
+from genre_api.models.meta import sqlite_db
+
+GROUP_COMMIT_CONFIG = CONFIG.get('group_commit', {})
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread running the writes submitted by concurrent requests
+    and committing them together, once max_batch writes are collected or
+    max_delay seconds after the first one.
+    Every write runs in its own savepoint, so that a failing write is rolled
+    back and gets its error without affecting the others of its batch.
+    Results are only delivered once their batch is committed.
+    """
+
+    def __init__(self, database, max_batch=64, max_delay=0.002):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue a call of function in a write transaction.
+        Returns a Future of its result.
+        """
+        with self._thread_lock:
+            # Started lazily, so that worker processes forked after import
+            # each get their own thread.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+
+        future = Future()
+        self._queue.put((function, args, kwargs, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+        try:
+            with self.database.connection_context(), self.database.atomic():
+                for function, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with self.database.atomic():
+                            result = function(*args, **kwargs)
+                    except Exception as error:
+                        future.set_exception(error)
+                    else:
+                        results.append((future, result))
+        except Exception as error:
+            # Nothing of the batch was committed.
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.writes += len(results)
+        for future, result in results:
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'writes_per_batch': self.writes / self.batches
+            if self.batches else 0.0
+        }
+
+
+group_commit_writer = GroupCommitWriter(
+    sqlite_db,
+    max_batch=GROUP_COMMIT_CONFIG.get('max_batch', 64),
+    max_delay=GROUP_COMMIT_CONFIG.get('max_delay', 0.002)
+) if GROUP_COMMIT_CONFIG.get('enabled', False) else None
+
+
+def run_write(database, function, *args, **kwargs):
+    """
+    Call function in a write transaction of database and return its result.
+    The call goes through the group commit writer when it is enabled for
+    database, and runs in the current thread otherwise.
+    """
+    writer = group_commit_writer
+    if writer is not None and writer.database is database and \
+            not writer.in_writer_thread():
+        return writer.submit(function, *args, **kwargs).result()
+
+    with database.atomic():
+        return function(*args, **kwargs)
@@ -0,0 +1,13 @@
+from peewee import *
+from genre_api.models.meta import BaseModel
+
+
+class ImportCheckpoint(BaseModel):
+    """
+    Number of records of a catalog file already imported, written in the
+    transaction importing them, so that an interrupted import resumes right
+    after the last committed chunk.
+    """
+    source = CharField(primary_key=True)
+    records = IntegerField(default=0)
+    updated_at = DateTimeField(null=True)
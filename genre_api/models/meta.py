@@ -1,13 +1,387 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
 from peewee import *
+from playhouse.pool import PooledSqliteDatabase, MaxConnectionsExceeded
+from flask_restful_swagger import swagger
+from flask_restful import fields as flask_fields
+from genre_api.config.config import CONFIG
+from genre_api.models.slow_query_log import create_slow_query_log
 
 DATABASE_FILE = 'db/genre_api.db'
+DATABASE_CONFIG = CONFIG.get('database', {})
+SLOW_QUERY_CONFIG = CONFIG.get('slow_query_log', {})
 
-sqlite_db = SqliteDatabase(DATABASE_FILE, pragmas={
+# Default SQLITE_MAX_VARIABLE_NUMBER for SQLite builds older than 3.32.
+SQLITE_MAX_VARIABLE_NUMBER = 999
+
+PRAGMAS = {
     'journal_mode': 'wal',
     'cache_size': -1 * 64000,  # 64MB
-})
+}
+
+# Connection roles of ReadWriteSqliteDatabase.
+READ = 'read'
+WRITE = 'write'
+
+
+class QueryTimer(threading.local):
+    """
+    Statements executed by the current thread between start and stop, as
+    (sql, params, seconds) tuples.
+    """
+
+    def __init__(self):
+        self.statements = None
+
+    def start(self):
+        self.statements = []
+
+    def stop(self):
+        statements = self.statements
+        self.statements = None
+        return statements or []
+
+    def record(self, sql, params, seconds):
+        if self.statements is not None:
+            self.statements.append((sql, params, seconds))
+
+
+query_timer = QueryTimer()
+
+
+class TimedSqliteDatabase(SqliteDatabase):
+    """
+    SQLite database timing every statement it executes for query_timer, and
+    logging those exceeding the threshold of slow_query_log when set.
+    Only the execution up to the first row is timed, rows being fetched
+    from the cursor afterwards.
+    """
+
+    slow_query_log = None
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start_time
+            query_timer.record(sql, params, seconds)
+            if self.slow_query_log is not None and \
+                    seconds >= self.slow_query_log.threshold and \
+                    not self.is_closed():
+                self.slow_query_log.record(self.connection(), sql, params,
+                                           seconds)
+
+
+class HealthCheckedPooledSqliteDatabase(PooledSqliteDatabase,
+                                        TimedSqliteDatabase):
+    """
+    Pool of SQLite connections kept open between requests, so that they keep
+    their pragmas and page cache.
+    A connection is pinged when checked out, a broken one being replaced by a
+    new connection, and a connection left inside a transaction is rolled
+    back when returned.
+    """
+
+    def _is_closed(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return True
+
+        return False
+
+    def _can_reuse(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            return False
+
+        return True
+
+    def connection_counts(self):
+        """
+        Get the number of connections in use and idle, by (role, state).
+        """
+        with self._lock:
+            return {(WRITE, 'in_use'): len(self._in_use),
+                    (WRITE, 'idle'): len(self._connections)}
+
+
+@swagger.model
+class LockWait:
+    resource_fields = {
+        'lock': flask_fields.String(),
+        'count': flask_fields.Integer(),
+        'timeouts': flask_fields.Integer(),
+        'total_seconds': flask_fields.Float(),
+        'max_seconds': flask_fields.Float()
+    }
+
+
+class LockWaitStats:
+    """
+    Thread safe counters of the time spent waiting for locks, by lock name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waits = {}
+
+    def record(self, lock, seconds, acquired=True):
+        with self._lock:
+            wait = self._waits.setdefault(lock, {
+                'lock': lock,
+                'count': 0,
+                'timeouts': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0
+            })
+            wait['count'] += 1
+            wait['timeouts'] += not acquired
+            wait['total_seconds'] += seconds
+            wait['max_seconds'] = max(wait['max_seconds'], seconds)
+
+    def stats(self):
+        with self._lock:
+            return [dict(wait) for _, wait in sorted(self._waits.items())]
+
+
+class RoleSqliteDatabase(TimedSqliteDatabase):
+    """
+    SQLite database whose connections take the role set by the current
+    thread, read connections being opened read-only with query_only set.
+    The role defaults to WRITE.
+    """
+
+    def __init__(self, database, *args, **kwargs):
+        self._role_state = threading.local()
+        super().__init__(database, *args, **kwargs)
+
+    @property
+    def role(self):
+        return getattr(self._role_state, 'role', WRITE)
+
+    @role.setter
+    def role(self, role):
+        self._role_state.role = role
+
+    def _connect(self):
+        if self.role != READ:
+            return super()._connect()
+
+        uri = f'file:{pathname2url(os.path.abspath(self.database))}?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=self._timeout,
+                               isolation_level=None, **self.connect_params)
+        try:
+            self._add_conn_hooks(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _set_pragmas(self, conn):
+        super()._set_pragmas(conn)
+        if self.role == READ:
+            conn.execute('PRAGMA query_only = 1')
+
+
+class ReadWriteSqliteDatabase(HealthCheckedPooledSqliteDatabase,
+                              RoleSqliteDatabase):
+    """
+    Connection pool split by role: any number of read-only connections, which
+    WAL lets read while a write is in progress, and writer_connections write
+    connections, one by default, so that writers queue on the pool rather
+    than on SQLite's database lock.
+    Write transactions begin IMMEDIATE, taking the write lock upfront instead
+    of failing to upgrade a read lock. The time spent waiting for a write
+    connection and for the write lock is recorded in lock_waits.
+    """
+
+    def __init__(self, database, writer_connections=1, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self._role_connections = {READ: [], WRITE: []}
+        self._connections = self._role_connections[WRITE]
+        self._connection_roles = {}
+        self._writer_semaphore = threading.BoundedSemaphore(
+            writer_connections)
+        self.lock_waits = LockWaitStats()
+
+    def connect(self, reuse_if_open=False):
+        if self.role != WRITE or not self.is_closed():
+            return super().connect(reuse_if_open)
+
+        start_time = time.perf_counter()
+        wait_timeout = self._wait_timeout
+        if wait_timeout is not None and math.isinf(wait_timeout):
+            wait_timeout = None
+        acquired = self._writer_semaphore.acquire(timeout=wait_timeout)
+        self.lock_waits.record('writer_connection',
+                               time.perf_counter() - start_time, acquired)
+        if not acquired:
+            raise MaxConnectionsExceeded('Timed out waiting for a writer '
+                                         'connection.')
+        try:
+            return super().connect(reuse_if_open)
+        except Exception:
+            self._writer_semaphore.release()
+            raise
+
+    def close(self):
+        writer = not self.is_closed() and \
+            self._connection_roles.get(id(self._state.conn)) == WRITE
+        try:
+            return super().close()
+        finally:
+            if writer and self.is_closed():
+                self._writer_semaphore.release()
+
+    def begin(self, lock_type=None):
+        if self.role != WRITE:
+            return super().begin(lock_type)
+
+        start_time = time.perf_counter()
+        try:
+            super().begin(lock_type or 'IMMEDIATE')
+        except OperationalError:
+            self.lock_waits.record('write_lock',
+                                   time.perf_counter() - start_time, False)
+            raise
+        self.lock_waits.record('write_lock', time.perf_counter() - start_time)
+
+    def _connect(self):
+        # The pool's idle connections are swapped by role, under the lock
+        # held by connect and close.
+        role = self.role
+        self._connections = self._role_connections[role]
+        conn = super()._connect()
+        self._connection_roles[id(conn)] = role
+        return conn
+
+    def _close(self, conn, close_conn=False):
+        role = self._connection_roles.get(id(conn), WRITE)
+        if close_conn:
+            self._connection_roles.pop(id(conn), None)
+        self._connections = self._role_connections[role]
+        super()._close(conn, close_conn)
+
+    def connection_counts(self):
+        with self._lock:
+            counts = {(role, state): 0 for role in (READ, WRITE)
+                      for state in ('in_use', 'idle')}
+            for key in self._in_use:
+                counts[(self._connection_roles.get(key, WRITE),
+                        'in_use')] += 1
+            for role, connections in self._role_connections.items():
+                counts[(role, 'idle')] = len(connections)
+
+        return counts
+
+    def close_idle(self):
+        with self._lock:
+            for connections in self._role_connections.values():
+                for _, conn in connections:
+                    self._close(conn, close_conn=True)
+                connections.clear()
+
+    def close_all(self):
+        self.close()
+        self.close_idle()
+        with self._lock:
+            for pool_conn in list(self._in_use.values()):
+                self._close(pool_conn.connection, close_conn=True)
+            self._in_use = {}
+
+
+def use_role(database, role):
+    """
+    Make the next connections of database opened by the current thread take
+    role, when database splits its connections by role.
+    """
+    if isinstance(database, RoleSqliteDatabase):
+        database.role = role
+
+
+def create_database(database_file, config):
+    """
+    Create the database of database_file, pooling its connections unless
+    the pool setting of config is false, and splitting them between reads
+    and writes unless its read_write_split setting is false.
+    """
+    pragmas = dict(PRAGMAS,
+                   busy_timeout=int(config.get('busy_timeout', 5) * 1000))
+    if not config.get('pool', True):
+        return TimedSqliteDatabase(database_file, pragmas=pragmas)
+
+    pool_settings = {
+        'pragmas': pragmas,
+        'max_connections': config.get('max_connections', 8),
+        'stale_timeout': config.get('max_age', 300),
+        'timeout': config.get('pool_timeout', 10),
+        # Pooled connections are handed from one thread to another.
+        'check_same_thread': False
+    }
+    if not config.get('read_write_split', True):
+        return HealthCheckedPooledSqliteDatabase(database_file,
+                                                 **pool_settings)
+
+    return ReadWriteSqliteDatabase(
+        database_file,
+        writer_connections=config.get('writer_connections', 1),
+        **pool_settings)
+
+
+sqlite_db = create_database(DATABASE_FILE, DATABASE_CONFIG)
+sqlite_db.slow_query_log = create_slow_query_log(SLOW_QUERY_CONFIG)
 
 
 class BaseModel(Model):
     class Meta:
         database = sqlite_db
+
+    @classmethod
+    def existing_ids(cls, ids):
+        """
+        Get the subset of ids found in the model's table, looking them up
+        SQLITE_MAX_VARIABLE_NUMBER at a time.
+        """
+        primary_key = cls._meta.primary_key
+        found_ids = set()
+        for ids_chunk in chunked(ids, SQLITE_MAX_VARIABLE_NUMBER):
+            query = cls.select(primary_key)\
+                       .where(primary_key.in_(ids_chunk))\
+                       .tuples()
+            found_ids.update(found_id for found_id, in query)
+
+        return found_ids
+
+    @classmethod
+    def insert_rows(cls, rows):
+        """
+        Insert rows, dictionaries of field values without primary key, with
+        as few INSERT statements as SQLITE_MAX_VARIABLE_NUMBER allows.
+        Primary keys are assigned after the highest existing one, which must
+        therefore be called in a write transaction.
+        Returns the rows with their primary key, in the same order.
+        """
+        if not rows:
+            return []
+
+        primary_key = cls._meta.primary_key
+        first_id = (cls.select(fn.MAX(primary_key)).scalar() or 0) + 1
+        rows = [dict(row, **{primary_key.name: first_id + index})
+                for index, row in enumerate(rows)]
+        fields = [cls._meta.fields[name] for name in rows[0]]
+        for rows_chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER //
+                                  len(fields)):
+            cls.insert_many([tuple(row[field.name] for field in fields)
+                             for row in rows_chunk],
+                            fields=fields)\
+               .execute()
+
+        return rows
@@ -0,0 +1,52 @@
+from peewee import *
+from genre_api.models.meta import BaseModel, SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.genre import Genre
+from genre_api.models.playlist import Playlist
+
+
+class PlaylistGenreCount(BaseModel):
+    """
+    Number of songs of a genre in a playlist.
+    Kept up to date with the songs added to playlists, so that a playlist's
+    genre never needs a scan of all its songs.
+    """
+    playlist_id = ForeignKeyField(Playlist, backref='genre_counts')
+    genre_id = ForeignKeyField(Genre, backref='playlist_counts')
+    song_count = IntegerField(default=0)
+
+    class Meta:
+        primary_key = CompositeKey('playlist_id', 'genre_id')
+
+    @classmethod
+    def add_songs(cls, playlist_id, genre_count_dict):
+        """
+        Add to a playlist's counts the songs counted by genre id in
+        genre_count_dict.
+        """
+        rows = [(playlist_id, genre_id, song_count)
+                for genre_id, song_count in genre_count_dict.items()]
+        # Every row binds three variables.
+        for rows_chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER // 3):
+            cls.insert_many(rows_chunk, fields=[cls.playlist_id, cls.genre_id,
+                                                cls.song_count])\
+               .on_conflict(
+                   conflict_target=[cls.playlist_id, cls.genre_id],
+                   update={cls.song_count: cls.song_count +
+                           EXCLUDED.song_count})\
+               .execute()
+
+    @classmethod
+    def playlist_genre(cls, playlist_id):
+        """
+        Get the genre most songs of a playlist have, ties going to the lowest
+        genre id. Returns None for a playlist without songs.
+        """
+        query = cls.select(cls.genre_id)\
+                   .where(cls.playlist_id == playlist_id)\
+                   .order_by(cls.song_count.desc(), cls.genre_id)\
+                   .limit(1)\
+                   .tuples()
+        for genre_id, in query:
+            return genre_id
+
+        return None
@@ -44,3 +44,27 @@ class SingerPutSchema(Schema):
     name = fields.String(required=True)
     genre_id = fields.Integer(required=True)
     inferred_genre_id = fields.Integer(required=True)
+
+
+@swagger.model
+class SingerPatchSchema(Schema):
+    resource_fields = {
+        'id': flask_fields.Integer(),
+        'name': flask_fields.String(),
+        'genre_id': flask_fields.Integer(),
+        'inferred_genre_id': flask_fields.Integer()
+    }
+
+    id = fields.Integer(required=True)
+    name = fields.String()
+    genre_id = fields.Integer()
+    inferred_genre_id = fields.Integer(allow_none=True)
+
+
+@swagger.model
+class SingerPatchStatus:
+    resource_fields = {
+        'id': flask_fields.Integer(),
+        'status': flask_fields.Integer(),
+        'message': flask_fields.String()
+    }
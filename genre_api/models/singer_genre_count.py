@@ -0,0 +1,96 @@
+from peewee import *
+from genre_api.models.meta import BaseModel, SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.song_to_playlist import SongToPlaylist
+
+
+class SingerGenreCount(BaseModel):
+    """
+    Number of distinct playlists of a genre a singer appears in.
+    Kept up to date by the routes adding songs to playlists and changing
+    playlists' genre, so that singers' inferred genre never needs a full
+    rescan.
+    """
+    singer_id = ForeignKeyField(Singer, backref='genre_counts')
+    genre_id = ForeignKeyField(Genre, backref='singer_counts')
+    playlist_count = IntegerField(default=0)
+
+    class Meta:
+        primary_key = CompositeKey('singer_id', 'genre_id')
+
+    @classmethod
+    def add_playlist(cls, singer_ids, genre_id):
+        """
+        Count one more playlist of genre_id for every singer in singer_ids.
+        """
+        rows = [(singer_id, genre_id, 1) for singer_id in singer_ids]
+        # Every row binds three variables.
+        for rows_chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER // 3):
+            cls.insert_many(rows_chunk, fields=[cls.singer_id, cls.genre_id,
+                                                cls.playlist_count])\
+               .on_conflict(
+                   conflict_target=[cls.singer_id, cls.genre_id],
+                   update={cls.playlist_count: cls.playlist_count + 1})\
+               .execute()
+
+    @classmethod
+    def remove_playlist(cls, singer_ids, genre_id):
+        """
+        Count one less playlist of genre_id for every singer in singer_ids,
+        dropping the counts falling to zero.
+        """
+        for singer_ids_chunk in chunked(singer_ids,
+                                        SQLITE_MAX_VARIABLE_NUMBER - 1):
+            selected_rows = (cls.singer_id.in_(singer_ids_chunk)) & \
+                            (cls.genre_id == genre_id)
+            cls.update(playlist_count=cls.playlist_count - 1)\
+               .where(selected_rows)\
+               .execute()
+            cls.delete()\
+               .where(selected_rows & (cls.playlist_count <= 0))\
+               .execute()
+
+    @classmethod
+    def inferred_genres(cls, singer_ids):
+        """
+        Get the genre every singer in singer_ids appears most in, ties going
+        to the lowest genre id. Singers in no playlist map to None.
+        """
+        inferred_genres = dict.fromkeys(singer_ids)
+        for singer_ids_chunk in chunked(singer_ids,
+                                        SQLITE_MAX_VARIABLE_NUMBER):
+            query = cls.select(cls.singer_id, cls.genre_id)\
+                       .where(cls.singer_id.in_(singer_ids_chunk))\
+                       .order_by(cls.singer_id, cls.playlist_count.desc(),
+                                 cls.genre_id)\
+                       .tuples()
+            inferred_chunk = {}
+            for singer_id, genre_id in query:
+                inferred_chunk.setdefault(singer_id, genre_id)
+            inferred_genres.update(inferred_chunk)
+
+        return inferred_genres
+
+
+def playlist_singer_ids(playlist_id, singer_ids=None):
+    """
+    Get the ids of the singers having at least one song in a playlist,
+    optionally restricted to singer_ids.
+    """
+    query = Song.select(Song.singer_id)\
+                .distinct()\
+                .join(SongToPlaylist)\
+                .where(SongToPlaylist.playlist_id == playlist_id)
+    if singer_ids is None:
+        return {singer_id for singer_id, in query.tuples()}
+
+    found_singer_ids = set()
+    for singer_ids_chunk in chunked(singer_ids,
+                                    SQLITE_MAX_VARIABLE_NUMBER - 1):
+        chunk_query = query.where(Song.singer_id.in_(singer_ids_chunk))
+        found_singer_ids.update(singer_id
+                                for singer_id, in chunk_query.tuples())
+
+    return found_singer_ids
@@ -0,0 +1,91 @@
+import json
+import logging
+import logging.handlers
+import sqlite3
+from datetime import datetime, timezone
+from flask import has_request_context, request
+
+# Statements whose query plan is captured.
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE',
+                        'REPLACE')
+
+
+def explain_query_plan(conn, sql, params):
+    """
+    Get the EXPLAIN QUERY PLAN lines of sql run by the sqlite3 connection
+    conn, indented by depth, or None when sql has no plan or cannot be
+    explained anymore.
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return None
+
+    try:
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params or ()) \
+                   .fetchall()
+    except sqlite3.Error:
+        return None
+
+    depths = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depths[node_id] = depths.get(parent_id, -1) + 1
+        lines.append('  ' * depths[node_id] + detail)
+
+    return lines
+
+
+class SlowQueryLog:
+    """
+    Log of the statements lasting at least threshold seconds, one JSON
+    object per line in a file rotated after max_bytes, with their
+    parameters, the route of the request running them and their query plan.
+    Rotation is not coordinated between worker processes sharing the file.
+    """
+
+    def __init__(self, path, threshold, max_bytes=10485760, backup_count=5):
+        self.threshold = threshold
+        self.logger = logging.getLogger(f'{__name__}.{path}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            # The file is only created by the first slow statement.
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count,
+                delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def record(self, conn, sql, params, seconds):
+        """
+        Log sql, run by the sqlite3 connection conn in seconds.
+        """
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(seconds * 1000, 3),
+            'sql': sql,
+            'params': list(params or ()),
+            'route': None,
+            'method': None,
+            'plan': explain_query_plan(conn, sql, params)
+        }
+        if has_request_context():
+            entry['route'] = request.url_rule.rule \
+                if request.url_rule else request.path
+            entry['method'] = request.method
+
+        self.logger.info(json.dumps(entry, default=str))
+
+
+def create_slow_query_log(config):
+    """
+    Create the slow query log of the slow_query_log section of the
+    configuration, or None when its threshold is 0.
+    """
+    threshold_ms = config.get('threshold_ms', 100)
+    if not threshold_ms:
+        return None
+
+    return SlowQueryLog(config.get('file', 'db/slow_queries.log'),
+                        threshold_ms / 1000,
+                        config.get('max_bytes', 10485760),
+                        config.get('backup_count', 5))
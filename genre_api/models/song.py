@@ -19,9 +19,15 @@ class Song(BaseModel):
 
     id = AutoField()
     title = CharField(index=True)
-    singer_id = ForeignKeyField(Singer, backref='songs')
+    singer_id = ForeignKeyField(Singer, backref='songs', index=False)
     genre_id = ForeignKeyField(Genre, backref='songs')
 
+    class Meta:
+        # Serves a singer's songs in id order, as paginated.
+        indexes = (
+            (('singer_id', 'id'), False),
+        )
+
 
 @swagger.model
 class SongSchema(Schema):
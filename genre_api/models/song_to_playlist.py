@@ -9,5 +9,14 @@ from genre_api.models.playlist import Playlist
 
 
 class SongToPlaylist(BaseModel):
-    song_id = ForeignKeyField(Song, backref='playlists', index=True)
-    playlist_id = ForeignKeyField(Playlist, backref='songs', index=True)
+    song_id = ForeignKeyField(Song, backref='playlists', index=False)
+    playlist_id = ForeignKeyField(Playlist, backref='songs', index=False)
+
+    class Meta:
+        # A song is in a playlist at most once. Both indexes cover the table,
+        # so that either side of a membership is found from the other one
+        # without reading the rows.
+        indexes = (
+            (('playlist_id', 'song_id'), True),
+            (('song_id', 'playlist_id'), False),
+        )
@@ -0,0 +1,61 @@
+import datetime
+from peewee import *
+from genre_api.models.meta import BaseModel
+
+
+class TableVersion(BaseModel):
+    """
+    Version counter of a table, bumped in the transactions writing to it.
+    Being stored in the database, it lets every worker process tell cheaply
+    whether data it cached from the table is stale. Things cached apart from
+    any table, like the response cache, are versioned under their own name.
+    """
+    table_name = CharField(primary_key=True)
+    version = IntegerField(default=0)
+    updated_at = DateTimeField(null=True)
+
+    @staticmethod
+    def _table_name(model):
+        return model if isinstance(model, str) else model._meta.table_name
+
+    @classmethod
+    def bump(cls, *models):
+        """
+        Increment the version of every model's table, or of every name.
+        """
+        now = datetime.datetime.utcnow()
+        rows = [(cls._table_name(model), 1, now) for model in models]
+        cls.insert_many(rows, fields=[cls.table_name, cls.version,
+                                      cls.updated_at])\
+           .on_conflict(conflict_target=[cls.table_name],
+                        update={cls.version: cls.version + 1,
+                                cls.updated_at: EXCLUDED.updated_at})\
+           .execute()
+
+    @classmethod
+    def get_version(cls, model):
+        """
+        Get the version of model's table, or of a name, None when it was
+        never bumped.
+        """
+        query = cls.select(cls.version)\
+                   .where(cls.table_name == cls._table_name(model))\
+                   .tuples()
+        for version, in query:
+            return version
+
+        return None
+
+    @classmethod
+    def get_versions(cls, models):
+        """
+        Get the (version, updated_at) tuple of every model's table, by table
+        name, in one query. Tables never bumped are left out.
+        """
+        table_names = [model._meta.table_name for model in models]
+        query = cls.select(cls.table_name, cls.version, cls.updated_at)\
+                   .where(cls.table_name.in_(table_names))\
+                   .tuples()
+
+        return {table_name: (version, updated_at)
+                for table_name, version, updated_at in query}
@@ -0,0 +1,251 @@
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from peewee import SqliteDatabase, OperationalError, chunked
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
+
+CachedResponse = namedtuple('CachedResponse', ['status', 'headers', 'body'])
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU store of cached responses, bounded to max_size bytes of
+    bodies.
+    Entries are stored by tag, the entity a response lists things of, and
+    variant, the query string and representation of the response, so that
+    evicting a tag drops every variant of it.
+    """
+
+    # Entries live in this process, unseen by the other worker processes.
+    shared = False
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._variants_by_tag = {}
+        self._size = 0
+        self._generation = 0
+
+    def generation(self):
+        """
+        Get the eviction counter, incremented by every eviction.
+        """
+        return self._generation
+
+    def get(self, tag, variant):
+        with self._lock:
+            key = (tag, variant)
+            item = self._entries.get(key)
+            if item is None:
+                return None
+
+            expires_at, response = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, tag, variant, response, ttl, generation):
+        """
+        Store response for ttl seconds, unless an eviction happened since
+        generation was read, the response possibly being older than it.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            key = (tag, variant)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, response)
+            self._variants_by_tag.setdefault(tag, set()).add(variant)
+            self._size += len(response.body)
+            while self._size > self.max_size and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def evict(self, tags):
+        """
+        Drop every variant of tags. Returns the number of entries dropped.
+        """
+        evicted = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for variant in self._variants_by_tag.get(tag, set()).copy():
+                    self._remove((tag, variant))
+                    evicted += 1
+
+        return evicted
+
+    def clear(self):
+        """
+        Drop every entry. Returns the number of entries dropped.
+        """
+        with self._lock:
+            self._generation += 1
+            evicted = len(self._entries)
+            self._entries.clear()
+            self._variants_by_tag.clear()
+            self._size = 0
+
+        return evicted
+
+    def _remove(self, key):
+        _, response = self._entries.pop(key)
+        self._size -= len(response.body)
+        tag, variant = key
+        variants = self._variants_by_tag[tag]
+        variants.discard(variant)
+        if not variants:
+            del self._variants_by_tag[tag]
+
+    def entries_count(self):
+        return len(self._entries)
+
+    def size(self):
+        return self._size
+
+
+class FileCacheBackend:
+    """
+    Same store as MemoryCacheBackend in a local SQLite file, shared by the
+    worker processes of a host.
+    """
+
+    shared = True
+
+    def __init__(self, database_file, max_size):
+        self.max_size = max_size
+        self.database = SqliteDatabase(database_file, pragmas={
+            'journal_mode': 'wal',
+            'synchronous': 'off',
+            'busy_timeout': 1000
+        })
+        with self.database.connection_context():
+            self.database.execute_sql(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'tag TEXT NOT NULL, variant TEXT NOT NULL, '
+                'status INTEGER NOT NULL, headers TEXT NOT NULL, '
+                'body BLOB NOT NULL, expires_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL, PRIMARY KEY (tag, variant))')
+            self.database.execute_sql(
+                'CREATE INDEX IF NOT EXISTS response_cache_accessed_at '
+                'ON response_cache (accessed_at)')
+            self.database.execute_sql(
+                'CREATE TABLE IF NOT EXISTS response_cache_generation ('
+                'id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)')
+            self.database.execute_sql(
+                'INSERT OR IGNORE INTO response_cache_generation '
+                'VALUES (1, 0)')
+
+    def generation(self):
+        with self.database.connection_context():
+            return self._generation()
+
+    def _generation(self):
+        return self.database.execute_sql(
+            'SELECT generation FROM response_cache_generation').fetchone()[0]
+
+    def get(self, tag, variant):
+        now = time.time()
+        with self.database.connection_context():
+            row = self.database.execute_sql(
+                'SELECT status, headers, body FROM response_cache '
+                'WHERE tag = ? AND variant = ? AND expires_at > ?',
+                (tag, variant, now)).fetchone()
+            if row is None:
+                return None
+
+            try:
+                self.database.execute_sql(
+                    'UPDATE response_cache SET accessed_at = ? '
+                    'WHERE tag = ? AND variant = ?', (now, tag, variant))
+            except OperationalError:
+                # The LRU order is best effort, a busy store is no miss.
+                pass
+
+        status, headers, body = row
+        return CachedResponse(status, json.loads(headers), bytes(body))
+
+    def set(self, tag, variant, response, ttl, generation):
+        now = time.time()
+        with self.database.connection_context():
+            with self.database.atomic('IMMEDIATE'):
+                if generation != self._generation():
+                    return
+
+                self.database.execute_sql(
+                    'INSERT OR REPLACE INTO response_cache '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (tag, variant, response.status,
+                     json.dumps(response.headers), response.body, now + ttl,
+                     now))
+                self.database.execute_sql(
+                    'DELETE FROM response_cache WHERE expires_at <= ?',
+                    (now,))
+                self._trim()
+
+    def _trim(self):
+        """
+        Drop the least recently used entries until the bodies fit max_size.
+        """
+        size = self._size()
+        if size <= self.max_size:
+            return
+
+        query = self.database.execute_sql(
+            'SELECT tag, variant, LENGTH(body) FROM response_cache '
+            'ORDER BY accessed_at')
+        removed_keys = []
+        for tag, variant, body_size in query.fetchall():
+            if size <= self.max_size:
+                break
+            removed_keys.append((tag, variant))
+            size -= body_size
+        for tag, variant in removed_keys:
+            self.database.execute_sql(
+                'DELETE FROM response_cache WHERE tag = ? AND variant = ?',
+                (tag, variant))
+
+    def evict(self, tags):
+        evicted = 0
+        with self.database.connection_context():
+            with self.database.atomic('IMMEDIATE'):
+                self.database.execute_sql(
+                    'UPDATE response_cache_generation '
+                    'SET generation = generation + 1')
+                for tags_chunk in chunked(tags, SQLITE_MAX_VARIABLE_NUMBER):
+                    placeholders = ', '.join('?' * len(tags_chunk))
+                    evicted += self.database.execute_sql(
+                        f'DELETE FROM response_cache '
+                        f'WHERE tag IN ({placeholders})',
+                        tags_chunk).rowcount
+
+        return evicted
+
+    def clear(self):
+        with self.database.connection_context():
+            with self.database.atomic('IMMEDIATE'):
+                self.database.execute_sql(
+                    'UPDATE response_cache_generation '
+                    'SET generation = generation + 1')
+                return self.database.execute_sql(
+                    'DELETE FROM response_cache').rowcount
+
+    def entries_count(self):
+        with self.database.connection_context():
+            return self.database.execute_sql(
+                'SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+    def size(self):
+        with self.database.connection_context():
+            return self._size()
+
+    def _size(self):
+        return self.database.execute_sql(
+            'SELECT COALESCE(SUM(LENGTH(body)), 0) FROM response_cache'
+        ).fetchone()[0]
@@ -0,0 +1,68 @@
+import hashlib
+from functools import wraps
+from flask import request, Response
+from flask_restful.utils import unpack
+from werkzeug.http import http_date, quote_etag
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.streaming import ndjson_requested
+
+
+def make_etag(versions, variant):
+    """
+    Create the ETag of a response built from tables at versions, a dictionary
+    of (version, updated_at) tuples by table name, in representation variant.
+    """
+    key = repr((sorted((table_name, version)
+                       for table_name, (version, _) in versions.items()),
+                variant))
+
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def conditional(*models):
+    """
+    Make a GET handler conditional on the versions of models' tables, the
+    tables its response is read from.
+    The response gets an ETag and a Last-Modified date derived from the
+    versions, which are read before the handler's own queries so that they
+    are never newer than the data. A request whose If-None-Match or
+    If-Modified-Since matches gets a 304 without calling the handler.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            versions = TableVersion.get_versions(models)
+            variant = 'ndjson' if ndjson_requested() else 'json'
+            etag = make_etag(versions, variant)
+            updated_ats = [updated_at for _, updated_at in versions.values()
+                           if updated_at is not None]
+            last_modified = max(updated_ats) if updated_ats else None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                # HTTP dates are truncated to the second, unlike the
+                # versions': a write in the same second as the date is
+                # newer than it.
+                not_modified = last_modified is not None and \
+                    request.if_modified_since is not None and \
+                    last_modified <= request.if_modified_since
+            headers = {'ETag': quote_etag(etag), 'Vary': 'Accept'}
+            if last_modified is not None:
+                headers['Last-Modified'] = http_date(last_modified)
+            if not_modified:
+                return Response(status=304, headers=headers)
+
+            resp = f(*args, **kwargs)
+            if isinstance(resp, Response):
+                if resp.status_code == 200:
+                    for key, value in headers.items():
+                        resp.headers[key] = value
+                return resp
+
+            data, code, resp_headers = unpack(resp)
+            if code == 200:
+                resp_headers = dict(resp_headers or {}, **headers)
+            return data, code, resp_headers
+        return wrapper
+    return decorator
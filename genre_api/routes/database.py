@@ -0,0 +1,20 @@
+from flask_restful import Resource
+from flask_restful_swagger import swagger
+from genre_api.models.meta import sqlite_db, LockWait
+from genre_api.routes.serializers import serialize_with
+
+
+class LockWaitsRoute(Resource):
+    @swagger.operation(
+        notes='get the time spent waiting for the writer connection and for '
+              'the database write lock',
+        responseClass=LockWait.__name__,
+        nickname='get'
+    )
+    @serialize_with(LockWait.resource_fields)
+    def get(self):
+        lock_waits = getattr(sqlite_db, 'lock_waits', None)
+        if lock_waits is None:
+            return []
+
+        return lock_waits.stats()
@@ -0,0 +1,94 @@
+from flask import request, Response, stream_with_context
+from flask_restful import Resource, abort
+from flask_restful_swagger import swagger
+from genre_api.models.genre import Genre
+from genre_api.routes.streaming import NDJSON_MIMETYPE
+from genre_api.scripts.export_catalog import (
+    EXPORT_MODELS, get_export_model, generate_ndjson, generate_csv,
+    encode_chunks)
+
+CSV_MIMETYPE = 'text/csv'
+
+
+class ExportRoute(Resource):
+    @swagger.operation(
+        notes='export every catalog table as NDJSON, or one table as CSV, '
+              'all read from a single snapshot and gzip compressed when the '
+              'request accepts it',
+        nickname='get',
+        parameters=[
+            {
+                'name': 'format',
+                'description': 'ndjson (default), one {"table", "row"} '
+                               'object per line, or csv',
+                'required': False,
+                'allowMultiple': False,
+                'dataType': str.__name__,
+                'paramType': 'query'
+            },
+            {
+                'name': 'table',
+                'description': 'The only table exported, required by csv',
+                'required': False,
+                'allowMultiple': False,
+                'dataType': str.__name__,
+                'paramType': 'query'
+            }
+        ],
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid export format'
+            },
+            {
+                'code': 404,
+                'message': 'Table <table> not exported'
+            }
+        ]
+    )
+    def get(self):
+        file_format = request.args.get('format', 'ndjson')
+        if file_format not in ('ndjson', 'csv'):
+            abort(400, message=f'Invalid export format {file_format}')
+
+        table_name = request.args.get('table')
+        models = EXPORT_MODELS
+        if table_name is not None:
+            model = get_export_model(table_name)
+            if model is None:
+                abort(404, message=f'Table {table_name} not exported')
+            models = [model]
+        elif file_format == 'csv':
+            abort(400, message='CSV exports need a table')
+
+        compress = 'gzip' in request.accept_encodings
+        database = Genre._meta.database
+
+        def generate():
+            # The request's connection may be closed before the body is sent.
+            opened = database.connect(reuse_if_open=True)
+            try:
+                # A single read transaction: every table comes from the same
+                # snapshot, without blocking writers thanks to WAL.
+                with database.atomic():
+                    if file_format == 'ndjson':
+                        chunks = generate_ndjson(models)
+                    else:
+                        chunks = generate_csv(models[0])
+                    yield from encode_chunks(chunks, compress)
+            finally:
+                if opened:
+                    database.close()
+
+        file_name = f"{table_name or 'catalog'}.{file_format}"
+        response = Response(
+            stream_with_context(generate()),
+            mimetype=NDJSON_MIMETYPE if file_format == 'ndjson'
+            else CSV_MIMETYPE,
+            headers={'Content-Disposition':
+                     f'attachment; filename={file_name}'})
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+
+        return response
@@ -1,22 +1,34 @@
 from flask import request
-from flask_restful import Resource, abort, marshal_with
+from flask_restful import Resource, abort
 from flask_restful_swagger import swagger
 from peewee import IntegrityError
 from marshmallow import ValidationError
 from genre_api.models.genre import *
+from genre_api.models.genre_cache import genre_cache, GenreCacheStats
+from genre_api.models.table_version import TableVersion
+from genre_api.models.group_commit import run_write
+from genre_api.routes.pagination import paginate_rows, LIST_PARAMETERS
+from genre_api.routes.serializers import serialize_with
+from genre_api.routes.conditional import conditional
 
 
 class GenreRoute(Resource):
     @swagger.operation(
         notes='get all genre items',
         responseClass=Genre.__name__,
-        nickname='get'
+        nickname='get',
+        parameters=LIST_PARAMETERS,
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            }
+        ]
     )
-    @marshal_with(Genre.resource_fields)
+    @conditional(Genre)
+    @serialize_with(Genre.resource_fields)
     def get(self):
-        query = Genre.select().dicts()
-
-        return [row for row in query]
+        return paginate_rows(genre_cache.get_all(), Genre.resource_fields)
 
     @swagger.operation(
         notes='post a genre item',
@@ -43,7 +55,7 @@ class GenreRoute(Resource):
             }
         ]
     )
-    @marshal_with(Genre.resource_fields)
+    @serialize_with(Genre.resource_fields)
     def post(self):
         json_data = request.get_json()
         try:
@@ -53,12 +65,82 @@ class GenreRoute(Resource):
 
         genre_name = json_data['name']
         try:
-            genre = Genre.create(name=genre_name)
+            genre = run_write(Genre._meta.database, self.__create_genre,
+                              genre_name)
         except IntegrityError:
             abort(409, message=f'Genre {genre_name} already exists')
+        genre_cache.invalidate()
 
         return genre.select().where(Genre.id == genre.id).dicts().get()
 
+    def __create_genre(self, genre_name):
+        genre = Genre.create(name=genre_name)
+        TableVersion.bump(Genre)
+
+        return genre
+
+
+class GenreBulkRoute(Resource):
+    @swagger.operation(
+        notes='post a list of genre items, either all created or none',
+        responseClass=Genre.__name__,
+        nickname='post',
+        parameters=[
+            {
+                'name': 'body',
+                'description': 'The added genres',
+                'required': True,
+                'allowMultiple': True,
+                'dataType': GenreSchema.__name__,
+                'paramType': 'body'
+            }
+        ],
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid JSON schema'
+            },
+            {
+                'code': 409,
+                'message': 'Genres <genre_names> already exist'
+            }
+        ]
+    )
+    @serialize_with(Genre.resource_fields)
+    def post(self):
+        json_data = request.get_json()
+        try:
+            genres = GenreSchema(many=True).load(json_data)
+        except ValidationError as error:
+            abort(400, message=error.messages)
+
+        # Names either already used or given several times.
+        used_names = {genre['name'] for genre in genre_cache.get_all()}
+        duplicate_names = []
+        for genre in genres:
+            if genre['name'] in used_names:
+                duplicate_names.append(genre['name'])
+            used_names.add(genre['name'])
+        duplicate_names = list(dict.fromkeys(duplicate_names))
+        if duplicate_names:
+            abort(409, message=f'Genres {duplicate_names} already exist',
+                  duplicate_names=duplicate_names)
+
+        try:
+            rows = run_write(Genre._meta.database, self.__create_genres,
+                             genres)
+        except IntegrityError:
+            abort(409, message='Genres already exist')
+        genre_cache.invalidate()
+
+        return rows
+
+    def __create_genres(self, genres):
+        rows = Genre.insert_rows(genres)
+        TableVersion.bump(Genre)
+
+        return rows
+
 
 class GenreByIDRoute(Resource):
     @swagger.operation(
@@ -82,11 +164,22 @@ class GenreByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Genre.resource_fields)
+    @conditional(Genre)
+    @serialize_with(Genre.resource_fields)
     def get(self, genre_id):
-        try:
-            genre = Genre.select().where(Genre.id == genre_id).dicts().get()
-        except DoesNotExist:
+        genre = genre_cache.get(genre_id)
+        if genre is None:
             abort(404, message=f'Genre with ID {genre_id} not found')
 
         return genre
+
+
+class GenreCacheRoute(Resource):
+    @swagger.operation(
+        notes='get the hit and miss counters of the genre cache',
+        responseClass=GenreCacheStats.__name__,
+        nickname='get'
+    )
+    @serialize_with(GenreCacheStats.resource_fields)
+    def get(self):
+        return genre_cache.stats()
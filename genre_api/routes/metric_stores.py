@@ -0,0 +1,152 @@
+import glob
+import mmap
+import os
+import struct
+
+# Number of bytes of a metrics file used, header included.
+HEADER = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+METRICS_FILE_SUFFIX = '.metrics'
+
+
+def padded(size):
+    """
+    Round size up to a multiple of 8 bytes, keeping values aligned.
+    """
+    return (size + 7) // 8 * 8
+
+
+def read_entries(buffer, used):
+    """
+    Iterate over the (key, value, value offset) entries of the first used
+    bytes of a metrics file's content.
+    """
+    position = HEADER.size
+    while position < used:
+        key_length, = KEY_LENGTH.unpack_from(buffer, position)
+        key_start = position + KEY_LENGTH.size
+        key = bytes(buffer[key_start:key_start + key_length]).decode()
+        value_offset = position + padded(KEY_LENGTH.size + key_length)
+        value, = VALUE.unpack_from(buffer, value_offset)
+        yield key, value, value_offset
+        position = value_offset + VALUE.size
+
+
+class MemoryMetricValues:
+    """
+    Metric values of the current process, by key, held in memory.
+    Not thread safe: callers hold a lock.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def items(self):
+        return list(self._values.items())
+
+
+class MmapMetricValues:
+    """
+    Metric values of the current process, by key, in a memory mapped file
+    of directory named after the process id, which the other worker
+    processes of the host read to aggregate them.
+    The file starts with the number of bytes used, followed by entries made
+    of the key's length, the key in UTF-8 and the value as a double, aligned
+    on 8 bytes. Entries are only appended, the number of bytes used being
+    written last so that readers never see a partial entry.
+    Not thread safe: callers hold a lock.
+    """
+
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory,
+                                 f'{os.getpid()}{METRICS_FILE_SUFFIX}')
+        # A file left by an earlier process of the same id is continued.
+        self._file = open(self.path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < self.INITIAL_SIZE:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = HEADER.unpack_from(self._map, 0)[0] or HEADER.size
+        self._offsets = {key: value_offset for key, _, value_offset
+                         in read_entries(self._map, self._used)}
+
+    def _offset(self, key):
+        value_offset = self._offsets.get(key)
+        if value_offset is not None:
+            return value_offset
+
+        encoded_key = key.encode()
+        value_offset = self._used + padded(KEY_LENGTH.size +
+                                           len(encoded_key))
+        used = value_offset + VALUE.size
+        if used > len(self._map):
+            self._map.close()
+            self._file.truncate(max(2 * os.fstat(self._file.fileno()).st_size,
+                                    used))
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded_key))
+        key_start = self._used + KEY_LENGTH.size
+        self._map[key_start:key_start + len(encoded_key)] = encoded_key
+        VALUE.pack_into(self._map, value_offset, 0.0)
+        HEADER.pack_into(self._map, 0, used)
+        self._used = used
+        self._offsets[key] = value_offset
+        return value_offset
+
+    def add(self, key, amount):
+        value_offset = self._offset(key)
+        value, = VALUE.unpack_from(self._map, value_offset)
+        VALUE.pack_into(self._map, value_offset, value + amount)
+
+    def set(self, key, value):
+        VALUE.pack_into(self._map, self._offset(key), value)
+
+    def items(self):
+        return [(key, value) for key, value, _
+                in read_entries(self._map, self._used)]
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def read_metric_files(directory):
+    """
+    Read the metric values of every process which wrote to directory.
+    Returns a list of (process id, [(key, value)]) tuples.
+    """
+    processes = []
+    for path in sorted(glob.glob(os.path.join(directory,
+                                              f'*{METRICS_FILE_SUFFIX}'))):
+        try:
+            pid = int(os.path.basename(path)[:-len(METRICS_FILE_SUFFIX)])
+            with open(path, 'rb') as metrics_file:
+                content = metrics_file.read()
+        except (ValueError, OSError):
+            continue
+        if len(content) < HEADER.size:
+            continue
+
+        used = min(HEADER.unpack_from(content, 0)[0], len(content))
+        processes.append((pid, [(key, value) for key, value, _
+                                in read_entries(content, used)]))
+
+    return processes
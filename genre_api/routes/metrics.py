@@ -0,0 +1,287 @@
+import json
+import os
+import threading
+import time
+from flask import g, request, Response
+from flask_restful import Resource
+from flask_restful_swagger import swagger
+from genre_api.config.config import CONFIG
+from genre_api.models.meta import sqlite_db
+from genre_api.routes.metric_stores import (
+    MemoryMetricValues, MmapMetricValues, read_metric_files, process_alive)
+
+METRICS_CONFIG = CONFIG.get('metrics', {})
+
+# Upper bounds in seconds of the request duration histogram buckets.
+DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10]
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Type and help of every metric family, in exposition order.
+METRICS = {
+    'genre_api_requests_total': (
+        'counter', 'Requests handled, by route, method and status.'),
+    'genre_api_request_duration_seconds': (
+        'histogram', 'Time spent handling requests, by route and method.'),
+    'genre_api_requests_in_flight': (
+        'gauge', 'Requests being handled, by route and method.'),
+    'genre_api_database_connections': (
+        'gauge', 'Pooled database connections, by role and state.'),
+    'genre_api_database_lock_waits_total': (
+        'counter', 'Waits for the writer connection and for the database '
+                   'write lock.'),
+    'genre_api_database_lock_wait_timeouts_total': (
+        'counter', 'Waits for the writer connection and for the database '
+                   'write lock which timed out.'),
+    'genre_api_database_lock_wait_seconds_total': (
+        'counter', 'Time spent waiting for the writer connection and for '
+                   'the database write lock.')
+}
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+
+    return repr(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+                         .replace('"', '\\"')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"'
+                          for name, value in zip(labels, escaped)) + '}'
+
+
+class Metrics:
+    """
+    Request and database metrics of the API, rendered in the Prometheus
+    text format.
+    Every process updates its own values, in memory, or in a memory mapped
+    file of directory which lets any worker process of the host render the
+    metrics of them all: counters are summed over every file, and gauges
+    over the files of the running processes. Each request takes the lock of
+    its process twice, values being keyed by family, sample name and
+    labels.
+    """
+
+    def __init__(self, directory=None, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.buckets = sorted(buckets)
+        self._bucket_labels = [format_value(bound) for bound in self.buckets]
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+        self._lock_waits = {}
+
+    def _process_values(self):
+        """
+        Get the values of the current process, with the lock held. A forked
+        process starts its own.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = MmapMetricValues(self.directory) \
+                if self.directory else MemoryMetricValues()
+            self._lock_waits = {}
+            # Gauges left by an earlier process of the same id are stale.
+            for key, _ in self._values.items():
+                if METRICS[json.loads(key)[0]][0] == 'gauge':
+                    self._values.set(key, 0.0)
+
+        return self._values
+
+    @staticmethod
+    def _key(family, labels, sample=None):
+        return json.dumps([family, sample or family, labels])
+
+    def request_started(self, route, method):
+        labels = {'route': route, 'method': method}
+        with self._lock:
+            self._process_values().add(
+                self._key('genre_api_requests_in_flight', labels), 1)
+
+    def request_finished(self, route, method, status, seconds):
+        labels = {'route': route, 'method': method}
+        family = 'genre_api_request_duration_seconds'
+        bucket = next((bucket_label for bound, bucket_label
+                       in zip(self.buckets, self._bucket_labels)
+                       if seconds <= bound), '+Inf')
+        with self._lock:
+            values = self._process_values()
+            values.add(self._key('genre_api_requests_in_flight', labels), -1)
+            values.add(self._key('genre_api_requests_total',
+                                 dict(labels, status=str(status))), 1)
+            values.add(self._key(family, dict(labels, le=bucket),
+                                 f'{family}_bucket'), 1)
+            values.add(self._key(family, labels, f'{family}_sum'), seconds)
+            values.add(self._key(family, labels, f'{family}_count'), 1)
+
+    def update_database(self, database):
+        """
+        Record the connection counts of database's pool, and the lock waits
+        it recorded since the last update.
+        """
+        connection_counts = database.connection_counts() \
+            if hasattr(database, 'connection_counts') else {}
+        lock_waits = database.lock_waits.stats() \
+            if hasattr(database, 'lock_waits') else []
+
+        with self._lock:
+            values = self._process_values()
+            for (role, state), count in connection_counts.items():
+                values.set(self._key('genre_api_database_connections',
+                                     {'role': role, 'state': state}), count)
+
+            for wait in lock_waits:
+                labels = {'lock': wait['lock']}
+                last_wait = self._lock_waits.get(
+                    wait['lock'],
+                    {'count': 0, 'timeouts': 0, 'total_seconds': 0.0})
+                for family, field in [
+                        ('genre_api_database_lock_waits_total', 'count'),
+                        ('genre_api_database_lock_wait_timeouts_total',
+                         'timeouts'),
+                        ('genre_api_database_lock_wait_seconds_total',
+                         'total_seconds')]:
+                    if wait[field] != last_wait[field]:
+                        values.add(self._key(family, labels),
+                                   wait[field] - last_wait[field])
+                self._lock_waits[wait['lock']] = wait
+
+    def collect(self):
+        """
+        Get the values of every process, summed by key.
+        """
+        with self._lock:
+            own_values = self._process_values().items()
+        if not self.directory:
+            processes = [(os.getpid(), own_values)]
+        else:
+            processes = read_metric_files(self.directory)
+
+        totals = {}
+        for pid, values in processes:
+            alive = pid == os.getpid() or process_alive(pid)
+            for key, value in values:
+                family, sample, labels = json.loads(key)
+                if family not in METRICS or \
+                        (METRICS[family][0] == 'gauge' and not alive):
+                    continue
+                sample_key = (family, sample, tuple(labels.items()))
+                totals[sample_key] = totals.get(sample_key, 0.0) + value
+
+        return totals
+
+    def render(self):
+        """
+        Render the metrics of every process in the Prometheus text format.
+        """
+        samples_by_family = {}
+        for (family, sample, labels), value in self.collect().items():
+            samples_by_family.setdefault(family, {})[(sample, labels)] = value
+
+        lines = []
+        for family, (metric_type, help_text) in METRICS.items():
+            samples = samples_by_family.get(family, {})
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {metric_type}')
+            if metric_type == 'histogram':
+                lines.extend(self._render_histogram(family, samples))
+                continue
+
+            for (sample, labels), value in sorted(samples.items()):
+                lines.append(f'{sample}{format_labels(dict(labels))} '
+                             f'{format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, family, samples):
+        """
+        Render the histogram samples of family, buckets being stored by the
+        lowest bound fitting each observation and rendered cumulative.
+        """
+        lines = []
+        for sample, labels in sorted(samples):
+            if sample != f'{family}_count':
+                continue
+
+            cumulative_count = 0
+            for bucket_label in self._bucket_labels + ['+Inf']:
+                bucket_labels = labels + (('le', bucket_label),)
+                cumulative_count += samples.get((f'{family}_bucket',
+                                                 bucket_labels), 0)
+                lines.append(f'{family}_bucket'
+                             f'{format_labels(dict(bucket_labels))} '
+                             f'{format_value(cumulative_count)}')
+            lines.append(f'{family}_sum{format_labels(dict(labels))} '
+                         f'{format_value(samples[(f"{family}_sum", labels)])}')
+            lines.append(f'{family}_count{format_labels(dict(labels))} '
+                         f'{format_value(samples[sample, labels])}')
+
+        return lines
+
+
+metrics = Metrics(METRICS_CONFIG.get('directory'),
+                  METRICS_CONFIG.get('buckets', DEFAULT_BUCKETS))
+
+
+def get_route():
+    """
+    Get the route of the current request, its URL rule, so that every id
+    falls under the same labels.
+    """
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def start_request_metrics():
+    g.metrics_start_time = time.perf_counter()
+    metrics.request_started(get_route(), request.method)
+
+
+def set_request_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def finish_request_metrics(exception):
+    # Unlike after_request, also called when the request raised, its status
+    # then being 500.
+    if 'metrics_start_time' not in g:
+        return
+
+    metrics.request_finished(get_route(), request.method,
+                             g.get('metrics_status', 500),
+                             time.perf_counter() - g.metrics_start_time)
+    metrics.update_database(sqlite_db)
+
+
+def register_metrics(app):
+    """
+    Count and time every request of app, unless disabled in the metrics
+    section of the configuration.
+    """
+    if not METRICS_CONFIG.get('enabled', True):
+        return
+
+    app.before_request(start_request_metrics)
+    app.after_request(set_request_status)
+    app.teardown_request(finish_request_metrics)
+
+
+class MetricsRoute(Resource):
+    @swagger.operation(
+        notes='get the request counters, latency histograms and in-flight '
+              'requests by route, and the database connection and lock '
+              'wait metrics, of every worker process in the Prometheus '
+              'text format',
+        nickname='get'
+    )
+    def get(self):
+        return Response(metrics.render(),
+                        content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,132 @@
+import base64
+import binascii
+from urllib.parse import urlencode
+from flask import request
+from flask_restful import abort
+from genre_api.config.config import CONFIG
+from genre_api.routes.streaming import (
+    stream_requested, stream_response, stream_rows_response,
+    STREAMING_PARAMETERS)
+
+PAGINATION_CONFIG = CONFIG.get('pagination', {})
+DEFAULT_PAGE_SIZE = PAGINATION_CONFIG.get('default_page_size', 100)
+MAX_PAGE_SIZE = PAGINATION_CONFIG.get('max_page_size', 1000)
+
+PAGINATION_PARAMETERS = [
+    {
+        'name': 'limit',
+        'description': f'The maximum number of items returned, up to '
+                       f'{MAX_PAGE_SIZE} (default {DEFAULT_PAGE_SIZE})',
+        'required': False,
+        'allowMultiple': False,
+        'dataType': int.__name__,
+        'paramType': 'query'
+    },
+    {
+        'name': 'after',
+        'description': 'The cursor of the page to retrieve, as given by the '
+                       'next link of the previous page',
+        'required': False,
+        'allowMultiple': False,
+        'dataType': str.__name__,
+        'paramType': 'query'
+    }
+]
+
+# Query parameters of every route returning a list.
+LIST_PARAMETERS = PAGINATION_PARAMETERS + STREAMING_PARAMETERS
+
+
+def encode_cursor(last_id):
+    """
+    Create the opaque cursor pointing after the item with ID last_id.
+    """
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Get the ID a cursor points after.
+    """
+    try:
+        prefix, last_id = base64.urlsafe_b64decode(cursor.encode())\
+                                .decode()\
+                                .split(':')
+        if prefix != 'id':
+            raise ValueError(prefix)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400, message=f'Invalid cursor {cursor}')
+
+
+def get_page_size():
+    """
+    Get the page size asked with the limit argument, capped to MAX_PAGE_SIZE.
+    """
+    limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+    try:
+        page_size = int(limit)
+    except ValueError:
+        page_size = 0
+    if page_size < 1:
+        abort(400, message=f'Invalid limit {limit}')
+
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def page_response(rows, page_size, primary_key_name):
+    """
+    Build the (rows, status code, headers) response of a page, rows holding
+    up to one more row than page_size to tell whether a next page exists.
+    """
+    headers = {}
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        args = request.args.copy()
+        args['limit'] = page_size
+        args['after'] = encode_cursor(rows[-1][primary_key_name])
+        query_string = urlencode(list(args.items(multi=True)))
+        headers['Link'] = f'<{request.base_url}?{query_string}>; rel="next"'
+
+    return rows, 200, headers
+
+
+def paginate(query, primary_key):
+    """
+    Get the page of a query selected by the limit and after arguments.
+    Items are ordered by primary_key and the page starts right after the
+    cursor, so that no OFFSET scan is needed.
+    Returns a (rows, status code, headers) tuple, headers holding a Link to
+    the next page when there is one.
+    When streaming is requested, every item after the cursor is streamed
+    instead.
+    """
+    cursor = request.args.get('after')
+    if cursor is not None:
+        query = query.where(primary_key > decode_cursor(cursor))
+    if stream_requested():
+        return stream_response(query.order_by(primary_key))
+
+    page_size = get_page_size()
+
+    # Fetching one more row tells whether a next page exists.
+    rows = list(query.order_by(primary_key).limit(page_size + 1).dicts())
+
+    return page_response(rows, page_size, primary_key.name)
+
+
+def paginate_rows(rows, resource_fields, primary_key_name='id'):
+    """
+    Same as paginate for rows already in memory and ordered by their
+    primary_key_name key, such as cached ones.
+    """
+    cursor = request.args.get('after')
+    if cursor is not None:
+        last_id = decode_cursor(cursor)
+        rows = [row for row in rows if row[primary_key_name] > last_id]
+    if stream_requested():
+        return stream_rows_response(rows, resource_fields)
+
+    page_size = get_page_size()
+
+    return page_response(rows[:page_size + 1], page_size, primary_key_name)
@@ -1,30 +1,86 @@
-import operator
 from flask import request
-from flask_restful import Resource, abort, marshal_with
+from flask_restful import Resource, abort
 from flask_restful_swagger import swagger
 from peewee import DoesNotExist, chunked
 from marshmallow import ValidationError
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
 from genre_api.models.playlist import *
-from genre_api.models.genre import Genre
+from genre_api.models.genre_cache import genre_cache
 from genre_api.models.song import Song
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.routes.pagination import paginate, LIST_PARAMETERS
+from genre_api.routes.serializers import serialize_with
+from genre_api.routes.conditional import conditional
+from genre_api.routes.response_cache import (
+    cache_response, evict_playlist_songs, evict_playlists, evict_singers,
+    PLAYLIST_SINGERS)
 from genre_api.models.singer import Singer
-from genre_api.routes.song import SongByIDRoute
-from genre_api.routes.genre import GenreByIDRoute
-from genre_api.scripts.calc_inferred_genre import count_playlist_genre
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.group_commit import run_write
+from genre_api.models.table_version import TableVersion
+from genre_api.models.singer_genre_count import (
+    SingerGenreCount, playlist_singer_ids)
+from genre_api.scripts.calc_inferred_genre import (
+    count_playlist_genre, apply_inferred_genres)
+
+
+def update_singer_genre_counts(singer_ids, old_singer_ids, old_genre_id,
+                               genre_id):
+    """
+    Update the singer genre counts after a playlist's singers or genre changed,
+    then refresh the inferred genre of the singers touched.
+    old_singer_ids and old_genre_id describe the playlist before the change,
+    singer_ids and genre_id after it.
+    Returns the ids of the singers whose inferred genre changed.
+    """
+    if old_genre_id == genre_id:
+        removed_singer_ids = set()
+        added_singer_ids = singer_ids - old_singer_ids
+    else:
+        removed_singer_ids = old_singer_ids
+        added_singer_ids = singer_ids
+
+    if removed_singer_ids and old_genre_id is not None:
+        SingerGenreCount.remove_playlist(removed_singer_ids, old_genre_id)
+    if added_singer_ids and genre_id is not None:
+        SingerGenreCount.add_playlist(added_singer_ids, genre_id)
+
+    touched_singer_ids = removed_singer_ids | added_singer_ids
+    current_genres = {}
+    for singer_ids_chunk in chunked(touched_singer_ids,
+                                    SQLITE_MAX_VARIABLE_NUMBER):
+        current_genres.update(
+            Singer.select(Singer.id, Singer.inferred_genre_id)
+                  .where(Singer.id.in_(singer_ids_chunk))
+                  .tuples())
+    changed_genres = {
+        singer_id: genre_id
+        for singer_id, genre_id
+        in SingerGenreCount.inferred_genres(touched_singer_ids).items()
+        if current_genres.get(singer_id) != genre_id
+    }
+    apply_inferred_genres(changed_genres)
+
+    return set(changed_genres)
 
 
 class PlaylistRoute(Resource):
     @swagger.operation(
         notes='get all playlist items',
         responseClass=Playlist.__name__,
-        nickname='get'
+        nickname='get',
+        parameters=LIST_PARAMETERS,
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            }
+        ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @conditional(Playlist)
+    @serialize_with(Playlist.resource_fields)
     def get(self):
-        query = Playlist.select().dicts()
-
-        return [row for row in query]
+        return paginate(Playlist.select(), Playlist.id)
 
     @swagger.operation(
         notes='post a playlist item',
@@ -47,7 +103,7 @@ class PlaylistRoute(Resource):
             }
         ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @serialize_with(Playlist.resource_fields)
     def post(self):
         json_data = request.get_json()
         try:
@@ -56,11 +112,18 @@ class PlaylistRoute(Resource):
             abort(400, message=error.messages)
 
         playlist_name = json_data['name']
-        playlist = Playlist.create(name=playlist_name, genre_id=None)
+        playlist = run_write(Playlist._meta.database, self.__create_playlist,
+                             playlist_name)
 
         return playlist.select().where(Playlist.id == playlist.id)\
             .dicts().get()
 
+    def __create_playlist(self, playlist_name):
+        playlist = Playlist.create(name=playlist_name, genre_id=None)
+        TableVersion.bump(Playlist)
+
+        return playlist
+
 
 class PlaylistByIDRoute(Resource):
     @swagger.operation(
@@ -84,7 +147,8 @@ class PlaylistByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @conditional(Playlist)
+    @serialize_with(Playlist.resource_fields)
     def get(self, playlist_id):
         try:
             query = Playlist.select().where(Playlist.id == playlist_id)\
@@ -123,7 +187,7 @@ class PlaylistByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @serialize_with(Playlist.resource_fields)
     def put(self, playlist_id):
         json_data = request.get_json()
         try:
@@ -131,29 +195,47 @@ class PlaylistByIDRoute(Resource):
         except ValidationError as error:
             abort(400, message=error.messages)
 
-        try:
-            playlist = Playlist.get(Playlist.id == playlist_id)
-        except DoesNotExist:
+        if not Playlist.select().where(Playlist.id == playlist_id).exists():
             abort(404, message=f'Playlist with ID {playlist_id} not found')
 
         # Verifiying genre exists
         genre_id = json_data['genre_id']
-        GenreByIDRoute().get(genre_id)
-        playlist.genre_id = genre_id
+        if genre_cache.get(genre_id) is None:
+            abort(404, message=f'Genre with ID {genre_id} not found')
 
-        playlist_name = json_data['name']
-        playlist.name = playlist_name
-
-        with playlist._meta.database.atomic():
-            playlist.save()
+        changed_singer_ids = run_write(Playlist._meta.database,
+                                       self.__save_playlist, int(playlist_id),
+                                       json_data['name'], genre_id)
+        evict_playlists([int(playlist_id)])
+        evict_singers(changed_singer_ids)
 
-        return playlist.select().where(Playlist.id == playlist.id)\
+        return Playlist.select().where(Playlist.id == playlist_id)\
             .dicts().get()
 
+    def __save_playlist(self, playlist_id, name, genre_id):
+        """
+        Set the name and genre of a playlist, moving its singers' genre
+        counts to its new genre when it changed. The playlist is read in the
+        write transaction, so that concurrent writes to it are not undone.
+        Returns the ids of the singers whose inferred genre changed.
+        """
+        old_genre_id = Playlist.get_by_id(playlist_id).genre_id_id
+        Playlist.update(name=name, genre_id=genre_id)\
+                .where(Playlist.id == playlist_id)\
+                .execute()
+        TableVersion.bump(Playlist)
+        if genre_id == old_genre_id:
+            return set()
+
+        singer_ids = playlist_singer_ids(playlist_id)
+        return update_singer_genre_counts(singer_ids, singer_ids,
+                                          old_genre_id, genre_id)
+
 
 class PlaylistAddSongsRoute(Resource):
     @swagger.operation(
-        notes='post list of song items in a playlist',
+        notes='post list of song items in a playlist, the songs already in '
+              'it being left out',
         responseClass=Song.__name__,
         nickname='post',
         parameters=[
@@ -185,11 +267,11 @@ class PlaylistAddSongsRoute(Resource):
             },
             {
                 'code': 404,
-                'message': 'Song with ID <song_id> not found'
+                'message': 'Songs with IDs <song_ids> not found'
             }
         ]
     )
-    @marshal_with(Song.resource_fields)
+    @serialize_with(Song.resource_fields)
     def post(self, playlist_id):
         json_data = request.get_json()
         try:
@@ -197,50 +279,120 @@ class PlaylistAddSongsRoute(Resource):
         except ValidationError as error:
             abort(400, message=error.messages)
 
+        if not Playlist.select().where(Playlist.id == playlist_id).exists():
+            abort(404, message=f'Playlist with ID {playlist_id} not found')
+        playlist_id = int(playlist_id)
+
         songs_array = self.__verify_songs_from_id(json_data['song_ids'])
-        songs_to_playlist = [SongToPlaylist(
-            song_id=song['id'], playlist_id=playlist_id
-            ) for song in songs_array]
 
-        # Start transaction.
         # SongToPlaylist._meta referes to the Meta subclass of BaseModel.
-        with SongToPlaylist._meta.database.atomic():
-            try:
-                SongToPlaylist.bulk_create(songs_to_playlist, batch_size=100)
-            except DoesNotExist:
-                abort(404, message=f'Playlist with ID {playlist_id} not found')
-
-            self.__update_playlist_id(playlist_id)
+        changed_singer_ids, genre_changed = run_write(
+            SongToPlaylist._meta.database, self.__add_songs, playlist_id,
+            songs_array)
+        evict_playlist_songs(playlist_id, songs_array)
+        if genre_changed:
+            evict_playlists([playlist_id])
+        evict_singers(changed_singer_ids)
 
         return [song for song in songs_array]
 
+    def __add_songs(self, playlist_id, songs_array):
+        """
+        Add songs to a playlist, updating its genre and its singers' genre
+        counts. Songs already in the playlist are left out. Runs in a
+        transaction, in which the playlist's genre is read, so that
+        concurrent additions each start from the other's.
+        Returns the ids of the singers whose inferred genre changed, and
+        whether the playlist's genre changed.
+        """
+        songs_array = self.__new_songs(playlist_id, songs_array)
+        # Singers of the added songs not yet in the playlist.
+        new_singer_ids = {song['singer_id'] for song in songs_array}
+        new_singer_ids -= playlist_singer_ids(playlist_id, new_singer_ids)
+        old_genre_id = Playlist.get_by_id(playlist_id).genre_id_id
+
+        rows = [(song['id'], playlist_id) for song in songs_array]
+        # Every row binds two variables.
+        for rows_chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER // 2):
+            SongToPlaylist.insert_many(rows_chunk,
+                                       fields=[SongToPlaylist.song_id,
+                                               SongToPlaylist.playlist_id])\
+                          .on_conflict_ignore()\
+                          .execute()
+        if rows:
+            TableVersion.bump(SongToPlaylist)
+
+        genre_id = self.__update_playlist_id(playlist_id, old_genre_id,
+                                             songs_array)
+        if genre_id == old_genre_id:
+            return update_singer_genre_counts(new_singer_ids, set(),
+                                              old_genre_id, genre_id), False
+
+        singer_ids = playlist_singer_ids(playlist_id)
+        return update_singer_genre_counts(singer_ids,
+                                          singer_ids - new_singer_ids,
+                                          old_genre_id, genre_id), True
+
+    def __new_songs(self, playlist_id, songs_array):
+        """
+        Get the songs of songs_array not in a playlist yet, each once, in the
+        same order.
+        """
+        songs_by_id = {song['id']: song for song in songs_array}
+        for song_ids_chunk in chunked(list(songs_by_id),
+                                      SQLITE_MAX_VARIABLE_NUMBER - 1):
+            query = SongToPlaylist.select(SongToPlaylist.song_id)\
+                                  .where(
+                                      (SongToPlaylist.playlist_id ==
+                                       playlist_id) &
+                                      (SongToPlaylist.song_id.in_(
+                                          song_ids_chunk)))\
+                                  .tuples()
+            for song_id, in query:
+                del songs_by_id[song_id]
+
+        return list(songs_by_id.values())
+
     def __verify_songs_from_id(self, song_ids_list):
         """
-        Get all songs in the database from a list of ids.
+        Get all songs in the database from a list of ids, in the same order.
         It ensures that the povided song ids are found in the database while
         allowing to return the added songs.
+        Songs are looked up SQLITE_MAX_VARIABLE_NUMBER ids at a time, and all
+        the missing ids are reported at once.
         """
-        songs_array = []
-        for given_song_id in song_ids_list:
-            song_id = SongByIDRoute().get(given_song_id)
-            songs_array.append(song_id)
+        songs_by_id = {}
+        for song_ids_chunk in chunked(set(song_ids_list),
+                                      SQLITE_MAX_VARIABLE_NUMBER):
+            query = Song.select().where(Song.id.in_(song_ids_chunk)).dicts()
+            songs_by_id.update((song['id'], song) for song in query)
+
+        missing_song_ids = list(dict.fromkeys(
+            song_id for song_id in song_ids_list if song_id not in songs_by_id
+        ))
+        if missing_song_ids:
+            abort(404, message=f'Songs with IDs {missing_song_ids} not found',
+                  missing_song_ids=missing_song_ids)
 
-        return songs_array
+        return [songs_by_id[song_id] for song_id in song_ids_list]
 
-    def __update_playlist_id(self, playlist_id):
+    def __update_playlist_id(self, playlist_id, old_genre_id, songs_array):
         """
-        Update playlist's genre using the newly added songs.
+        Update the genre of a playlist, old_genre_id, using the newly added
+        songs. Only the added songs are counted, on top of the playlist's
+        genre counts. Returns the playlist's new genre id.
         """
-        songs_in_playlist = self.get(playlist_id)
+        genre_count_dict = count_playlist_genre(songs_array)
+        PlaylistGenreCount.add_songs(playlist_id, genre_count_dict)
+        genre_id = PlaylistGenreCount.playlist_genre(playlist_id)
 
-        genre_count_dict = count_playlist_genre(songs_in_playlist)
-        genre_id = max(genre_count_dict.items(),
-                       key=operator.itemgetter(1))[0]
+        if genre_id != old_genre_id:
+            Playlist.update(genre_id=genre_id)\
+                    .where(Playlist.id == playlist_id)\
+                    .execute()
+            TableVersion.bump(Playlist)
 
-        playlist = Playlist.get(Playlist.id == playlist_id)
-        playlist.genre_id = genre_id
-        with playlist._meta.database.atomic():
-            playlist.save()
+        return genre_id
 
     @swagger.operation(
         notes='get songs in a playlist',
@@ -255,25 +407,32 @@ class PlaylistAddSongsRoute(Resource):
                 'dataType': int.__name__,
                 'paramType': 'path'
             }
-        ],
+        ] + LIST_PARAMETERS,
         responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            },
             {
                 'code': 404,
                 'message': 'Playlist with ID <playlist_id> not found'
             }
         ]
     )
-    @marshal_with(Song.resource_fields)
+    @conditional(Playlist, SongToPlaylist, Song)
+    @serialize_with(Song.resource_fields)
     def get(self, playlist_id):
-        try:
-            songs_in_playlist = Song.select()\
-                                    .join(SongToPlaylist)\
-                                    .join(Playlist)\
-                                    .where(Playlist.id == playlist_id)
-        except DoesNotExist:
-            abort(404, message=f'Playlist with ID {singer_id} not found')
+        if not Playlist.select().where(Playlist.id == playlist_id).exists():
+            abort(404, message=f'Playlist with ID {playlist_id} not found')
 
-        return [song for song in songs_in_playlist.select().dicts()]
+        # Selecting songs by id keeps them in id order without sorting.
+        playlist_song_ids = SongToPlaylist.select(SongToPlaylist.song_id)\
+                                          .where(SongToPlaylist.playlist_id ==
+                                                 playlist_id)
+        songs_in_playlist = Song.select()\
+                                .where(Song.id.in_(playlist_song_ids))
+
+        return paginate(songs_in_playlist, Song.id)
 
 
 class PlaylistSingerRoute(Resource):
@@ -290,28 +449,32 @@ class PlaylistSingerRoute(Resource):
                 'dataType': int.__name__,
                 'paramType': 'path'
             }
-        ],
+        ] + LIST_PARAMETERS,
         responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            },
             {
                 'code': 404,
                 'message': 'Playlist with ID <playlist_id> not found'
             }
         ]
     )
-    @marshal_with(Singer.resource_fields)
+    @conditional(Playlist, SongToPlaylist, Song, Singer)
+    @cache_response(PLAYLIST_SINGERS, 'playlist_id')
+    @serialize_with(Singer.resource_fields)
     def get(self, playlist_id):
-        try:
-            singers_in_playlist = Singer.select()\
-                                        .distinct()\
-                                        .join(
-                                            Song,
-                                            on=(Singer.id == Song.singer_id)
-                                            )\
-                                        .switch(Song)\
-                                        .join(SongToPlaylist)\
-                                        .join(Playlist)\
-                                        .where(Playlist.id == playlist_id)
-        except DoesNotExist:
-            abort(404, message=f'Playlist with ID {singer_id} not found')
+        if not Playlist.select().where(Playlist.id == playlist_id).exists():
+            abort(404, message=f'Playlist with ID {playlist_id} not found')
+
+        # A semi-join: every singer is selected once without DISTINCT.
+        playlist_song_ids = SongToPlaylist.select(SongToPlaylist.song_id)\
+                                          .where(SongToPlaylist.playlist_id ==
+                                                 playlist_id)
+        singer_ids = Song.select(Song.singer_id)\
+                         .where(Song.id.in_(playlist_song_ids))
+        singers_in_playlist = Singer.select()\
+                                    .where(Singer.id.in_(singer_ids))
 
-        return [singer for singer in singers_in_playlist.select().dicts()]
+        return paginate(singers_in_playlist, Singer.id)
@@ -0,0 +1,163 @@
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from datetime import datetime, timezone
+from flask import g, request
+from genre_api.config.config import CONFIG
+
+PROFILING_CONFIG = CONFIG.get('profiling', {})
+
+# Header enabling the profiling of a request, set to the configured token.
+PROFILE_HEADER = 'X-Profile'
+# Header choosing where the profile goes: file, or inline to get its
+# summary as the response body.
+PROFILE_OUTPUT_HEADER = 'X-Profile-Output'
+OUTPUTS = ('file', 'inline')
+
+# Only one request is profiled at a time, the others running as usual:
+# tracemalloc is process wide, and profilers of concurrent threads would
+# disturb each other's timings.
+profiling_lock = threading.Lock()
+
+
+def profile_requested():
+    """
+    Tell whether the current request asks to be profiled, with the
+    configured token.
+    """
+    value = request.headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+
+    return hmac.compare_digest(value.encode(),
+                               str(PROFILING_CONFIG['token']).encode())
+
+
+def start_profile():
+    if not profile_requested() or not profiling_lock.acquire(blocking=False):
+        return
+
+    g.profile_tracemalloc = PROFILING_CONFIG.get('tracemalloc', False) and \
+        not tracemalloc.is_tracing()
+    if g.profile_tracemalloc:
+        tracemalloc.start()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def stop_profile():
+    """
+    Stop the profile of the current request, if any.
+    Returns its profiler, and its tracemalloc snapshot if taken.
+    """
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None, None
+
+    profiler.disable()
+    snapshot = None
+    if g.pop('profile_tracemalloc', False):
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    profiling_lock.release()
+    return profiler, snapshot
+
+
+def summarize_profile(profiler, snapshot, top):
+    """
+    Get the top functions of profiler by cumulative time and, given a
+    tracemalloc snapshot, the top lines by memory allocated, as text.
+    """
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative')\
+                                          .print_stats(top)
+    if snapshot is not None:
+        summary.write('Memory allocated by line:\n')
+        for statistic in snapshot.statistics('lineno')[:top]:
+            summary.write(f'{statistic}\n')
+
+    return summary.getvalue()
+
+
+def write_profile(profiler, snapshot, directory, top):
+    """
+    Write the profile of the current request to directory, named after its
+    time, method and route, as a pstats file and, given a tracemalloc
+    snapshot, a text file of the top lines by memory allocated.
+    Returns the name of the pstats file.
+    """
+    route = request.url_rule.rule if request.url_rule else request.path
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+    name = f"{timestamp}-{request.method}-" \
+           f"{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'}"
+
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+    if snapshot is not None:
+        with open(os.path.join(directory, f'{name}.memory.txt'), 'w') \
+                as memory_file:
+            for statistic in snapshot.statistics('lineno')[:top]:
+                memory_file.write(f'{statistic}\n')
+
+    return f'{name}.prof'
+
+
+def finish_profile(response):
+    """
+    Write the profile of the current request to the configured directory,
+    naming it in the X-Profile-File header, or replace the response's body
+    with its summary when inline output is asked.
+    """
+    profiler, snapshot = stop_profile()
+    if profiler is None:
+        return response
+
+    top = PROFILING_CONFIG.get('top', 30)
+    output = request.headers.get(PROFILE_OUTPUT_HEADER,
+                                 PROFILING_CONFIG.get('output', 'file'))
+    if output not in OUTPUTS:
+        output = 'file'
+
+    if output == 'inline':
+        response.direct_passthrough = False
+        response.set_data(summarize_profile(profiler, snapshot, top))
+        response.content_type = 'text/plain; charset=utf-8'
+        for header in ['Content-Encoding', 'Content-Disposition', 'ETag',
+                       'Last-Modified']:
+            response.headers.pop(header, None)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    response.headers['X-Profile-File'] = write_profile(
+        profiler, snapshot, PROFILING_CONFIG.get('directory', 'db/profiles'),
+        top)
+    return response
+
+
+def discard_profile(exception):
+    # A request which raised is not answered by after_request: its profile
+    # is dropped.
+    stop_profile()
+
+
+def register_profiling(app):
+    """
+    Profile the requests of app sending the X-Profile header, when enabled
+    in the profiling section of the configuration with a token. Otherwise
+    no hook is registered, leaving requests untouched.
+    """
+    if not PROFILING_CONFIG.get('enabled', False):
+        return
+    if not PROFILING_CONFIG.get('token'):
+        logging.warning('Profiling is enabled without token: disabled.')
+        return
+
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(discard_profile)
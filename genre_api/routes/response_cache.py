@@ -0,0 +1,266 @@
+from functools import wraps
+from flask import request, Response
+from flask_restful import Resource, fields as flask_fields
+from flask_restful_swagger import swagger
+from peewee import chunked
+from genre_api.config.config import CONFIG
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.group_commit import run_write
+from genre_api.models.table_version import TableVersion
+from genre_api.models.song import Song
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import playlist_singer_ids
+from genre_api.routes.cache_backends import (
+    CachedResponse, MemoryCacheBackend, FileCacheBackend)
+from genre_api.routes.serializers import serialize_with
+from genre_api.routes.streaming import ndjson_requested
+
+RESPONSE_CACHE_CONFIG = CONFIG.get('response_cache', {})
+
+# Tags of the cached relationship routes, suffixed by the listing entity id.
+SINGER_PLAYLISTS = 'singer_playlists'
+SONG_PLAYLISTS = 'song_playlists'
+PLAYLIST_SINGERS = 'playlist_singers'
+
+# Name of the response cache's version in TableVersion, bumped by every
+# eviction, so that worker processes caching responses in memory drop those
+# another process evicted.
+RESPONSE_CACHE_VERSION = 'response_cache'
+
+
+@swagger.model
+class ResponseCacheStats:
+    resource_fields = {
+        'hits': flask_fields.Integer(),
+        'misses': flask_fields.Integer(),
+        'hit_ratio': flask_fields.Float(),
+        'evictions': flask_fields.Integer(),
+        'entries': flask_fields.Integer(),
+        'size': flask_fields.Integer()
+    }
+
+
+class ResponseCache:
+    """
+    Cache of serialized responses, stored in backend for ttl seconds.
+    Hit, miss and eviction counters are kept by worker process.
+    Unless backend is shared, every eviction also bumps the response cache
+    version stored in the database, and every request compares it with the
+    last version seen by this process, clearing backend when another
+    process evicted responses since.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version = None
+
+    def check_version(self):
+        """
+        Clear backend when another process evicted responses since the last
+        check.
+        """
+        if self.backend.shared:
+            return
+
+        version = TableVersion.get_version(RESPONSE_CACHE_VERSION)
+        if version != self._version:
+            self.evictions += self.backend.clear()
+            self._version = version
+
+    def get(self, tag, variant):
+        response = self.backend.get(tag, variant)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return response
+
+    def set(self, tag, variant, response, generation):
+        self.backend.set(tag, variant, response, self.ttl, generation)
+
+    def evict(self, tags):
+        if tags:
+            self.evictions += self.backend.evict(list(tags))
+            self._bump_version()
+
+    def clear(self):
+        self.evictions += self.backend.clear()
+        self._bump_version()
+
+    def _bump_version(self):
+        if self.backend.shared:
+            return
+
+        database = TableVersion._meta.database
+        if database.in_transaction():
+            # Part of the caller's write, like a migration.
+            self._write_version()
+        else:
+            run_write(database, self._write_version)
+
+    def _write_version(self):
+        version = TableVersion.get_version(RESPONSE_CACHE_VERSION)
+        TableVersion.bump(RESPONSE_CACHE_VERSION)
+        # This process' own eviction does not clear its backend, unless an
+        # eviction of another process is still to be seen.
+        if version == self._version:
+            self._version = (version or 0) + 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': self.backend.entries_count(),
+            'size': self.backend.size()
+        }
+
+
+def create_response_cache(config):
+    """
+    Create the response cache described by config, None when disabled.
+    """
+    if not config.get('enabled', False):
+        return None
+
+    max_size = config.get('max_size', 16 * 1024 * 1024)
+    if config.get('backend', 'memory') == 'file':
+        backend = FileCacheBackend(
+            config.get('file', 'db/response_cache.db'), max_size)
+    else:
+        backend = MemoryCacheBackend(max_size)
+
+    return ResponseCache(backend, config.get('ttl', 60))
+
+
+response_cache = create_response_cache(RESPONSE_CACHE_CONFIG)
+
+
+def cache_response(tag_name, id_arg):
+    """
+    Cache the 200 responses of a GET handler listing things of the entity
+    whose id is the id_arg argument, under the tag_name:<id> tag.
+    Every query string and representation of the route is cached apart, and
+    evicting the tag drops them all.
+    Streamed responses are never cached.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            cache = response_cache
+            try:
+                tag = f'{tag_name}:{int(kwargs[id_arg])}'
+            except ValueError:
+                cache = None
+            if cache is None:
+                return f(*args, **kwargs)
+
+            cache.check_version()
+            variant = '{}|{}'.format(request.query_string.decode(),
+                                     'ndjson' if ndjson_requested()
+                                     else 'json')
+            cached = cache.get(tag, variant)
+            if cached is not None:
+                return Response(cached.body, cached.status, cached.headers)
+
+            # Read before the handler, so that an eviction happening while
+            # it runs prevents caching a response older than the eviction.
+            generation = cache.backend.generation()
+            resp = f(*args, **kwargs)
+            if isinstance(resp, Response) and resp.status_code == 200 and \
+                    not resp.is_streamed:
+                headers = [(key, value) for key, value in resp.headers.items()
+                           if key != 'Content-Length']
+                cache.set(tag, variant,
+                          CachedResponse(resp.status_code, headers,
+                                         resp.get_data()),
+                          generation)
+            return resp
+        return wrapper
+    return decorator
+
+
+def evict_responses(tags):
+    if response_cache is not None:
+        response_cache.evict(tags)
+
+
+def evict_all_responses():
+    """
+    Evict every cached response, after writes changing too many listings to
+    tell them apart, like imports.
+    """
+    if response_cache is not None:
+        response_cache.clear()
+
+
+def evict_playlist_songs(playlist_id, songs):
+    """
+    Evict the cached responses changed by adding songs, rows with id and
+    singer_id keys, to a playlist.
+    """
+    evict_responses(
+        {f'{PLAYLIST_SINGERS}:{playlist_id}'} |
+        {f"{SONG_PLAYLISTS}:{song['id']}" for song in songs} |
+        {f"{SINGER_PLAYLISTS}:{song['singer_id']}" for song in songs})
+
+
+def evict_playlists(playlist_ids):
+    """
+    Evict the cached responses listing playlists whose row changed.
+    """
+    if response_cache is None:
+        return
+
+    tags = set()
+    for playlist_id in playlist_ids:
+        tags.update(f'{SINGER_PLAYLISTS}:{singer_id}'
+                    for singer_id in playlist_singer_ids(playlist_id))
+        query = SongToPlaylist.select(SongToPlaylist.song_id)\
+                              .where(SongToPlaylist.playlist_id ==
+                                     playlist_id)\
+                              .tuples()
+        tags.update(f'{SONG_PLAYLISTS}:{song_id}' for song_id, in query)
+    evict_responses(tags)
+
+
+def evict_singers(singer_ids):
+    """
+    Evict the cached responses listing singers whose row changed.
+    """
+    if response_cache is None:
+        return
+
+    tags = set()
+    for singer_ids_chunk in chunked(singer_ids, SQLITE_MAX_VARIABLE_NUMBER):
+        query = SongToPlaylist.select(SongToPlaylist.playlist_id)\
+                              .distinct()\
+                              .join(Song)\
+                              .where(Song.singer_id.in_(singer_ids_chunk))\
+                              .tuples()
+        tags.update(f'{PLAYLIST_SINGERS}:{playlist_id}'
+                    for playlist_id, in query)
+    evict_responses(tags)
+
+
+class ResponseCacheRoute(Resource):
+    @swagger.operation(
+        notes='get the hit, miss and eviction counters of the response cache',
+        responseClass=ResponseCacheStats.__name__,
+        nickname='get'
+    )
+    @serialize_with(ResponseCacheStats.resource_fields)
+    def get(self):
+        if response_cache is None:
+            # Disabled: nothing was ever looked up.
+            return {key: 0 for key in ResponseCacheStats.resource_fields}
+
+        return response_cache.stats()
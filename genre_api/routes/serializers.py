@@ -0,0 +1,148 @@
+import json
+import time
+from functools import wraps
+from json.encoder import encode_basestring_ascii
+from flask import current_app, Response
+from flask_restful import fields as flask_fields, marshal, unpack
+from genre_api.config.config import CONFIG
+from genre_api.routes.server_timing import add_serialize_time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SERIALIZATION_CONFIG = CONFIG.get('serialization', {})
+# orjson writes compact JSON, so its output is not byte-identical to
+# json.dumps: it is only used when asked for.
+FAST_JSON = SERIALIZATION_CONFIG.get('fast_json', False) and \
+    orjson is not None
+
+JSON_MIMETYPE = 'application/json'
+
+
+class Serializer:
+    """
+    Serializer of rows compiled once from a resource_fields dictionary.
+    to_json(row) gives the same text as json.dumps(marshal(row, fields)) and
+    to_dict(row) the same values as marshal(row, fields), without walking the
+    fields for every row.
+    Fields other than Integer and String, or reading another attribute, go
+    through flask_restful's field output.
+    """
+
+    def __init__(self, resource_fields):
+        self.resource_fields = resource_fields
+
+        namespace = {
+            'fields': resource_fields,
+            'encode': encode_basestring_ascii,
+            'dumps': json.dumps
+        }
+        json_parts = []
+        dict_items = []
+        for index, (key, field) in enumerate(resource_fields.items()):
+            value = f'value_{index}'
+            get_value = f'({value} := row.get({key!r}))'
+            if type(field) is flask_fields.Integer and field.attribute is None:
+                default = f'default_{index}'
+                namespace[default] = field.default
+                namespace[f'{default}_json'] = json.dumps(field.default)
+                json_value = (f"({default}_json if {get_value} is None "
+                              f"else str(int({value})))")
+                dict_value = (f"({default} if {get_value} is None "
+                              f"else int({value}))")
+            elif type(field) is flask_fields.String and \
+                    field.attribute is None:
+                default = f'default_{index}'
+                namespace[default] = field.default
+                namespace[f'{default}_json'] = json.dumps(field.default)
+                json_value = (f"({default}_json if {get_value} is None "
+                              f"else encode(str({value})))")
+                dict_value = (f"({default} if {get_value} is None "
+                              f"else str({value}))")
+            else:
+                dict_value = f'fields[{key!r}].output({key!r}, row)'
+                json_value = f'dumps({dict_value})'
+
+            separator = '{' if index == 0 else ', '
+            json_parts.append(repr(f'{separator}{json.dumps(key)}: '))
+            json_parts.append(json_value)
+            dict_items.append(f'{key!r}: {dict_value}')
+        json_parts.append(repr('}' if json_parts else '{}'))
+
+        source = (
+            'def to_json(row):\n'
+            f"    return ''.join(({', '.join(json_parts)},))\n"
+            'def to_dict(row):\n'
+            f"    return {{{', '.join(dict_items)}}}\n"
+        )
+        exec(compile(source, f'<serializer {id(self)}>', 'exec'), namespace)
+        self.to_json = namespace['to_json']
+        self.to_dict = namespace['to_dict']
+
+    def dumps(self, data):
+        """
+        Serialize a row or a list of rows the way flask_restful's JSON
+        representation does, trailing newline included.
+        """
+        if FAST_JSON:
+            if isinstance(data, list):
+                data = [self.to_dict(row) for row in data]
+            else:
+                data = self.to_dict(data)
+            return orjson.dumps(data) + b'\n'
+
+        if isinstance(data, list):
+            return '[' + ', '.join(map(self.to_json, data)) + ']\n'
+        return self.to_json(data) + '\n'
+
+
+_serializers = {}
+
+
+def get_serializer(resource_fields):
+    """
+    Get the serializer compiled for resource_fields, compiling it on first
+    use.
+    """
+    serializer = _serializers.get(id(resource_fields))
+    if serializer is None or \
+            serializer.resource_fields is not resource_fields:
+        serializer = Serializer(resource_fields)
+        _serializers[id(resource_fields)] = serializer
+
+    return serializer
+
+
+def serialize_with(resource_fields):
+    """
+    Replacement for flask_restful's marshal_with, serializing the handler's
+    return value with a compiled serializer straight into a response.
+    Responses already built by the handler, such as streamed ones, are let
+    through untouched. In debug mode, or when RESTFUL_JSON settings are set,
+    the value is marshalled and left to flask_restful's JSON representation
+    so that those settings still apply.
+    """
+    serializer = get_serializer(resource_fields)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            resp = f(*args, **kwargs)
+            if isinstance(resp, Response):
+                return resp
+
+            data, code, headers = unpack(resp)
+            start_time = time.perf_counter()
+            try:
+                if current_app.debug or \
+                        current_app.config.get('RESTFUL_JSON'):
+                    return marshal(data, resource_fields), code, headers
+
+                return Response(serializer.dumps(data), code, headers,
+                                mimetype=JSON_MIMETYPE)
+            finally:
+                add_serialize_time(time.perf_counter() - start_time)
+        return wrapper
+    return decorator
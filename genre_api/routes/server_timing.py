@@ -0,0 +1,59 @@
+import logging
+from flask import g, request
+from genre_api.config.config import CONFIG
+from genre_api.models.meta import query_timer
+
+SERVER_TIMING_CONFIG = CONFIG.get('server_timing', {})
+
+# Requests running more statements get them logged, unless it is 0.
+QUERY_BUDGET = SERVER_TIMING_CONFIG.get('query_budget', 50)
+
+
+def start_timing():
+    query_timer.start()
+    g.serialize_seconds = 0.0
+
+
+def add_serialize_time(seconds):
+    """
+    Count seconds spent serializing the current request's response.
+    """
+    if 'serialize_seconds' in g:
+        g.serialize_seconds += seconds
+
+
+def add_server_timing(response):
+    """
+    Add to response a Server-Timing header giving the time spent executing
+    the request's SQL statements, their number, and the time spent
+    serializing the response. The statements of a streamed body run after
+    the header is sent, and are not counted.
+    """
+    statements = query_timer.stop()
+    database_seconds = sum(seconds for _, _, seconds in statements)
+    response.headers['Server-Timing'] = (
+        f'db;dur={database_seconds * 1000:.3f};'
+        f'desc="{len(statements)} queries", '
+        f"serialize;dur={g.get('serialize_seconds', 0.0) * 1000:.3f}")
+
+    if QUERY_BUDGET and len(statements) > QUERY_BUDGET:
+        logging.warning(
+            f'{request.method} {request.full_path} ran {len(statements)} '
+            f'statements, over the budget of {QUERY_BUDGET}, in '
+            f'{database_seconds * 1000:.3f} ms:\n' +
+            '\n'.join(f'  {seconds * 1000:.3f} ms {sql} {params}'
+                      for sql, params, seconds in statements))
+
+    return response
+
+
+def register_server_timing(app):
+    """
+    Time the SQL statements and serialization of every request of app,
+    unless disabled in the server_timing section of the configuration.
+    """
+    if not SERVER_TIMING_CONFIG.get('enabled', True):
+        return
+
+    app.before_request(start_timing)
+    app.after_request(add_server_timing)
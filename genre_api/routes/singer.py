@@ -1,26 +1,40 @@
 from flask import request
-from flask_restful import Resource, abort, marshal_with
+from flask_restful import Resource, abort
 from flask_restful_swagger import swagger
-from peewee import DoesNotExist
+from peewee import DoesNotExist, Case, chunked
 from marshmallow import ValidationError
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
 from genre_api.models.singer import *
-from genre_api.models.genre import Genre
+from genre_api.models.genre_cache import genre_cache
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.group_commit import run_write
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.pagination import paginate, LIST_PARAMETERS
+from genre_api.routes.serializers import serialize_with
+from genre_api.routes.conditional import conditional
+from genre_api.routes.response_cache import (
+    cache_response, evict_singers, SINGER_PLAYLISTS)
 
 
 class SingerRoute(Resource):
     @swagger.operation(
         notes='get all singer items',
         responseClass=Singer.__name__,
-        nickname='get'
+        nickname='get',
+        parameters=LIST_PARAMETERS,
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            }
+        ]
     )
-    @marshal_with(Singer.resource_fields)
+    @conditional(Singer)
+    @serialize_with(Singer.resource_fields)
     def get(self):
-        query = Singer.select().dicts()
-
-        return [row for row in query]
+        return paginate(Singer.select(), Singer.id)
 
     @swagger.operation(
         notes='post a singer item',
@@ -47,7 +61,7 @@ class SingerRoute(Resource):
             }
         ]
     )
-    @marshal_with(Singer.resource_fields)
+    @serialize_with(Singer.resource_fields)
     def post(self):
         json_data = request.get_json()
         try:
@@ -56,17 +70,184 @@ class SingerRoute(Resource):
             abort(400, message=error.messages)
 
         genre_id = json_data['genre_id']
-        try:
-            genre = Genre.get(Genre.id == genre_id)
-        except DoesNotExist:
+        genre = genre_cache.get(genre_id)
+        if genre is None:
             abort(404, message=f'Genre with ID {genre_id} not found')
 
         singer_name = json_data['name']
-        singer = Singer.create(name=singer_name, genre_id=genre.id,
-                               inferred_genre_id=None)
+        singer = run_write(Singer._meta.database, self.__create_singer,
+                           singer_name, genre['id'])
 
         return singer.select().where(Singer.id == singer.id).dicts().get()
 
+    def __create_singer(self, singer_name, genre_id):
+        singer = Singer.create(name=singer_name, genre_id=genre_id,
+                               inferred_genre_id=None)
+        TableVersion.bump(Singer)
+
+        return singer
+
+    @swagger.operation(
+        notes='update a list of singer items, each with only the given '
+              'fields; returns the status of every item',
+        responseClass=SingerPatchStatus.__name__,
+        nickname='patch',
+        parameters=[
+            {
+                'name': 'body',
+                'description': 'The list of singer updates',
+                'required': True,
+                'allowMultiple': True,
+                'dataType': SingerPatchSchema.__name__,
+                'paramType': 'body'
+            }
+        ],
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid JSON schema'
+            }
+        ]
+    )
+    @serialize_with(SingerPatchStatus.resource_fields)
+    def patch(self):
+        json_data = request.get_json()
+        try:
+            singer_updates = SingerPatchSchema(many=True).load(json_data)
+        except ValidationError as error:
+            abort(400, message=error.messages)
+
+        # Verifying every singer exists in one query, genres being cached.
+        found_singer_ids = Singer.existing_ids(
+            {singer_update['id'] for singer_update in singer_updates})
+        found_genre_ids = genre_cache.existing_ids({
+            singer_update[field]
+            for singer_update in singer_updates
+            for field in ('genre_id', 'inferred_genre_id')
+            if singer_update.get(field) is not None
+        })
+
+        statuses = []
+        # Updates merged by singer, later items overriding earlier ones.
+        merged_updates = {}
+        for singer_update in singer_updates:
+            singer_id = singer_update.pop('id')
+            missing_genre_ids = [
+                singer_update[field]
+                for field in ('genre_id', 'inferred_genre_id')
+                if singer_update.get(field) is not None
+                and singer_update[field] not in found_genre_ids
+            ]
+            if singer_id not in found_singer_ids:
+                statuses.append({
+                    'id': singer_id,
+                    'status': 404,
+                    'message': f'Singer with ID {singer_id} not found'
+                })
+            elif missing_genre_ids:
+                statuses.append({
+                    'id': singer_id,
+                    'status': 404,
+                    'message': f'Genre with ID {missing_genre_ids[0]} '
+                               'not found'
+                })
+            else:
+                merged_updates.setdefault(singer_id, {}).update(singer_update)
+                statuses.append({
+                    'id': singer_id,
+                    'status': 200,
+                    'message': f'Singer with ID {singer_id} updated'
+                })
+
+        self.__update_singers(merged_updates)
+        evict_singers(list(merged_updates))
+
+        return statuses
+
+    def __update_singers(self, merged_updates):
+        """
+        Apply updates, a dictionary of field values by singer id, with one
+        UPDATE statement per field and chunk of singers.
+        Each chunk is written in its own transaction.
+        """
+        # Every singer binds two variables in the CASE and one in the IN.
+        chunk_size = SQLITE_MAX_VARIABLE_NUMBER // 3
+        for updates_chunk in chunked(merged_updates.items(), chunk_size):
+            run_write(Singer._meta.database, self.__update_singers_chunk,
+                      updates_chunk)
+
+    def __update_singers_chunk(self, updates_chunk):
+        for field_name in ('name', 'genre_id', 'inferred_genre_id'):
+            values = [(singer_id, singer_update[field_name])
+                      for singer_id, singer_update in updates_chunk
+                      if field_name in singer_update]
+            if not values:
+                continue
+
+            field = getattr(Singer, field_name)
+            singer_ids = [singer_id for singer_id, _ in values]
+            Singer.update({field: Case(Singer.id, values)})\
+                  .where(Singer.id.in_(singer_ids))\
+                  .execute()
+        TableVersion.bump(Singer)
+
+
+class SingerBulkRoute(Resource):
+    @swagger.operation(
+        notes='post a list of singer items, either all created or none',
+        responseClass=Singer.__name__,
+        nickname='post',
+        parameters=[
+            {
+                'name': 'body',
+                'description': 'The added singers',
+                'required': True,
+                'allowMultiple': True,
+                'dataType': SingerSchema.__name__,
+                'paramType': 'body'
+            }
+        ],
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid JSON schema'
+            },
+            {
+                'code': 404,
+                'message': 'Genres with IDs <genre_ids> not found'
+            }
+        ]
+    )
+    @serialize_with(Singer.resource_fields)
+    def post(self):
+        json_data = request.get_json()
+        try:
+            singers = SingerSchema(many=True).load(json_data)
+        except ValidationError as error:
+            abort(400, message=error.messages)
+
+        genre_ids = [singer['genre_id'] for singer in singers]
+        found_genre_ids = genre_cache.existing_ids(genre_ids)
+        missing_genre_ids = list(dict.fromkeys(
+            genre_id for genre_id in genre_ids
+            if genre_id not in found_genre_ids
+        ))
+        if missing_genre_ids:
+            abort(404,
+                  message=f'Genres with IDs {missing_genre_ids} not found',
+                  missing_genre_ids=missing_genre_ids)
+
+        rows = [{'name': singer['name'], 'genre_id': singer['genre_id'],
+                 'inferred_genre_id': None} for singer in singers]
+
+        return run_write(Singer._meta.database, self.__create_singers, rows)
+
+    def __create_singers(self, rows):
+        rows = Singer.insert_rows(rows)
+        TableVersion.bump(Singer)
+
+        return rows
+
 
 class SingerByIDRoute(Resource):
     @swagger.operation(
@@ -90,7 +271,8 @@ class SingerByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Singer.resource_fields)
+    @conditional(Singer)
+    @serialize_with(Singer.resource_fields)
     def get(self, singer_id):
         try:
             query = Singer.select().where(Singer.id == singer_id).dicts().get()
@@ -128,7 +310,7 @@ class SingerByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Singer.resource_fields)
+    @serialize_with(Singer.resource_fields)
     def put(self, singer_id):
         json_data = request.get_json()
         try:
@@ -144,9 +326,7 @@ class SingerByIDRoute(Resource):
 
         # Verifying genre exists
         genre_id = json_data['genre_id']
-        try:
-            genre = Genre.get(Genre.id == genre_id)
-        except DoesNotExist:
+        if genre_cache.get(genre_id) is None:
             abort(404, message=f'Genre with ID {genre_id} not found')
         singer.genre_id = genre_id
 
@@ -155,11 +335,15 @@ class SingerByIDRoute(Resource):
         inferred_genre_id = json_data['inferred_genre_id']
         singer.inferred_genre_id = inferred_genre_id
 
-        with singer._meta.database.atomic():
-            singer.save()
+        run_write(singer._meta.database, self.__save_singer, singer)
+        evict_singers([singer.id])
 
         return singer.select().where(Singer.id == singer_id).dicts().get()
 
+    def __save_singer(self, singer):
+        singer.save()
+        TableVersion.bump(Singer)
+
 
 class SingerSongsRoute(Resource):
     @swagger.operation(
@@ -175,22 +359,28 @@ class SingerSongsRoute(Resource):
                 'dataType': int.__name__,
                 'paramType': 'path'
             }
-        ],
+        ] + LIST_PARAMETERS,
         responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            },
             {
                 'code': 404,
                 'message': 'Singer with ID <singer_id> not found'
             }
         ]
     )
-    @marshal_with(Song.resource_fields)
+    @conditional(Singer, Song)
+    @serialize_with(Song.resource_fields)
     def get(self, singer_id):
         try:
             singer = Singer.get(Singer.id == singer_id)
         except DoesNotExist:
             abort(404, message=f'Singer with ID {singer_id} not found')
 
-        return [song for song in singer.songs.select().dicts()]
+        return paginate(Song.select().where(Song.singer_id == singer.id),
+                        Song.id)
 
 
 class SingerPlaylistsRoute(Resource):
@@ -207,27 +397,32 @@ class SingerPlaylistsRoute(Resource):
                 'dataType': int.__name__,
                 'paramType': 'path'
             }
-        ],
+        ] + LIST_PARAMETERS,
         responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            },
             {
                 'code': 404,
                 'message': 'Singer with ID <singer_id> not found'
             }
         ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @conditional(Singer, Song, SongToPlaylist, Playlist)
+    @cache_response(SINGER_PLAYLISTS, 'singer_id')
+    @serialize_with(Playlist.resource_fields)
     def get(self, singer_id):
-        try:
-            songs = Song.get(Song.singer_id == singer_id).alias('songs')
-            singer_playlists = Playlist.select()\
-                                       .distinct()\
-                                       .join(SongToPlaylist)\
-                                       .join(songs)\
-                                       .where(
-                                           SongToPlaylist.song_id == songs.id
-                                           )\
-                                       .where(songs.singer_id == singer_id)
-        except DoesNotExist:
+        if not Singer.select().where(Singer.id == singer_id).exists():
             abort(404, message=f'Singer with ID {singer_id} not found')
 
-        return [playlist for playlist in singer_playlists.select().dicts()]
+        # A semi-join: every playlist is selected once without DISTINCT.
+        singer_song_ids = Song.select(Song.id)\
+                              .where(Song.singer_id == singer_id)
+        playlist_ids = SongToPlaylist.select(SongToPlaylist.playlist_id)\
+                                     .where(SongToPlaylist.song_id.in_(
+                                         singer_song_ids))
+        singer_playlists = Playlist.select()\
+                                   .where(Playlist.id.in_(playlist_ids))
+
+        return paginate(singer_playlists, Playlist.id)
@@ -1,26 +1,38 @@
 from flask import request
-from flask_restful import Resource, abort, marshal_with
+from flask_restful import Resource, abort
 from flask_restful_swagger import swagger
 from peewee import DoesNotExist
 from marshmallow import ValidationError
 from genre_api.models.song import Song, SongSchema
 from genre_api.models.singer import Singer
-from genre_api.models.genre import Genre
+from genre_api.models.genre_cache import genre_cache
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.group_commit import run_write
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.pagination import paginate, LIST_PARAMETERS
+from genre_api.routes.serializers import serialize_with
+from genre_api.routes.conditional import conditional
+from genre_api.routes.response_cache import cache_response, SONG_PLAYLISTS
 
 
 class SongRoute(Resource):
     @swagger.operation(
         notes='get all song items',
         responseClass=Song.__name__,
-        nickname='get'
+        nickname='get',
+        parameters=LIST_PARAMETERS,
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            }
+        ]
     )
-    @marshal_with(Song.resource_fields)
+    @conditional(Song)
+    @serialize_with(Song.resource_fields)
     def get(self):
-        query = Song.select().dicts()
-
-        return [row for row in query]
+        return paginate(Song.select(), Song.id)
 
     @swagger.operation(
         notes='post a song item',
@@ -51,7 +63,7 @@ class SongRoute(Resource):
             }
         ]
     )
-    @marshal_with(Song.resource_fields)
+    @serialize_with(Song.resource_fields)
     def post(self):
         json_data = request.get_json()
         try:
@@ -66,17 +78,98 @@ class SongRoute(Resource):
             abort(404, message=f'Singer with ID {singer_id} not found')
 
         genre_id = json_data['genre_id']
-        try:
-            genre = Genre.get(Genre.id == genre_id)
-        except DoesNotExist:
+        genre = genre_cache.get(genre_id)
+        if genre is None:
             abort(404, message=f'Genre with ID {genre_id} not found')
 
+        # A new song is in no playlist yet, so the singer genre counts are
+        # left untouched until it is added to one.
         song_title = json_data['title']
-        song = Song.create(title=song_title, singer_id=singer.id,
-                           genre_id=genre.id)
+        song = run_write(Song._meta.database, self.__create_song,
+                         song_title, singer.id, genre['id'])
 
         return song.select().where(Song.id == song.id).dicts().get()
 
+    def __create_song(self, song_title, singer_id, genre_id):
+        song = Song.create(title=song_title, singer_id=singer_id,
+                           genre_id=genre_id)
+        TableVersion.bump(Song)
+
+        return song
+
+
+class SongBulkRoute(Resource):
+    @swagger.operation(
+        notes='post a list of song items, either all created or none',
+        responseClass=Song.__name__,
+        nickname='post',
+        parameters=[
+            {
+                'name': 'body',
+                'description': 'The added songs',
+                'required': True,
+                'allowMultiple': True,
+                'dataType': SongSchema.__name__,
+                'paramType': 'body'
+            }
+        ],
+        responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid JSON schema'
+            },
+            {
+                'code': 404,
+                'message': 'Singers with IDs <singer_ids> not found'
+            },
+            {
+                'code': 404,
+                'message': 'Genres with IDs <genre_ids> not found'
+            }
+        ]
+    )
+    @serialize_with(Song.resource_fields)
+    def post(self):
+        json_data = request.get_json()
+        try:
+            songs = SongSchema(many=True).load(json_data)
+        except ValidationError as error:
+            abort(400, message=error.messages)
+
+        singer_ids = [song['singer_id'] for song in songs]
+        found_singer_ids = Singer.existing_ids(set(singer_ids))
+        missing_singer_ids = list(dict.fromkeys(
+            singer_id for singer_id in singer_ids
+            if singer_id not in found_singer_ids
+        ))
+        if missing_singer_ids:
+            abort(404,
+                  message=f'Singers with IDs {missing_singer_ids} not found',
+                  missing_singer_ids=missing_singer_ids)
+
+        genre_ids = [song['genre_id'] for song in songs]
+        found_genre_ids = genre_cache.existing_ids(genre_ids)
+        missing_genre_ids = list(dict.fromkeys(
+            genre_id for genre_id in genre_ids
+            if genre_id not in found_genre_ids
+        ))
+        if missing_genre_ids:
+            abort(404,
+                  message=f'Genres with IDs {missing_genre_ids} not found',
+                  missing_genre_ids=missing_genre_ids)
+
+        # A new song is in no playlist yet, see SongRoute.post.
+        rows = [{'title': song['title'], 'singer_id': song['singer_id'],
+                 'genre_id': song['genre_id']} for song in songs]
+
+        return run_write(Song._meta.database, self.__create_songs, rows)
+
+    def __create_songs(self, rows):
+        rows = Song.insert_rows(rows)
+        TableVersion.bump(Song)
+
+        return rows
+
 
 class SongByIDRoute(Resource):
     @swagger.operation(
@@ -100,7 +193,8 @@ class SongByIDRoute(Resource):
             }
         ]
     )
-    @marshal_with(Song.resource_fields)
+    @conditional(Song)
+    @serialize_with(Song.resource_fields)
     def get(self, song_id):
         try:
             query = Song.select().where(Song.id == song_id).dicts().get()
@@ -124,23 +218,29 @@ class SongPlaylistsRoute(Resource):
                 'dataType': int.__name__,
                 'paramType': 'path'
             }
-        ],
+        ] + LIST_PARAMETERS,
         responseMessages=[
+            {
+                'code': 400,
+                'message': 'Invalid limit or cursor'
+            },
             {
                 'code': 404,
                 'message': 'Song with ID <song_id> not found'
             }
         ]
     )
-    @marshal_with(Playlist.resource_fields)
+    @conditional(Song, SongToPlaylist, Playlist)
+    @cache_response(SONG_PLAYLISTS, 'song_id')
+    @serialize_with(Playlist.resource_fields)
     def get(self, song_id):
-        try:
-            playlists_have_song = Playlist.select()\
-                                          .distinct()\
-                                          .join(SongToPlaylist)\
-                                          .join(Song)\
-                                          .where(Song.id == song_id)
-        except DoesNotExist:
+        if not Song.select().where(Song.id == song_id).exists():
             abort(404, message=f'Song with ID {song_id} not found')
 
-        return [playlist for playlist in playlists_have_song.select().dicts()]
+        # A semi-join: every playlist is selected once without DISTINCT.
+        playlist_ids = SongToPlaylist.select(SongToPlaylist.playlist_id)\
+                                     .where(SongToPlaylist.song_id == song_id)
+        playlists_have_song = Playlist.select()\
+                                      .where(Playlist.id.in_(playlist_ids))
+
+        return paginate(playlists_have_song, Playlist.id)
@@ -0,0 +1,83 @@
+from flask import request, Response, stream_with_context
+from genre_api.routes.serializers import get_serializer, JSON_MIMETYPE
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+STREAMING_PARAMETERS = [
+    {
+        'name': 'stream',
+        'description': 'Set to 1 to stream every item instead of a page, as a '
+                       'JSON array or as NDJSON when the request accepts '
+                       f'{NDJSON_MIMETYPE}',
+        'required': False,
+        'allowMultiple': False,
+        'dataType': int.__name__,
+        'paramType': 'query'
+    }
+]
+
+
+def ndjson_requested():
+    return request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_requested():
+    """
+    Tell whether the client asked for every item to be streamed, either with
+    the stream argument or by accepting NDJSON.
+    """
+    return request.args.get('stream') in ('1', 'true') or ndjson_requested()
+
+
+def generate_body(rows, serializer, ndjson):
+    """
+    Generate the streamed body of rows, as NDJSON or as a JSON array.
+    """
+    if ndjson:
+        for row in rows:
+            yield serializer.to_json(row) + '\n'
+        return
+
+    # Same layout as the non streamed JSON responses.
+    separator = '['
+    for row in rows:
+        yield separator + serializer.to_json(row)
+        separator = ', '
+    yield ']\n' if separator == ', ' else '[]\n'
+
+
+def stream_response(query):
+    """
+    Stream every row of a query, serialized with its model's compiled
+    serializer as soon as the database cursor produces it.
+    The body is NDJSON when the client accepts it, a JSON array otherwise.
+    """
+    serializer = get_serializer(query.model.resource_fields)
+    database = query.model._meta.database
+    ndjson = ndjson_requested()
+
+    def generate():
+        # The request's connection may be closed before the body is sent.
+        opened = database.connect(reuse_if_open=True)
+        try:
+            yield from generate_body(query.dicts().iterator(), serializer,
+                                     ndjson)
+        finally:
+            if opened:
+                database.close()
+
+    return Response(stream_with_context(generate()),
+                    mimetype=NDJSON_MIMETYPE if ndjson else JSON_MIMETYPE)
+
+
+def stream_rows_response(rows, resource_fields):
+    """
+    Stream rows already in memory, such as cached ones, the same way
+    stream_response streams a query.
+    """
+    serializer = get_serializer(resource_fields)
+    ndjson = ndjson_requested()
+
+    return Response(generate_body(rows, serializer, ndjson),
+                    mimetype=NDJSON_MIMETYPE if ndjson else JSON_MIMETYPE)
@@ -1,28 +1,72 @@
+import argparse
 import requests
 import json
-import operator
 import logging
+import time
 from genre_api.config.config import CONFIG
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from peewee import fn, chunked
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.response_cache import evict_singers
 from genre_api.scripts.errors import APIError
 
 URL = f"http://{CONFIG['flask']['host']}:5000"
+CLIENT_CONFIG = CONFIG.get('calc_inferred_genre', {})
+
+# Keep one variable free for the genre ID bound in the UPDATE statement.
+UPDATE_CHUNK_SIZE = SQLITE_MAX_VARIABLE_NUMBER - 1
+
+
+def get_pages(session, url, timeout=None, params=None):
+    """
+    Iterate over the pages of a list route, following the next links given by
+    the API. Yields (status_code, page) tuples and stops on the first error.
+    session is either a requests Session or the requests module itself.
+    """
+    while url:
+        rq = session.get(url, params=params, timeout=timeout)
+        yield rq.status_code, rq.json()
+        if rq.status_code != 200:
+            return
+        url = rq.links.get('next', {}).get('url')
+        # The next link already carries the query parameters.
+        params = None
+
+
+def get_all_pages(session, url, timeout=None, params=None):
+    """
+    Retrieve every item of a list route, page after page.
+    Returns the status code and items, or the first error met.
+    """
+    items = []
+    for rsp_code, page in get_pages(session, url, timeout, params):
+        if rsp_code != 200:
+            return rsp_code, page
+        items.extend(page)
+
+    return 200, items
 
 
 def get_all_singers():
     """
     Retrieve all singers from API.
     """
-    rq = requests.get(f'{URL}/singers')
-    return rq.status_code, rq.json()
+    return get_all_pages(requests, f'{URL}/singers')
 
 
 def get_playlists_for_singer(singer):
     """
     Retrieve all playlist a singer is in from API.
     """
-    rq = requests.get(f"{URL}/singers/{singer['id']}/playlists")
-    return rq.status_code, rq.json()
+    return get_all_pages(requests, f"{URL}/singers/{singer['id']}/playlists")
 
 
 def count_playlist_genre(playlists_array):
@@ -38,6 +82,22 @@ def count_playlist_genre(playlists_array):
     return genre_count_dict
 
 
+def pick_inferred_genre(genre_count_dict):
+    """
+    Get the genre id with the highest count in genre_count_dict.
+    Ties go to the lowest genre id so that every mode of this script agrees,
+    and playlists without a genre are ignored. Returns None when no genre is
+    left to pick from.
+    """
+    counted_genres = [(genre_id, count)
+                      for genre_id, count in genre_count_dict.items()
+                      if genre_id]
+    if not counted_genres:
+        return None
+
+    return min(counted_genres, key=lambda item: (-item[1], item[0]))[0]
+
+
 def update_singer_genre(singer, inferred_genre_id):
     """
     Use the API to update a singer's inferred_genre using calc_inferred_genre
@@ -64,18 +124,226 @@ def calc_inferred_genre():
     for singer in singers_array:
         rsp_code, playlists_array = get_playlists_for_singer(singer)
         if rsp_code != 200:
-            logging.warning(f'{rsp_code} - {singers_array}')
+            logging.warning(f'{rsp_code} - {playlists_array}')
             continue
         genre_count_dict = count_playlist_genre(playlists_array)
-        # Get the key with the highest value in genre_count_dict
-        inferred_genre_id = max(genre_count_dict.items(),
-                                key=operator.itemgetter(1))[0]
+        inferred_genre_id = pick_inferred_genre(genre_count_dict)
+        if inferred_genre_id is None:
+            continue
 
         rsp_code, singer = update_singer_genre(singer, inferred_genre_id)
         if rsp_code != 200:
-            logging.warning(f'{rsp_code} - {singers_array}')
+            logging.warning(f'{rsp_code} - {singer}')
             continue
 
 
+def create_session(workers, retries):
+    """
+    Create a requests Session keeping up to workers connections alive to the
+    API, retrying failed requests up to retries times.
+    """
+    retry = Retry(total=retries, backoff_factor=0.1,
+                  status_forcelist=[500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def process_singer(session, url, timeout, singer):
+    """
+    Fetch the playlists of a singer and update the singer's inferred_genre.
+    Returns True when the singer was updated. Like in calc_inferred_genre, a
+    failure is logged and the singer left as is, including requests which
+    still failed after the session's retries, timed out or could not connect.
+    """
+    try:
+        rsp_code, playlists_array = get_all_pages(
+            session, f"{url}/singers/{singer['id']}/playlists", timeout)
+        if rsp_code != 200:
+            logging.warning(f'{rsp_code} - {playlists_array}')
+            return False
+
+        genre_count_dict = count_playlist_genre(playlists_array)
+        inferred_genre_id = pick_inferred_genre(genre_count_dict)
+        if inferred_genre_id is None:
+            return False
+
+        singer_update = {
+            'name': singer['name'],
+            'genre_id': singer['genre_id'],
+            'inferred_genre_id': inferred_genre_id
+        }
+        rq = session.put(f"{url}/singers/{singer['id']}", json=singer_update,
+                         timeout=timeout)
+        if rq.status_code != 200:
+            logging.warning(f'{rq.status_code} - {rq.json()}')
+            return False
+    except requests.RequestException as error:
+        logging.warning(f'{type(error).__name__} - {error}')
+        return False
+
+    return True
+
+
+def calc_inferred_genre_concurrent(url=URL,
+                                   workers=CLIENT_CONFIG.get('workers', 8),
+                                   retries=CLIENT_CONFIG.get('retries', 3),
+                                   timeout=CLIENT_CONFIG.get('timeout', 10),
+                                   page_size=CLIENT_CONFIG.get('page_size',
+                                                               500)):
+    """
+    Same as calc_inferred_genre, with singers processed by a pool of workers
+    sharing persistent connections to the API.
+    Singers are paged through and handed to the workers as pages come in,
+    keeping a bounded number of them in flight.
+    Returns a report with the number of singers processed and updated, the
+    wall time in seconds and the throughput in singers per second.
+    """
+    start_time = time.perf_counter()
+    session = create_session(workers, retries)
+    max_pending = workers * 4
+    pending = set()
+    singers_processed = 0
+    singers_updated = 0
+
+    with session, ThreadPoolExecutor(max_workers=workers) as executor:
+        for rsp_code, singers_array in get_pages(
+                session, f'{url}/singers', timeout,
+                params={'limit': page_size}):
+            if rsp_code != 200:
+                raise APIError(rsp_code, singers_array)
+
+            for singer in singers_array:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    singers_updated += sum(future.result()
+                                           for future in done)
+                pending.add(executor.submit(process_singer, session, url,
+                                            timeout, singer))
+                singers_processed += 1
+
+        singers_updated += sum(future.result()
+                               for future in wait(pending).done)
+
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        'singers_processed': singers_processed,
+        'singers_updated': singers_updated,
+        'wall_time': wall_time,
+        'singers_per_second': singers_processed / wall_time
+    }
+
+
+def query_singer_genre_counts():
+    """
+    Build the grouped query counting, for every singer, the distinct playlists
+    of each genre the singer appears in.
+    Rows are (singer_id, genre_id, playlist_count) tuples, ordered so that the
+    first row of every singer holds its inferred genre.
+    """
+    playlist_count = fn.COUNT(Playlist.id.distinct())
+
+    return Song.select(Song.singer_id, Playlist.genre_id,
+                       playlist_count.alias('playlist_count'))\
+               .join(SongToPlaylist)\
+               .join(Playlist)\
+               .where(Playlist.genre_id.is_null(False))\
+               .group_by(Song.singer_id, Playlist.genre_id)\
+               .order_by(Song.singer_id, playlist_count.desc(),
+                         Playlist.genre_id)\
+               .tuples()
+
+
+def apply_inferred_genres(inferred_genres, chunk_size=UPDATE_CHUNK_SIZE):
+    """
+    Write inferred_genres, a singer id to genre id mapping, in a single
+    transaction.
+    Singers sharing an inferred genre are updated together, chunk_size at a
+    time, so the number of statements depends on the number of genres rather
+    than on the number of singers.
+    """
+    singers_by_genre = defaultdict(list)
+    for singer_id, genre_id in inferred_genres.items():
+        singers_by_genre[genre_id].append(singer_id)
+
+    with Singer._meta.database.atomic():
+        for genre_id, singer_ids in singers_by_genre.items():
+            for singer_ids_chunk in chunked(singer_ids, chunk_size):
+                Singer.update(inferred_genre_id=genre_id)\
+                      .where(Singer.id.in_(singer_ids_chunk))\
+                      .execute()
+        if singers_by_genre:
+            TableVersion.bump(Singer)
+
+
+def calc_inferred_genre_engine(chunk_size=UPDATE_CHUNK_SIZE):
+    """
+    Compute every singer's inferred_genre directly on the database, using one
+    grouped query instead of one API round trip per singer.
+    Only singers whose inferred_genre changes are written, and the cached
+    responses listing them evicted.
+    Returns a report with the number of grouped rows scanned, the number of
+    singers changed and the wall time in seconds.
+    """
+    start_time = time.perf_counter()
+
+    rows_scanned = 0
+    inferred_genres = {}
+    for singer_id, genre_id, _ in query_singer_genre_counts().iterator():
+        rows_scanned += 1
+        inferred_genres.setdefault(singer_id, genre_id)
+
+    current_genres = dict(Singer.select(Singer.id, Singer.inferred_genre_id)
+                                .tuples()
+                                .iterator())
+    changed_genres = {
+        singer_id: genre_id
+        for singer_id, genre_id in inferred_genres.items()
+        if current_genres.get(singer_id) != genre_id
+    }
+    apply_inferred_genres(changed_genres, chunk_size=chunk_size)
+    evict_singers(list(changed_genres))
+
+    return {
+        'rows_scanned': rows_scanned,
+        'rows_changed': len(changed_genres),
+        'wall_time': time.perf_counter() - start_time
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Update singers' inferred genre from their playlists.")
+    parser.add_argument(
+        '--mode', choices=['http', 'concurrent', 'engine'], default='http',
+        help='go through the API one singer at a time (http) or with a pool '
+             'of workers (concurrent), or query the database directly '
+             '(engine)')
+    parser.add_argument(
+        '--chunk-size', type=int, default=UPDATE_CHUNK_SIZE,
+        help='number of singers written per UPDATE statement in engine mode')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    calc_inferred_genre()
+    args = parse_args()
+    if args.mode == 'engine':
+        with Singer._meta.database.connection_context():
+            report = calc_inferred_genre_engine(chunk_size=args.chunk_size)
+        print(f"Scanned {report['rows_scanned']} rows, "
+              f"changed {report['rows_changed']} singers "
+              f"in {report['wall_time']:.3f}s")
+    elif args.mode == 'concurrent':
+        report = calc_inferred_genre_concurrent()
+        print(f"Processed {report['singers_processed']} singers, "
+              f"updated {report['singers_updated']} "
+              f"in {report['wall_time']:.3f}s "
+              f"({report['singers_per_second']:.1f} singers/sec)")
+    else:
+        calc_inferred_genre()
@@ -0,0 +1,197 @@
+import argparse
+import sys
+from peewee import fn, chunked
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.response_cache import evict_playlists, evict_singers
+from genre_api.scripts.calc_inferred_genre import (
+    query_singer_genre_counts, apply_inferred_genres)
+
+
+def diff_counts(stored_counts, expected_counts):
+    """
+    Compare two dictionaries of counts keyed by (entity id, genre id).
+    Returns a sorted list of (key, stored count, expected count) tuples for
+    every key whose counts differ, a missing count being None.
+    """
+    keys = set(stored_counts) | set(expected_counts)
+
+    return sorted(
+        (key, stored_counts.get(key), expected_counts.get(key))
+        for key in keys
+        if stored_counts.get(key) != expected_counts.get(key)
+    )
+
+
+def select_counts(count_fields):
+    """
+    Read a count table as a dictionary of counts keyed by (entity id,
+    genre id), count_fields being its entity id, genre id and count fields.
+    """
+    model = count_fields[0].model
+
+    return {
+        (entity_id, genre_id): count
+        for entity_id, genre_id, count
+        in model.select(*count_fields).tuples().iterator()
+    }
+
+
+def replace_counts(count_fields, counts):
+    """
+    Replace the content of a count table by counts, a dictionary of counts
+    keyed by (entity id, genre id).
+    """
+    model = count_fields[0].model
+    rows = [(entity_id, genre_id, count)
+            for (entity_id, genre_id), count in counts.items()]
+
+    model.delete().execute()
+    # Every row binds three variables.
+    for rows_chunk in chunked(rows, SQLITE_MAX_VARIABLE_NUMBER // 3):
+        model.insert_many(rows_chunk, fields=count_fields).execute()
+
+
+def rebuild_singer_genre_counts():
+    """
+    Recompute the singer genre counts from scratch, without writing them.
+    """
+    return {
+        (singer_id, genre_id): playlist_count
+        for singer_id, genre_id, playlist_count
+        in query_singer_genre_counts().iterator()
+    }
+
+
+def check_singer_genre_counts(repair=False):
+    """
+    Diff the stored singer genre counts against a rebuild from scratch.
+    With repair, the stored counts are replaced by the rebuilt ones and every
+    singer's inferred genre is refreshed from them, evicting the cached
+    responses listing the singers changed.
+    Returns the differences found before any repair.
+    """
+    count_fields = [SingerGenreCount.singer_id, SingerGenreCount.genre_id,
+                    SingerGenreCount.playlist_count]
+    expected_counts = rebuild_singer_genre_counts()
+    differences = diff_counts(select_counts(count_fields), expected_counts)
+
+    if repair:
+        with SingerGenreCount._meta.database.atomic():
+            replace_counts(count_fields, expected_counts)
+
+            current_genres = dict(Singer.select(Singer.id,
+                                                Singer.inferred_genre_id)
+                                        .tuples()
+                                        .iterator())
+            inferred_genres = SingerGenreCount.inferred_genres(
+                list(current_genres))
+            changed_genres = {
+                singer_id: genre_id
+                for singer_id, genre_id in inferred_genres.items()
+                if current_genres[singer_id] != genre_id
+            }
+            apply_inferred_genres(changed_genres)
+        evict_singers(list(changed_genres))
+
+    return differences
+
+
+def rebuild_playlist_genre_counts():
+    """
+    Recompute the playlist genre counts from scratch, without writing them.
+    """
+    query = SongToPlaylist.select(SongToPlaylist.playlist_id, Song.genre_id,
+                                  fn.COUNT(SongToPlaylist.id))\
+                          .join(Song)\
+                          .group_by(SongToPlaylist.playlist_id, Song.genre_id)\
+                          .tuples()
+
+    return {
+        (playlist_id, genre_id): song_count
+        for playlist_id, genre_id, song_count in query.iterator()
+    }
+
+
+def check_playlist_genre_counts(repair=False):
+    """
+    Diff the stored playlist genre counts against a rebuild from scratch.
+    With repair, the stored counts are replaced by the rebuilt ones and the
+    genre of every playlist with songs is recomputed from them, evicting
+    the cached responses listing the playlists changed.
+    Returns the differences found before any repair.
+    """
+    count_fields = [PlaylistGenreCount.playlist_id,
+                    PlaylistGenreCount.genre_id,
+                    PlaylistGenreCount.song_count]
+    expected_counts = rebuild_playlist_genre_counts()
+    differences = diff_counts(select_counts(count_fields), expected_counts)
+
+    if repair:
+        # Same ordering as PlaylistGenreCount.playlist_genre.
+        playlist_genres = {}
+        for (playlist_id, genre_id), song_count in sorted(
+                expected_counts.items(),
+                key=lambda item: (item[0][0], -item[1], item[0][1])):
+            playlist_genres.setdefault(playlist_id, genre_id)
+
+        with PlaylistGenreCount._meta.database.atomic():
+            replace_counts(count_fields, expected_counts)
+
+            current_genres = dict(Playlist.select(Playlist.id,
+                                                  Playlist.genre_id)
+                                          .tuples()
+                                          .iterator())
+            changed_genres = {
+                playlist_id: genre_id
+                for playlist_id, genre_id in playlist_genres.items()
+                if current_genres.get(playlist_id) != genre_id
+            }
+            for playlist_id, genre_id in changed_genres.items():
+                Playlist.update(genre_id=genre_id)\
+                        .where(Playlist.id == playlist_id)\
+                        .execute()
+            if changed_genres:
+                TableVersion.bump(Playlist)
+        evict_playlists(list(changed_genres))
+
+    return differences
+
+
+def print_differences(table_name, differences, limit):
+    print(f'{table_name}: {len(differences)} differences')
+    for key, stored_count, expected_count in differences[:limit]:
+        print(f'  {key}: stored {stored_count}, expected {expected_count}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Check the materialized genre counts against a rebuild '
+                    'from scratch.')
+    parser.add_argument(
+        '--repair', action='store_true',
+        help='replace the stored counts by the rebuilt ones')
+    parser.add_argument(
+        '--limit', type=int, default=20,
+        help='maximum number of differences printed per table')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with SingerGenreCount._meta.database.connection_context():
+        # Playlists' genre feeds the singer genre counts: check it first.
+        playlist_differences = check_playlist_genre_counts(repair=args.repair)
+        singer_differences = check_singer_genre_counts(repair=args.repair)
+    print_differences(PlaylistGenreCount.__name__, playlist_differences,
+                      args.limit)
+    print_differences(SingerGenreCount.__name__, singer_differences,
+                      args.limit)
+    if (playlist_differences or singer_differences) and not args.repair:
+        sys.exit(1)
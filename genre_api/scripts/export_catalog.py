@@ -0,0 +1,147 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+import zlib
+from genre_api.models.meta import use_role, READ
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+
+# Catalog tables, the genre count tables being rebuilt from them by
+# check_genre_counts --repair.
+EXPORT_MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist]
+
+# Characters of text buffered before a chunk is produced.
+CHUNK_SIZE = 65536
+
+
+def get_export_model(table_name):
+    """
+    Get the exported model of a table name, None when it is not exported.
+    """
+    for model in EXPORT_MODELS:
+        if model._meta.table_name == table_name:
+            return model
+
+    return None
+
+
+def generate_ndjson(models, chunk_size=CHUNK_SIZE):
+    """
+    Generate the rows of every model's table as text chunks of one
+    {"table": <table name>, "row": <row>} JSON object per line, reading them
+    from the database cursor.
+    """
+    buffer = io.StringIO()
+    for model in models:
+        table_name = model._meta.table_name
+        fields = model._meta.sorted_fields
+        for row in model.select(*fields).order_by(model._meta.primary_key)\
+                        .dicts().iterator():
+            buffer.write(json.dumps({'table': table_name, 'row': row}))
+            buffer.write('\n')
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_csv(model, chunk_size=CHUNK_SIZE):
+    """
+    Generate the rows of a model's table as CSV text chunks, after a header
+    line of field names, reading them from the database cursor.
+    """
+    fields = model._meta.sorted_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([field.name for field in fields])
+    for row in model.select(*fields).order_by(model._meta.primary_key)\
+                    .tuples().iterator():
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_chunks(chunks, compress=False):
+    """
+    Encode text chunks to UTF-8, gzip compressing them on the fly with
+    compress.
+    """
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(directory, file_format='ndjson', compress=False):
+    """
+    Write every catalog table to directory from a single read transaction,
+    so that the tables are consistent with each other. With WAL the
+    transaction reads a snapshot and writers are never blocked.
+    NDJSON goes to a single catalog.ndjson file, CSV to a file per table,
+    gzip compressed with compress.
+    Returns a report with the number of bytes written by file name and the
+    wall time in seconds.
+    """
+    start_time = time.perf_counter()
+    extension = '.gz' if compress else ''
+    if file_format == 'ndjson':
+        exports = {f'catalog.ndjson{extension}': generate_ndjson(
+            EXPORT_MODELS)}
+    else:
+        exports = {f'{model._meta.table_name}.csv{extension}':
+                   generate_csv(model) for model in EXPORT_MODELS}
+
+    bytes_written = {}
+    with Genre._meta.database.atomic():
+        for file_name, chunks in exports.items():
+            bytes_written[file_name] = 0
+            with open(os.path.join(directory, file_name), 'wb') as file:
+                for data in encode_chunks(chunks, compress):
+                    file.write(data)
+                    bytes_written[file_name] += len(data)
+
+    return {
+        'bytes_written': bytes_written,
+        'wall_time': time.perf_counter() - start_time
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Export the catalog tables from a single snapshot.')
+    parser.add_argument('directory', help='directory the files are written to')
+    parser.add_argument(
+        '--format', choices=['ndjson', 'csv'], default='ndjson',
+        help='a single NDJSON file, or a CSV file per table')
+    parser.add_argument('--gzip', action='store_true',
+                        help='gzip compress the files')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    database = Genre._meta.database
+    # Read-only connections never take the write lock.
+    use_role(database, READ)
+    with database.connection_context():
+        report = export_catalog(args.directory, args.format, args.gzip)
+    for file_name, size in report['bytes_written'].items():
+        print(f'{file_name:<28} {size:>14,} bytes')
+    print(f"Exported in {report['wall_time']:.3f}s")
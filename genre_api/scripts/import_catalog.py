@@ -0,0 +1,347 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import time
+from peewee import chunked
+from genre_api.config.config import CONFIG
+from genre_api.models.meta import SQLITE_MAX_VARIABLE_NUMBER
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.table_version import TableVersion
+from genre_api.models.import_checkpoint import ImportCheckpoint
+from genre_api.routes.response_cache import evict_all_responses
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
+
+IMPORT_CONFIG = CONFIG.get('import_catalog', {})
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def detect_format(path):
+    """
+    Get the format of a catalog file from its extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f'Unknown catalog format for {path}, use one of '
+                         f'{sorted(FORMATS)} or --format')
+
+    return FORMATS[extension]
+
+
+def read_records(path, file_format):
+    """
+    Iterate over the records of a CSV file with a header line, or of a file
+    holding one JSON object per line, as dictionaries.
+    The file is read one line at a time.
+    """
+    with open(path, newline='', encoding='utf-8') as catalog_file:
+        if file_format == 'csv':
+            yield from csv.DictReader(catalog_file)
+            return
+
+        for line in catalog_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_name_maps():
+    """
+    Map the names of the existing genres, singers and playlists to their
+    ids, the lowest id winning among equal names.
+    These maps grow with the number of distinct names, not with the size of
+    the imported files.
+    """
+    name_maps = {}
+    for map_name, model in [('genres', Genre), ('singers', Singer),
+                            ('playlists', Playlist)]:
+        name_map = name_maps[map_name] = {}
+        query = model.select(model.name, model.id)\
+                     .order_by(model.id)\
+                     .tuples()
+        for name, row_id in query.iterator():
+            name_map.setdefault(name, row_id)
+
+    return name_maps
+
+
+def convert_named(records, name_map, extra_fields):
+    """
+    Convert records having a name unknown to name_map into rows, the names
+    already known being skipped. extra_fields maps the other row fields to a
+    function computing them from the record, returning None when it refers
+    to an unknown name, which skips the record.
+    """
+    rows = []
+    for record in records:
+        name = record.get('name')
+        if not name or name in name_map:
+            continue
+
+        row = {'name': name}
+        for field_name, convert in extra_fields.items():
+            row[field_name] = convert(record)
+        if None in row.values():
+            continue
+        # Skip the duplicates of this chunk too: the id is set once inserted.
+        name_map[name] = None
+        rows.append(row)
+
+    return rows
+
+
+def convert_genres(records, name_maps):
+    """
+    Convert genre records, given by name, into rows.
+    """
+    return convert_named(records, name_maps['genres'], {})
+
+
+def convert_singers(records, name_maps):
+    """
+    Convert singer records, given by name and genre name, into rows.
+    """
+    genre_ids = name_maps['genres']
+    rows = convert_named(records, name_maps['singers'], {
+        'genre_id': lambda record: genre_ids.get(record.get('genre'))
+    })
+    for row in rows:
+        row['inferred_genre_id'] = None
+
+    return rows
+
+
+def convert_playlists(records, name_maps):
+    """
+    Convert playlist records, given by name, into rows.
+    """
+    rows = convert_named(records, name_maps['playlists'], {})
+    # Playlists' genre is computed from their songs once imported.
+    for row in rows:
+        row['genre_id'] = None
+
+    return rows
+
+
+def convert_songs(records, name_maps):
+    """
+    Convert song records, given by title, singer name and genre name, into
+    rows.
+    """
+    rows = []
+    for record in records:
+        row = {
+            'title': record.get('title'),
+            'singer_id': name_maps['singers'].get(record.get('singer')),
+            'genre_id': name_maps['genres'].get(record.get('genre'))
+        }
+        if None not in row.values():
+            rows.append(row)
+
+    return rows
+
+
+def convert_memberships(records, name_maps):
+    """
+    Convert playlist memberships, given by playlist name, song title and
+    singer name, into rows. Songs are looked up by title with one query per
+    SQLITE_MAX_VARIABLE_NUMBER titles, the lowest id winning among songs of
+    the same title and singer. Songs already in their playlist are skipped,
+    a song being in a playlist at most once.
+    """
+    memberships = []
+    for record in records:
+        membership = (name_maps['playlists'].get(record.get('playlist')),
+                      record.get('song'),
+                      name_maps['singers'].get(record.get('singer')))
+        if None not in membership:
+            memberships.append(membership)
+
+    song_ids = {}
+    titles = list({title for _, title, _ in memberships})
+    for titles_chunk in chunked(titles, SQLITE_MAX_VARIABLE_NUMBER):
+        query = Song.select(Song.id, Song.title, Song.singer_id)\
+                    .where(Song.title.in_(titles_chunk))\
+                    .order_by(Song.id)\
+                    .tuples()
+        for song_id, title, singer_id in query:
+            song_ids.setdefault((title, singer_id), song_id)
+
+    rows = {}
+    for playlist_id, title, singer_id in memberships:
+        if (title, singer_id) in song_ids:
+            song_id = song_ids[(title, singer_id)]
+            rows[(song_id, playlist_id)] = {'song_id': song_id,
+                                            'playlist_id': playlist_id}
+
+    found_song_ids = list({song_id for song_id, _ in rows})
+    for song_ids_chunk in chunked(found_song_ids, SQLITE_MAX_VARIABLE_NUMBER):
+        query = SongToPlaylist.select(SongToPlaylist.song_id,
+                                      SongToPlaylist.playlist_id)\
+                              .where(SongToPlaylist.song_id.in_(
+                                  song_ids_chunk))\
+                              .tuples()
+        for membership in query:
+            rows.pop(membership, None)
+
+    return list(rows.values())
+
+
+# Importers by kind of catalog file, in the order files are imported: every
+# kind refers to the names imported by the previous ones.
+IMPORTERS = {
+    'genres': (Genre, convert_genres, 'genres'),
+    'singers': (Singer, convert_singers, 'singers'),
+    'songs': (Song, convert_songs, None),
+    'playlists': (Playlist, convert_playlists, 'playlists'),
+    'memberships': (SongToPlaylist, convert_memberships, None)
+}
+
+
+def import_file(kind, path, name_maps, file_format=None,
+                chunk_size=IMPORT_CONFIG.get('chunk_size', 5000)):
+    """
+    Import a catalog file of the given kind, chunk_size records per
+    transaction. Every transaction also records the number of records read
+    so far in the file's checkpoint, and an import resumes after the records
+    of its checkpoint.
+    Records referring to unknown names, or naming a genre, singer or
+    playlist that already exists, are skipped. Every chunk imported evicts
+    the cached responses.
+    Returns a report with the number of records read, of rows imported and
+    skipped, the wall time in seconds and the throughput in records per
+    second.
+    """
+    model, convert, map_name = IMPORTERS[kind]
+    database = model._meta.database
+    source = f'{kind}:{os.path.abspath(path)}'
+    start_time = time.perf_counter()
+
+    checkpoint = ImportCheckpoint.get_or_none(
+        ImportCheckpoint.source == source)
+    records_done = checkpoint.records if checkpoint else 0
+    records = itertools.islice(
+        read_records(path, file_format or detect_format(path)),
+        records_done, None)
+
+    records_read = 0
+    rows_imported = 0
+    for records_chunk in chunked(records, chunk_size):
+        rows = convert(records_chunk, name_maps)
+        records_read += len(records_chunk)
+        with database.atomic():
+            rows = model.insert_rows(rows)
+            if rows:
+                TableVersion.bump(model)
+            ImportCheckpoint.replace(
+                source=source, records=records_done + records_read,
+                updated_at=datetime.datetime.utcnow()).execute()
+        if rows:
+            evict_all_responses()
+        rows_imported += len(rows)
+        if map_name:
+            name_maps[map_name].update((row['name'], row['id'])
+                                       for row in rows)
+
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        'kind': kind,
+        'records_resumed': records_done,
+        'records_read': records_read,
+        'rows_imported': rows_imported,
+        'rows_skipped': records_read - rows_imported,
+        'wall_time': wall_time,
+        'records_per_second': records_read / wall_time if wall_time else 0
+    }
+
+
+def restart_imports(paths_by_kind):
+    """
+    Forget the checkpoints of the given files, to import them from the
+    start.
+    """
+    sources = [f'{kind}:{os.path.abspath(path)}'
+               for kind, path in paths_by_kind.items()]
+    ImportCheckpoint.delete()\
+                    .where(ImportCheckpoint.source.in_(sources))\
+                    .execute()
+
+
+def import_catalog(paths_by_kind, file_format=None,
+                   chunk_size=IMPORT_CONFIG.get('chunk_size', 5000),
+                   rebuild=True):
+    """
+    Import the catalog files of paths_by_kind, a path by kind of file, in
+    dependency order. With rebuild, the playlist and singer genre counts,
+    playlists' genre and singers' inferred genre are then recomputed from
+    scratch once, instead of after every imported chunk.
+    Returns the list of file reports and the rebuild wall time in seconds.
+    """
+    ImportCheckpoint.create_table(safe=True)
+    name_maps = load_name_maps()
+
+    reports = [import_file(kind, paths_by_kind[kind], name_maps,
+                           file_format=file_format, chunk_size=chunk_size)
+               for kind in IMPORTERS if kind in paths_by_kind]
+
+    rebuild_time = 0
+    if rebuild:
+        start_time = time.perf_counter()
+        # Playlists' genre feeds the singer genre counts: rebuild it first.
+        check_playlist_genre_counts(repair=True)
+        check_singer_genre_counts(repair=True)
+        rebuild_time = time.perf_counter() - start_time
+
+    return reports, rebuild_time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Import catalog files straight into the database.')
+    for kind in IMPORTERS:
+        parser.add_argument(f'--{kind}', metavar='PATH',
+                            help=f'CSV or NDJSON file of {kind}')
+    parser.add_argument(
+        '--format', choices=sorted(set(FORMATS.values())),
+        help='format of every file, guessed from their extension otherwise')
+    parser.add_argument(
+        '--chunk-size', type=int,
+        default=IMPORT_CONFIG.get('chunk_size', 5000),
+        help='number of records imported per transaction')
+    parser.add_argument(
+        '--restart', action='store_true',
+        help='import the files from the start, ignoring their checkpoints')
+    parser.add_argument(
+        '--no-rebuild', dest='rebuild', action='store_false',
+        help='skip the recomputation of playlist and singer genres')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    paths_by_kind = {kind: getattr(args, kind) for kind in IMPORTERS
+                     if getattr(args, kind)}
+    with Genre._meta.database.connection_context():
+        if args.restart:
+            ImportCheckpoint.create_table(safe=True)
+            restart_imports(paths_by_kind)
+        reports, rebuild_time = import_catalog(
+            paths_by_kind, file_format=args.format,
+            chunk_size=args.chunk_size, rebuild=args.rebuild)
+    for report in reports:
+        print(f"{report['kind']:<12} read {report['records_read']} records "
+              f"(resumed after {report['records_resumed']}), "
+              f"imported {report['rows_imported']}, "
+              f"skipped {report['rows_skipped']} "
+              f"in {report['wall_time']:.3f}s "
+              f"({report['records_per_second']:,.0f} records/sec)")
+    if args.rebuild:
+        print(f'Rebuilt playlist and singer genres in {rebuild_time:.3f}s')
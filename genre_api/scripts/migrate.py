@@ -0,0 +1,147 @@
+import argparse
+from peewee import fn
+from genre_api.models.meta import sqlite_db
+from genre_api.models.song import Song
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.response_cache import evict_all_responses
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
+
+
+def get_schema_version(database):
+    """
+    Get the number of migrations applied to database, kept in SQLite's
+    user_version.
+    """
+    return database.execute_sql('PRAGMA user_version').fetchone()[0]
+
+
+def set_schema_version(database, version):
+    # PRAGMA does not take bound parameters.
+    database.execute_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def add_table_version_updated_at(database):
+    """
+    Add the updated_at column of TableVersion to tables created before it,
+    which create_tables leaves as they are.
+    """
+    if not TableVersion.table_exists():
+        return
+
+    table_name = TableVersion._meta.table_name
+    if 'updated_at' not in [column.name
+                            for column in database.get_columns(table_name)]:
+        database.execute_sql(
+            f'ALTER TABLE {table_name} ADD COLUMN updated_at DATETIME')
+
+
+def dedupe_song_to_playlist(database):
+    """
+    Delete the repeated memberships of a song in a playlist, keeping the
+    first one. The genre counts, which counted every repeat, are rebuilt,
+    and the cached responses evicted.
+    The updated_at column of TableVersion is added first, as the rebuild
+    bumps table versions.
+    """
+    add_table_version_updated_at(database)
+    if not SongToPlaylist.table_exists():
+        return
+
+    first_ids = SongToPlaylist.select(fn.MIN(SongToPlaylist.id))\
+                              .group_by(SongToPlaylist.playlist_id,
+                                        SongToPlaylist.song_id)
+    deleted = SongToPlaylist.delete()\
+                            .where(SongToPlaylist.id.not_in(first_ids))\
+                            .execute()
+    # Databases older than the genre counts get them rebuilt by
+    # check_genre_counts --repair.
+    if deleted and all(model.table_exists() for model in [
+            PlaylistGenreCount, SingerGenreCount, TableVersion]):
+        check_playlist_genre_counts(repair=True)
+        check_singer_genre_counts(repair=True)
+        TableVersion.bump(SongToPlaylist)
+    # Without TableVersion, no response could be cached.
+    if deleted and TableVersion.table_exists():
+        evict_all_responses()
+
+
+def index_song_to_playlist(database):
+    """
+    Replace the single column indexes of SongToPlaylist by a unique
+    (playlist_id, song_id) index and a (song_id, playlist_id) index, both
+    covering the table.
+    """
+    if not SongToPlaylist.table_exists():
+        return
+
+    database.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS songtoplaylist_playlist_id_song_id '
+        'ON songtoplaylist (playlist_id, song_id)')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS songtoplaylist_song_id_playlist_id '
+        'ON songtoplaylist (song_id, playlist_id)')
+    database.execute_sql('DROP INDEX IF EXISTS songtoplaylist_playlist_id')
+    database.execute_sql('DROP INDEX IF EXISTS songtoplaylist_song_id')
+
+
+def index_song_singer_id(database):
+    """
+    Replace the singer_id index of Song by a (singer_id, id) index.
+    """
+    if not Song.table_exists():
+        return
+
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS song_singer_id_id ON song (singer_id, id)')
+    database.execute_sql('DROP INDEX IF EXISTS song_singer_id')
+
+
+# Append only: a database's schema version is the number of these it went
+# through. Each must leave a database already in its target state as is,
+# since create_tables builds new databases from the current models.
+MIGRATIONS = [
+    dedupe_song_to_playlist,
+    index_song_to_playlist,
+    index_song_singer_id,
+]
+
+
+def migrate(database):
+    """
+    Apply the migrations database did not go through yet, each in its own
+    transaction with the schema version update. The version is read in the
+    same transaction, so that processes migrating together apply every
+    migration once.
+    Returns the names of the migrations applied.
+    """
+    applied = []
+    while True:
+        with database.atomic('IMMEDIATE'):
+            version = get_schema_version(database)
+            if version >= len(MIGRATIONS):
+                return applied
+
+            migration = MIGRATIONS[version]
+            migration(database)
+            set_schema_version(database, version + 1)
+        applied.append(migration.__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Apply the pending schema migrations to the database.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    parse_args()
+    with sqlite_db.connection_context():
+        applied = migrate(sqlite_db)
+        version = get_schema_version(sqlite_db)
+    for name in applied:
+        print(f'Applied {name}')
+    print(f'Schema version {version}')
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import re
+from genre_api.config.config import CONFIG
+
+SLOW_QUERY_CONFIG = CONFIG.get('slow_query_log', {})
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+# A parenthesized list of placeholders, as in IN (?, ?, ?).
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+# Repeated rows, as in VALUES (?, ?), (?, ?), folded into one.
+REPEATED_ROWS = re.compile(r'(\([^()]*\))(?:\s*,\s*\1)+')
+
+SORT_KEYS = ['total_ms', 'count', 'max_ms']
+
+
+def normalize_statement(sql):
+    """
+    Get the shape of sql: its literals replaced by placeholders, and lists
+    of placeholders or rows of any length folded, so that the statements
+    of a route differing only by their values share it.
+    """
+    shape = ' '.join(sql.split())
+    shape = STRING_LITERAL.sub('?', shape)
+    shape = NUMBER_LITERAL.sub('?', shape)
+    shape = REPEATED_ROWS.sub(r'\1', shape)
+    return PLACEHOLDER_LIST.sub('(?, ...)', shape)
+
+
+def get_log_paths(path):
+    """
+    Get path and its rotated files which exist, oldest first.
+    """
+    paths = [path]
+    backup = 1
+    while os.path.exists(f'{path}.{backup}'):
+        paths.insert(0, f'{path}.{backup}')
+        backup += 1
+
+    return [log_path for log_path in paths if os.path.exists(log_path)]
+
+
+def read_slow_queries(paths):
+    """
+    Iterate over the entries of slow query log files, skipping lines which
+    are not complete JSON objects, like one being written.
+    """
+    for path in paths:
+        with open(path) as log_file:
+            for line in log_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate_slow_queries(entries, sort_key='total_ms'):
+    """
+    Aggregate slow query log entries by statement shape.
+    Returns a list of dictionaries giving the shape, its number of slow
+    statements, their total, mean and max durations in milliseconds, the
+    routes running them and the query plan of the slowest one, by
+    decreasing sort_key.
+    """
+    shapes = {}
+    for entry in entries:
+        shape = normalize_statement(entry['sql'])
+        aggregate = shapes.setdefault(shape, {
+            'shape': shape,
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'routes': set(),
+            'plan': None
+        })
+        aggregate['count'] += 1
+        aggregate['total_ms'] += entry['duration_ms']
+        if entry.get('route'):
+            aggregate['routes'].add(f"{entry['method']} {entry['route']}")
+        if entry['duration_ms'] >= aggregate['max_ms']:
+            aggregate['max_ms'] = entry['duration_ms']
+            aggregate['plan'] = entry.get('plan')
+
+    aggregates = []
+    for aggregate in shapes.values():
+        aggregate['mean_ms'] = aggregate['total_ms'] / aggregate['count']
+        aggregate['routes'] = sorted(aggregate['routes'])
+        aggregates.append(aggregate)
+
+    return sorted(aggregates, key=lambda aggregate: aggregate[sort_key],
+                  reverse=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Aggregate slow query logs by statement shape.')
+    parser.add_argument(
+        'paths', nargs='*', metavar='PATH',
+        help='slow query log files, the configured one and its rotated '
+             'files by default')
+    parser.add_argument('--sort', choices=SORT_KEYS, default='total_ms',
+                        help='order of the statement shapes')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='number of statement shapes shown')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    paths = args.paths or get_log_paths(
+        SLOW_QUERY_CONFIG.get('file', 'db/slow_queries.log'))
+    aggregates = aggregate_slow_queries(read_slow_queries(paths), args.sort)
+    for aggregate in aggregates[:args.limit]:
+        print(f"{aggregate['count']:>7} statements "
+              f"total {aggregate['total_ms']:>10.3f} ms  "
+              f"mean {aggregate['mean_ms']:>9.3f} ms  "
+              f"max {aggregate['max_ms']:>9.3f} ms")
+        print(f"  {aggregate['shape']}")
+        if aggregate['routes']:
+            print(f"  routes: {', '.join(aggregate['routes'])}")
+        for plan_line in aggregate['plan'] or []:
+            print(f'    {plan_line}')
+        print()
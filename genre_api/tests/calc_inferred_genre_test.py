@@ -0,0 +1,170 @@
+import os
+import tempfile
+import threading
+import unittest
+import pytest
+from unittest import mock
+from flask_restful import abort
+from peewee import SqliteDatabase
+from werkzeug.serving import make_server
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.routes.singer import SingerPlaylistsRoute
+from genre_api.scripts import calc_inferred_genre as \
+    calc_inferred_genre_module
+from genre_api.scripts.calc_inferred_genre import (
+    calc_inferred_genre, calc_inferred_genre_concurrent,
+    calc_inferred_genre_engine, pick_inferred_genre)
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+class TestCalcInferredGenre(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        for name in ['Genre1', 'Genre2', 'Genre3']:
+            Genre.create(name=name)
+        for name in ['Singer1', 'Singer2', 'Singer3']:
+            Singer.create(name=name, genre_id=1, inferred_genre_id=None)
+        # Singer1 has two songs, Singer2 one and Singer3 none in playlists.
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Song.create(title='Song2', singer_id=1, genre_id=2)
+        Song.create(title='Song3', singer_id=2, genre_id=3)
+        Song.create(title='Song4', singer_id=3, genre_id=3)
+
+        playlists = {'Playlist1': 2, 'Playlist2': 2, 'Playlist3': 3}
+        for name, genre_id in playlists.items():
+            Playlist.create(name=name, genre_id=genre_id)
+        memberships = [(1, 1), (2, 1), (1, 2), (3, 3), (3, 2)]
+        for song_id, playlist_id in memberships:
+            SongToPlaylist.create(song_id=song_id, playlist_id=playlist_id)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def test_pick_inferred_genre(self):
+        self.assertEqual(pick_inferred_genre({3: 2, 2: 2, 1: 1}), 2)
+        self.assertEqual(pick_inferred_genre({None: 5, 3: 1}), 3)
+        self.assertIsNone(pick_inferred_genre({}))
+
+    def test_calc_inferred_genre_engine(self):
+        report = calc_inferred_genre_engine()
+
+        # Singer1 is in Playlist1 and Playlist2 (Genre2), Singer2 is in
+        # Playlist3 (Genre3) and Playlist2 (Genre2): the tie goes to Genre2.
+        inferred_genres = dict(Singer.select(Singer.id,
+                                             Singer.inferred_genre_id)
+                                     .tuples())
+        self.assertEqual(inferred_genres, {1: 2, 2: 2, 3: None})
+        self.assertEqual(report['rows_scanned'], 3)
+        self.assertEqual(report['rows_changed'], 2)
+
+    def test_calc_inferred_genre_engine_unchanged(self):
+        calc_inferred_genre_engine()
+        report = calc_inferred_genre_engine(chunk_size=1)
+
+        self.assertEqual(report['rows_changed'], 0)
+
+
+@pytest.mark.usefixtures('app_class')
+class TestCalcInferredGenreHTTP(unittest.TestCase):
+    """
+    Run the HTTP modes against a locally started app. The database is a file
+    so that the server threads share it with the test.
+    """
+
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database = SqliteDatabase(
+            os.path.join(self.database_dir.name, 'genre_api.db'))
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        for name in ['Genre1', 'Genre2', 'Genre3']:
+            Genre.create(name=name)
+        for singer_id in range(1, 21):
+            Singer.create(name=f'Singer{singer_id}', genre_id=1,
+                          inferred_genre_id=None)
+            Song.create(title=f'Song{singer_id}', singer_id=singer_id,
+                        genre_id=1)
+        for playlist_id in range(1, 7):
+            Playlist.create(name=f'Playlist{playlist_id}',
+                            genre_id=playlist_id % 3 + 1)
+        for song_id in range(1, 21):
+            for playlist_id in range(1, song_id % 6 + 1):
+                SongToPlaylist.create(song_id=song_id,
+                                      playlist_id=playlist_id)
+
+        self.server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        self.database.drop_tables(MODELS)
+        self.database.close()
+        self.database_dir.cleanup()
+
+    def get_inferred_genres(self):
+        return dict(Singer.select(Singer.id, Singer.inferred_genre_id)
+                          .tuples())
+
+    def test_concurrent_matches_sequential(self):
+        with mock.patch.object(calc_inferred_genre_module, 'URL', self.url):
+            calc_inferred_genre()
+        sequential_genres = self.get_inferred_genres()
+        Singer.update(inferred_genre_id=None).execute()
+
+        report = calc_inferred_genre_concurrent(url=self.url, workers=4,
+                                                page_size=7)
+
+        self.assertEqual(self.get_inferred_genres(), sequential_genres)
+        self.assertEqual(report['singers_processed'], 20)
+        # Singers whose song is in no playlist are left untouched.
+        self.assertEqual(report['singers_updated'], 17)
+
+    def test_concurrent_matches_engine(self):
+        calc_inferred_genre_concurrent(url=self.url, workers=4)
+        concurrent_genres = self.get_inferred_genres()
+        Singer.update(inferred_genre_id=None).execute()
+
+        calc_inferred_genre_engine()
+
+        self.assertEqual(self.get_inferred_genres(), concurrent_genres)
+
+    def test_concurrent_skips_failing_singer(self):
+        get_playlists = SingerPlaylistsRoute.get
+
+        def get_unavailable(route, singer_id):
+            if singer_id == '5':
+                abort(503, message='Unavailable')
+            return get_playlists(route, singer_id=singer_id)
+
+        with mock.patch.object(SingerPlaylistsRoute, 'get', get_unavailable), \
+                self.assertLogs(level='WARNING') as logs:
+            report = calc_inferred_genre_concurrent(url=self.url, workers=4,
+                                                    retries=1)
+
+        self.assertEqual(report['singers_processed'], 20)
+        # Singer5 fails, and Singers whose song is in no playlist are left
+        # untouched.
+        self.assertEqual(report['singers_updated'], 16)
+        self.assertIsNone(self.get_inferred_genres()[5])
+        self.assertTrue(any(line.startswith('WARNING:root:RetryError')
+                            for line in logs.output))
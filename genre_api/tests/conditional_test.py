@@ -0,0 +1,124 @@
+import unittest
+import pytest
+import json
+import datetime
+from unittest import mock
+from werkzeug.http import http_date, parse_date
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestConditional(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        for path, body in [
+                ('/genres', {'name': 'Genre1'}),
+                ('/singers', {'name': 'Singer1', 'genre_id': 1}),
+                ('/songs', {'title': 'Song1', 'singer_id': 1, 'genre_id': 1}),
+                ('/songs', {'title': 'Song2', 'singer_id': 1, 'genre_id': 1}),
+                ('/playlists', {'name': 'Playlist1'})]:
+            self.post(path, body)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def post(self, path, body):
+        return self.client.post(
+            path,
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps(body))
+
+    def test_get_not_modified(self):
+        response = self.client.get('/genres')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/genres',
+                                   headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_not_modified_without_query(self):
+        self.post('/playlists/1/songs', {'song_ids': [1]})
+        etag = self.client.get('/playlists/1/songs').headers['ETag']
+
+        with mock.patch('genre_api.routes.playlist.paginate') as paginate:
+            response = self.client.get('/playlists/1/songs',
+                                       headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        paginate.assert_not_called()
+
+    def test_write_changes_etag(self):
+        self.post('/playlists/1/songs', {'song_ids': [1]})
+        etag = self.client.get('/playlists/1/songs').headers['ETag']
+        singers_etag = self.client.get('/singers').headers['ETag']
+
+        self.post('/playlists/1/songs', {'song_ids': [2]})
+
+        response = self.client.get('/playlists/1/songs',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 2)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        # Adding songs does not touch the singers table.
+        response = self.client.get('/singers',
+                                   headers={'If-None-Match': singers_etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_not_modified_since(self):
+        response = self.client.get('/songs')
+        last_modified = parse_date(response.headers['Last-Modified'])
+
+        response = self.client.get(
+            '/songs', headers={'If-Modified-Since': http_date(
+                last_modified + datetime.timedelta(seconds=1))})
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_in_same_second(self):
+        now = datetime.datetime(2020, 1, 1, 12, 0, 0, 100000)
+        with mock.patch('genre_api.models.table_version.datetime') \
+                as datetime_mock:
+            datetime_mock.datetime.utcnow.return_value = now
+            self.post('/genres', {'name': 'Genre2'})
+            response = self.client.get('/genres')
+            last_modified = response.headers['Last-Modified']
+
+            # Written in the same second as the first response.
+            datetime_mock.datetime.utcnow.return_value = \
+                now.replace(microsecond=600000)
+            self.post('/genres', {'name': 'Genre3'})
+            response = self.client.get(
+                '/genres', headers={'If-Modified-Since': last_modified})
+
+        self.assertEqual(last_modified, 'Wed, 01 Jan 2020 12:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 3)
+
+    def test_etag_by_representation(self):
+        json_etag = self.client.get('/songs').headers['ETag']
+        response = self.client.get(
+            '/songs', headers={'Accept': 'application/x-ndjson',
+                               'If-None-Match': json_etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], json_etag)
@@ -0,0 +1,127 @@
+import unittest
+import pytest
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.export_catalog import export_catalog, generate_ndjson
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestExportCatalog(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Playlist.create(name='Playlist1', genre_id=1)
+        SongToPlaylist.create(song_id=1, playlist_id=1)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def test_export_ndjson(self):
+        response = self.client.get('/export')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(
+            [json.loads(line) for line in response.data.splitlines()],
+            [
+                {'table': 'genre', 'row': {'id': 1, 'name': 'Genre1'}},
+                {'table': 'singer', 'row': {'id': 1, 'name': 'Singer1',
+                                            'genre_id': 1,
+                                            'inferred_genre_id': None}},
+                {'table': 'song', 'row': {'id': 1, 'title': 'Song1',
+                                          'singer_id': 1, 'genre_id': 1}},
+                {'table': 'playlist', 'row': {'id': 1, 'name': 'Playlist1',
+                                              'genre_id': 1}},
+                {'table': 'songtoplaylist', 'row': {'id': 1, 'song_id': 1,
+                                                    'playlist_id': 1}}
+            ])
+
+    def test_export_csv_gzip(self):
+        response = self.client.get('/export?format=csv&table=songtoplaylist',
+                                   headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data),
+                         b'id,song_id,playlist_id\n1,1,1\n')
+
+    def test_export_400_404(self):
+        self.assertEqual(self.client.get('/export?format=xml').status_code,
+                         400)
+        self.assertEqual(self.client.get('/export?format=csv').status_code,
+                         400)
+        self.assertEqual(self.client.get('/export?table=tableversion')
+                         .status_code, 404)
+
+    def test_export_catalog_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report = export_catalog(directory, 'csv', compress=True)
+
+            self.assertEqual(sorted(report['bytes_written']),
+                             ['genre.csv.gz', 'playlist.csv.gz',
+                              'singer.csv.gz', 'song.csv.gz',
+                              'songtoplaylist.csv.gz'])
+            with gzip.open(os.path.join(directory, 'singer.csv.gz'),
+                           'rt') as singer_file:
+                self.assertEqual(list(csv.reader(singer_file)),
+                                 [['id', 'name', 'genre_id',
+                                   'inferred_genre_id'],
+                                  ['1', 'Singer1', '1', '']])
+
+
+class TestExportSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        database_file = os.path.join(self.directory.name, 'genre_api.db')
+        self.database = SqliteDatabase(database_file,
+                                       pragmas={'journal_mode': 'wal'})
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+        for name in ['Genre1', 'Genre2']:
+            Genre.create(name=name)
+        self.writer = SqliteDatabase(database_file)
+
+    def tearDown(self):
+        self.writer.close()
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_export_snapshot(self):
+        with self.database.atomic():
+            chunks = generate_ndjson([Genre, Singer], chunk_size=1)
+            first_chunk = next(chunks)
+            # A writer commits while the export is in progress.
+            self.writer.execute_sql(
+                "INSERT INTO genre (name) VALUES ('Genre3')")
+            self.writer.execute_sql(
+                "INSERT INTO singer (name, genre_id) VALUES ('Singer1', 3)")
+            lines = (first_chunk + ''.join(chunks)).splitlines()
+
+        self.assertEqual([json.loads(line)['row']['name'] for line in lines],
+                         ['Genre1', 'Genre2'])
+        self.assertEqual(Genre.select().count(), 3)
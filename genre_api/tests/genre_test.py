@@ -7,8 +7,13 @@ from genre_api.models.singer import Singer
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.models.genre_cache import genre_cache
 
-MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist]
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
 
 
 @pytest.mark.usefixtures('app_class')
@@ -101,3 +106,76 @@ class TestGenre(unittest.TestCase):
         response = self.client.get('/genres/2')
 
         self.assertEqual(response.status_code, 404)
+
+    def test_get_genre_pages(self):
+        for name in ['Genre1', 'Genre2', 'Genre3']:
+            self.client.post(
+                '/genres',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'name': name}))
+
+        response = self.client.get('/genres?limit=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([genre['id'] for genre in response.json], [1, 2])
+        next_url = response.headers['Link'].split(';')[0].strip('<>')
+
+        response = self.client.get(next_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'id': 3, 'name': 'Genre3'}])
+        self.assertNotIn('Link', response.headers)
+
+    def test_get_genre_pages_400(self):
+        response = self.client.get('/genres?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/genres?after=notacursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_genre_cache(self):
+        self.client.post(
+            '/genres',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'name': 'Genre1'}))
+        stats = self.client.get('/caches/genres').json
+
+        self.client.get('/genres')
+        self.client.get('/genres/1')
+
+        # The post invalidated the cache: it is loaded once, then hit.
+        response = self.client.get('/caches/genres')
+        self.assertEqual(response.json['misses'] - stats['misses'], 1)
+        self.assertEqual(response.json['hits'] - stats['hits'], 1)
+        self.assertEqual(response.json['version'], 1)
+
+        # Another worker adding a genre bumps the version stored in the
+        # database, which makes this worker reload its cache.
+        with self.database.atomic():
+            Genre.create(name='Genre2')
+            TableVersion.bump(Genre)
+
+        response = self.client.get('/genres/2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(genre_cache.stats()['version'], 2)
+
+    def test_post_genres_bulk(self):
+        response = self.client.post(
+            '/genres/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Genre1'}, {'name': 'Genre2'}]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'id': 1, 'name': 'Genre1'},
+                                         {'id': 2, 'name': 'Genre2'}])
+
+        # A single existing name rejects the whole batch.
+        response = self.client.post(
+            '/genres/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Genre3'}, {'name': 'Genre1'}]))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json['duplicate_names'], ['Genre1'])
+        self.assertEqual(Genre.select().count(), 2)
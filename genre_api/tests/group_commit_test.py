@@ -0,0 +1,63 @@
+import os
+import tempfile
+import threading
+import unittest
+from peewee import SqliteDatabase, IntegrityError
+from genre_api.models.genre import Genre
+from genre_api.models.group_commit import GroupCommitWriter
+
+MODELS = [Genre]
+
+
+class TestGroupCommitWriter(unittest.TestCase):
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database = SqliteDatabase(
+            os.path.join(self.database_dir.name, 'test.db'),
+            pragmas={'journal_mode': 'wal'})
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        with self.database.connection_context():
+            self.database.create_tables(MODELS)
+        self.writer = GroupCommitWriter(self.database, max_batch=10,
+                                        max_delay=0.05)
+
+    def tearDown(self):
+        self.database.close()
+        self.database_dir.cleanup()
+
+    def count_genres(self):
+        with self.database.connection_context():
+            return Genre.select().count()
+
+    def test_writes_committed_together(self):
+        genres = {}
+
+        def create_genre(name):
+            genres[name] = self.writer.submit(Genre.create, name=name)\
+                                      .result()
+
+        threads = [threading.Thread(target=create_genre, args=(f'Genre{i}',))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({genre.id for genre in genres.values()}), 20)
+        self.assertEqual(self.count_genres(), 20)
+        self.assertEqual(self.writer.writes, 20)
+        self.assertLess(self.writer.batches, 20)
+
+    def test_failing_write_rolled_back_alone(self):
+        futures = [
+            self.writer.submit(Genre.create, name='Genre1'),
+            self.writer.submit(Genre.create, name='Genre1'),
+            self.writer.submit(Genre.create, name='Genre2')
+        ]
+
+        self.assertEqual(futures[0].result().name, 'Genre1')
+        with self.assertRaises(IntegrityError):
+            futures[1].result()
+        self.assertEqual(futures[2].result().name, 'Genre2')
+        self.assertEqual(self.count_genres(), 2)
+        self.assertEqual(self.writer.batches, 1)
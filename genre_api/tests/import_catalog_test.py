@@ -0,0 +1,109 @@
+import unittest
+import json
+import os
+import tempfile
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.models.import_checkpoint import ImportCheckpoint
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
+from genre_api.scripts.import_catalog import import_catalog
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion, ImportCheckpoint]
+
+CATALOG = {
+    'genres.csv': 'name\nRock\nJazz\nRock\n',
+    'singers.ndjson': '{"name": "Singer1", "genre": "Rock"}\n'
+                      '{"name": "Singer2", "genre": "Jazz"}\n'
+                      '{"name": "Singer3", "genre": "Blues"}\n',
+    'songs.csv': 'title,singer,genre\n'
+                 'Song1,Singer1,Rock\n'
+                 'Song2,Singer1,Jazz\n'
+                 'Song3,Singer2,Jazz\n'
+                 'Song4,Nobody,Jazz\n',
+    'playlists.csv': 'name\nPlaylist1\nPlaylist2\n',
+    'memberships.ndjson': '{"playlist": "Playlist1", "song": "Song1", '
+                          '"singer": "Singer1"}\n'
+                          '{"playlist": "Playlist1", "song": "Song3", '
+                          '"singer": "Singer2"}\n'
+                          '{"playlist": "Playlist1", "song": "Song2", '
+                          '"singer": "Singer1"}\n'
+                          '{"playlist": "Playlist2", "song": "Song1", '
+                          '"singer": "Singer2"}\n'
+                          '{"playlist": "Playlist1", "song": "Song1", '
+                          '"singer": "Singer1"}\n'
+}
+
+
+class TestImportCatalog(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths_by_kind = {}
+        for file_name, content in CATALOG.items():
+            path = os.path.join(self.directory.name, file_name)
+            with open(path, 'w') as catalog_file:
+                catalog_file.write(content)
+            self.paths_by_kind[os.path.splitext(file_name)[0]] = path
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def test_import_catalog(self):
+        reports, _ = import_catalog(self.paths_by_kind, chunk_size=2)
+
+        self.assertEqual(
+            [(report['kind'], report['rows_imported'], report['rows_skipped'])
+             for report in reports],
+            [('genres', 2, 1), ('singers', 2, 1), ('songs', 3, 1),
+             ('playlists', 2, 0), ('memberships', 3, 2)])
+        self.assertEqual(list(Song.select(Song.title, Song.singer_id,
+                                          Song.genre_id).tuples()),
+                         [('Song1', 1, 1), ('Song2', 1, 2), ('Song3', 2, 2)])
+        # Playlist1 holds two Jazz songs out of three.
+        self.assertEqual(list(Playlist.select(Playlist.name, Playlist.genre_id)
+                                      .tuples()),
+                         [('Playlist1', 2), ('Playlist2', None)])
+        self.assertEqual(dict(Singer.select(Singer.id,
+                                            Singer.inferred_genre_id)
+                                    .tuples()),
+                         {1: 2, 2: 2})
+        self.assertEqual(check_playlist_genre_counts(), [])
+        self.assertEqual(check_singer_genre_counts(), [])
+
+    def test_import_catalog_resume(self):
+        songs_source = f"songs:{os.path.abspath(self.paths_by_kind['songs'])}"
+        import_catalog({'genres': self.paths_by_kind['genres'],
+                        'singers': self.paths_by_kind['singers']})
+        # As if an import of the songs was interrupted after two of them.
+        ImportCheckpoint.create(source=songs_source, records=2)
+
+        reports, _ = import_catalog(self.paths_by_kind, chunk_size=2)
+
+        self.assertEqual(reports[2]['records_resumed'], 2)
+        self.assertEqual(reports[2]['records_read'], 2)
+        self.assertEqual([title for title, in Song.select(Song.title)
+                                                  .tuples()],
+                         ['Song3'])
+
+        # Every file is done: importing them again changes nothing.
+        reports, _ = import_catalog(self.paths_by_kind)
+
+        self.assertEqual([report['records_read'] for report in reports],
+                         [0, 0, 0, 0, 0])
+        self.assertEqual(SongToPlaylist.select().count(), 1)
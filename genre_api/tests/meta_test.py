@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from peewee import OperationalError
+from genre_api.models.meta import (
+    HealthCheckedPooledSqliteDatabase, ReadWriteSqliteDatabase, PRAGMAS, READ)
+
+
+class TestPooledDatabase(unittest.TestCase):
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database = HealthCheckedPooledSqliteDatabase(
+            os.path.join(self.database_dir.name, 'test.db'), pragmas=PRAGMAS,
+            max_connections=2, stale_timeout=300, check_same_thread=False)
+
+    def tearDown(self):
+        self.database.close_all()
+        self.database_dir.cleanup()
+
+    def test_connection_reused(self):
+        self.database.connect()
+        connection = self.database.connection()
+        self.database.close()
+
+        self.database.connect()
+
+        self.assertIs(self.database.connection(), connection)
+        # Pragmas are kept by the reused connection.
+        self.assertEqual(self.database.journal_mode, 'wal')
+
+    def test_broken_connection_replaced(self):
+        self.database.connect()
+        connection = self.database.connection()
+        self.database.close()
+        connection.close()
+
+        self.database.connect()
+
+        self.assertIsNot(self.database.connection(), connection)
+        self.assertEqual(
+            self.database.execute_sql('SELECT 1').fetchone(), (1,))
+
+    def test_transaction_rolled_back_on_return(self):
+        self.database.connect()
+        self.database.execute_sql('CREATE TABLE item (id INTEGER)')
+        connection = self.database.connection()
+        connection.execute('BEGIN')
+        connection.execute('INSERT INTO item VALUES (1)')
+        self.database.close()
+
+        self.database.connect()
+
+        self.assertEqual(
+            self.database.execute_sql('SELECT COUNT(*) FROM item').fetchone(),
+            (0,))
+
+    def test_stale_connection_recycled(self):
+        self.database.connect()
+        connection = self.database.connection()
+        self.database.close()
+        self.database._stale_timeout = -1
+
+        self.database.connect()
+
+        self.assertIsNot(self.database.connection(), connection)
+
+
+class TestReadWriteDatabase(unittest.TestCase):
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database = ReadWriteSqliteDatabase(
+            os.path.join(self.database_dir.name, 'test.db'), pragmas=PRAGMAS,
+            max_connections=4, timeout=5, check_same_thread=False)
+        with self.database.connection_context():
+            self.database.execute_sql('CREATE TABLE item (id INTEGER)')
+
+    def tearDown(self):
+        self.database.close_all()
+        self.database_dir.cleanup()
+
+    def count_items(self):
+        self.database.role = READ
+        with self.database.connection_context():
+            return self.database.execute_sql(
+                'SELECT COUNT(*) FROM item').fetchone()[0]
+
+    def test_read_connection_is_read_only(self):
+        self.database.role = READ
+        with self.database.connection_context():
+            with self.assertRaises(OperationalError):
+                self.database.execute_sql('INSERT INTO item VALUES (1)')
+
+    def test_read_during_write_transaction(self):
+        write_started = threading.Event()
+        read_done = threading.Event()
+
+        def write():
+            with self.database.connection_context():
+                with self.database.atomic():
+                    self.database.execute_sql('INSERT INTO item VALUES (1)')
+                    write_started.set()
+                    read_done.wait(5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        write_started.wait(5)
+
+        start_time = time.perf_counter()
+        # Reads see the last commit without waiting for the writer.
+        self.assertEqual(self.count_items(), 0)
+        self.assertLess(time.perf_counter() - start_time, 1)
+
+        read_done.set()
+        writer.join()
+        self.assertEqual(self.count_items(), 1)
+
+    def test_writers_queue_on_writer_connection(self):
+        first_connected = threading.Event()
+
+        def write_slowly():
+            with self.database.connection_context():
+                first_connected.set()
+                time.sleep(0.2)
+                self.database.execute_sql('INSERT INTO item VALUES (1)')
+
+        writer = threading.Thread(target=write_slowly)
+        writer.start()
+        first_connected.wait(5)
+        with self.database.connection_context():
+            self.database.execute_sql('INSERT INTO item VALUES (2)')
+        writer.join()
+
+        lock_waits = {wait['lock']: wait
+                      for wait in self.database.lock_waits.stats()}
+        # The table creation of setUp was the first writer.
+        self.assertEqual(lock_waits['writer_connection']['count'], 3)
+        self.assertGreater(lock_waits['writer_connection']['max_seconds'],
+                           0.1)
+        self.assertEqual(self.count_items(), 2)
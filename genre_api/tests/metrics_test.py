@@ -0,0 +1,112 @@
+import unittest
+import pytest
+import multiprocessing
+import os
+import tempfile
+from unittest import mock
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.table_version import TableVersion
+from genre_api.routes import metrics as metrics_module
+from genre_api.routes.metrics import Metrics
+
+MODELS = [Genre, TableVersion]
+
+
+def parse_metrics(text):
+    """
+    Get the samples of a Prometheus text exposition, by sample line without
+    value.
+    """
+    samples = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+
+    return samples
+
+
+@pytest.mark.usefixtures('app_class')
+class TestMetricsRoute(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+
+        metrics_patch = mock.patch.object(metrics_module, 'metrics',
+                                          Metrics(buckets=[0.1, 10]))
+        metrics_patch.start()
+        self.addCleanup(metrics_patch.stop)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def test_get_metrics(self):
+        for genre_id in [1, 1, 2]:
+            self.client.get(f'/genres/{genre_id}')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type,
+                         'text/plain; version=0.0.4; charset=utf-8')
+        samples = parse_metrics(response.get_data(as_text=True))
+        labels = 'route="/genres/<genre_id>",method="GET"'
+        self.assertEqual(
+            samples[f'genre_api_requests_total{{{labels},status="200"}}'], 2)
+        self.assertEqual(
+            samples[f'genre_api_requests_total{{{labels},status="404"}}'], 1)
+        self.assertEqual(samples['genre_api_request_duration_seconds_bucket'
+                                 f'{{{labels},le="+Inf"}}'], 3)
+        self.assertEqual(samples['genre_api_request_duration_seconds_count'
+                                 f'{{{labels}}}'], 3)
+        self.assertGreater(samples['genre_api_request_duration_seconds_sum'
+                                   f'{{{labels}}}'], 0)
+        self.assertEqual(samples['genre_api_requests_in_flight'
+                                 f'{{{labels}}}'], 0)
+        # The metrics request itself is being handled.
+        self.assertEqual(samples['genre_api_requests_in_flight'
+                                 '{route="/metrics",method="GET"}'], 1)
+
+
+class TestMetricsProcesses(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.metrics = Metrics(self.directory.name, buckets=[0.1, 10])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record_requests(self):
+        self.metrics.request_started('/genres', 'GET')
+        self.metrics.request_started('/genres', 'GET')
+        self.metrics.request_finished('/genres', 'GET', 200, 0.5)
+
+    def test_aggregate_processes(self):
+        process = multiprocessing.get_context('fork')\
+                                 .Process(target=self.record_requests)
+        process.start()
+        process.join()
+        self.record_requests()
+
+        samples = parse_metrics(self.metrics.render())
+
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+        labels = 'route="/genres",method="GET"'
+        self.assertEqual(
+            samples[f'genre_api_requests_total{{{labels},status="200"}}'], 2)
+        self.assertEqual([samples['genre_api_request_duration_seconds_bucket'
+                                  f'{{{labels},le="{bound}"}}']
+                          for bound in ['0.1', '10', '+Inf']],
+                         [0, 2, 2])
+        self.assertEqual(samples['genre_api_request_duration_seconds_sum'
+                                 f'{{{labels}}}'], 1)
+        # The in-flight request of the exited process is left out.
+        self.assertEqual(samples['genre_api_requests_in_flight'
+                                 f'{{{labels}}}'], 1)
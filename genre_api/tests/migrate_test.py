@@ -0,0 +1,177 @@
+import unittest
+import pytest
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
+from genre_api.scripts.migrate import (
+    migrate, get_schema_version, MIGRATIONS)
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+class RecordingDatabase(SqliteDatabase):
+    """
+    Database recording the statements it executes.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = []
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        self.statements.append((sql, params))
+        return super().execute_sql(sql, params, *args, **kwargs)
+
+
+class TestMigrate(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        # The schema before the first migration.
+        for sql in [
+                'DROP INDEX songtoplaylist_playlist_id_song_id',
+                'DROP INDEX songtoplaylist_song_id_playlist_id',
+                'DROP INDEX song_singer_id_id',
+                'CREATE INDEX songtoplaylist_song_id '
+                'ON songtoplaylist (song_id)',
+                'CREATE INDEX songtoplaylist_playlist_id '
+                'ON songtoplaylist (playlist_id)',
+                'CREATE INDEX song_singer_id ON song (singer_id)']:
+            self.database.execute_sql(sql)
+
+        for name in ['Genre1', 'Genre2']:
+            Genre.create(name=name)
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Song.create(title='Song2', singer_id=1, genre_id=2)
+        Playlist.create(name='Playlist1', genre_id=None)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def get_indexes(self, table_name):
+        return sorted(index.name
+                      for index in self.database.get_indexes(table_name))
+
+    def test_migrate(self):
+        # Song1 was added twice: it counts twice, making Genre1 win.
+        for song_id in [1, 2, 1]:
+            SongToPlaylist.create(song_id=song_id, playlist_id=1)
+        check_playlist_genre_counts(repair=True)
+        check_singer_genre_counts(repair=True)
+        self.assertEqual(Playlist.get_by_id(1).genre_id_id, 1)
+
+        applied = migrate(self.database)
+
+        self.assertEqual(applied, [migration.__name__
+                                   for migration in MIGRATIONS])
+        self.assertEqual(get_schema_version(self.database), len(MIGRATIONS))
+        self.assertEqual(list(SongToPlaylist.select(SongToPlaylist.id)
+                                            .tuples()),
+                         [(1,), (2,)])
+        self.assertEqual(self.get_indexes('songtoplaylist'),
+                         ['songtoplaylist_playlist_id_song_id',
+                          'songtoplaylist_song_id_playlist_id'])
+        self.assertEqual(self.get_indexes('song'),
+                         ['song_genre_id', 'song_singer_id_id',
+                          'song_title'])
+        self.assertEqual(sorted(PlaylistGenreCount.select(
+            PlaylistGenreCount.genre_id, PlaylistGenreCount.song_count)
+            .tuples()), [(1, 1), (2, 1)])
+        self.assertEqual(check_playlist_genre_counts(), [])
+        self.assertEqual(check_singer_genre_counts(), [])
+
+        self.assertEqual(migrate(self.database), [])
+
+    def test_migrate_table_version_without_updated_at(self):
+        for song_id in [1, 2, 1]:
+            SongToPlaylist.create(song_id=song_id, playlist_id=1)
+        check_playlist_genre_counts(repair=True)
+        check_singer_genre_counts(repair=True)
+        # The table versions before updated_at.
+        self.database.execute_sql('DROP TABLE tableversion')
+        self.database.execute_sql(
+            'CREATE TABLE tableversion (table_name VARCHAR(255) NOT NULL '
+            'PRIMARY KEY, version INTEGER NOT NULL)')
+
+        applied = migrate(self.database)
+
+        self.assertEqual(applied, [migration.__name__
+                                   for migration in MIGRATIONS])
+        self.assertIn('updated_at',
+                      [column.name for column
+                       in self.database.get_columns('tableversion')])
+        # The deduplication bumped the memberships' version.
+        self.assertEqual(TableVersion.get_version(SongToPlaylist), 1)
+        self.assertIsNotNone(TableVersion.get_versions([SongToPlaylist])
+                             ['songtoplaylist'][1])
+
+
+@pytest.mark.usefixtures('app_class')
+class TestRelationshipQueryPlans(unittest.TestCase):
+    database = RecordingDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Playlist.create(name='Playlist1', genre_id=1)
+        SongToPlaylist.create(song_id=1, playlist_id=1)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def get_query_plans(self, url):
+        """
+        Get the query plan of every statement run by a GET of url, but the
+        table version reads.
+        """
+        self.database.statements = []
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        for sql, params in self.database.statements:
+            if 'tableversion' in sql:
+                continue
+            cursor = self.database.connection().execute(
+                f'EXPLAIN QUERY PLAN {sql}', params or ())
+            plans.append('\n'.join(row[3] for row in cursor))
+
+        return '\n'.join(plans)
+
+    def test_relationship_query_plans(self):
+        expected_indexes = {
+            '/singers/1/songs': ['song_singer_id_id'],
+            '/singers/1/playlists': ['song_singer_id_id',
+                                     'songtoplaylist_song_id_playlist_id'],
+            '/songs/1/playlists': ['songtoplaylist_song_id_playlist_id'],
+            '/playlists/1/songs': ['songtoplaylist_playlist_id_song_id'],
+            '/playlists/1/singers': ['songtoplaylist_playlist_id_song_id']
+        }
+        for url, index_names in expected_indexes.items():
+            plans = self.get_query_plans(url)
+
+            for index_name in index_names:
+                self.assertIn(f'INDEX {index_name} ', plans, url)
+            self.assertNotIn('SCAN', plans, url)
+            # Semi-joins select every row once, in primary key order.
+            self.assertNotIn('TEMP B-TREE', plans, url)
@@ -0,0 +1,76 @@
+import unittest
+import pytest
+import json
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.check_genre_counts import check_playlist_genre_counts
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestPlaylistGenreCount(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        for name in ['Genre1', 'Genre2', 'Genre3']:
+            Genre.create(name=name)
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        for genre_id in [3, 2, 3, 2, 1]:
+            Song.create(title=f'Song{genre_id}', singer_id=1,
+                        genre_id=genre_id)
+        Playlist.create(name='Playlist1', genre_id=None)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def add_songs(self, song_ids):
+        return self.client.post(
+            '/playlists/1/songs',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'song_ids': song_ids}))
+
+    def get_playlist_genre(self):
+        return self.client.get('/playlists/1').json['genre_id']
+
+    def get_counts(self):
+        return sorted(PlaylistGenreCount.select(PlaylistGenreCount.genre_id,
+                                                PlaylistGenreCount.song_count)
+                                        .tuples())
+
+    def test_add_songs_to_playlist(self):
+        self.add_songs([1, 2])
+        # Genre2 and Genre3 are tied: the lowest genre id wins.
+        self.assertEqual(self.get_playlist_genre(), 2)
+
+        self.add_songs([3, 5])
+        self.assertEqual(self.get_playlist_genre(), 3)
+        self.assertEqual(self.get_counts(), [(1, 1), (2, 1), (3, 2)])
+
+        self.add_songs([4, 2])
+        self.assertEqual(self.get_playlist_genre(), 2)
+        self.assertEqual(check_playlist_genre_counts(), [])
+
+    def test_check_playlist_genre_counts_repair(self):
+        SongToPlaylist.create(song_id=1, playlist_id=1)
+        SongToPlaylist.create(song_id=3, playlist_id=1)
+
+        differences = check_playlist_genre_counts(repair=True)
+
+        self.assertEqual(differences, [((1, 3), None, 2)])
+        self.assertEqual(self.get_counts(), [(3, 2)])
+        self.assertEqual(self.get_playlist_genre(), 3)
+        self.assertEqual(check_playlist_genre_counts(), [])
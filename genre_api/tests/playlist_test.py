@@ -1,14 +1,22 @@
 import unittest
 import pytest
 import json
+from unittest import mock
 from peewee import SqliteDatabase
 from genre_api.models.genre import Genre
 from genre_api.models.singer import Singer
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.models.group_commit import run_write
+from genre_api.scripts.check_genre_counts import (
+    check_playlist_genre_counts, check_singer_genre_counts)
 
-MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist]
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
 
 
 @pytest.mark.usefixtures('app_class')
@@ -158,3 +166,159 @@ class TestPlaylist(unittest.TestCase):
             data=body)
 
         self.assertEqual(response.status_code, 200)
+
+    def test_get_songs_in_playlist_pages(self):
+        body = json.dumps({
+            'name': 'Genre1'
+            })
+        self.client.post(
+            '/genres',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        body = json.dumps({
+            'name': 'Singer1',
+            'genre_id': 1
+            })
+        self.client.post(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        for title in ['Song1', 'Song2', 'Song3']:
+            self.client.post(
+                '/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({
+                    'title': title,
+                    'singer_id': 1,
+                    'genre_id': 1
+                    }))
+
+        body = json.dumps({
+            'name': 'Playlist1'
+            })
+        self.client.post(
+            '/playlists',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        body = json.dumps({
+            'song_ids': [3, 1, 2]
+            })
+        self.client.post(
+            '/playlists/1/songs',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        song_ids = []
+        url = '/playlists/1/songs?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            song_ids.extend(song['id'] for song in response.json)
+            url = response.headers.get('Link', '').split(';')[0].strip('<>')
+
+        self.assertEqual(song_ids, [1, 2, 3])
+
+    def test_post_song_to_playlist_concurrent(self):
+        Genre.create(name='Genre1')
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        for title in ['Song1', 'Song2']:
+            Song.create(title=title, singer_id=1, genre_id=1)
+        Playlist.create(name='Playlist1', genre_id=None)
+
+        def post_songs(song_ids):
+            return self.client.post(
+                '/playlists/1/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'song_ids': song_ids}))
+
+        def run_write_after_other_request(database, function, *args):
+            # Another request adds a song and renames the playlist between
+            # this request's reads and its write.
+            if not write_calls:
+                write_calls.append(function)
+                post_songs([2])
+                self.client.put(
+                    '/playlists/1',
+                    headers={'Content-Type': 'application/json'},
+                    data=json.dumps({'name': 'Renamed', 'genre_id': 1}))
+            return run_write(database, function, *args)
+
+        write_calls = []
+        with mock.patch('genre_api.routes.playlist.run_write',
+                        run_write_after_other_request):
+            response = post_songs([1])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(check_playlist_genre_counts(), [])
+        self.assertEqual(check_singer_genre_counts(), [])
+        self.assertEqual(list(Playlist.select(Playlist.name, Playlist.genre_id)
+                                      .tuples()),
+                         [('Renamed', 1)])
+
+    def test_post_song_to_playlist_404(self):
+        body = json.dumps({
+            'name': 'Genre1'
+            })
+        self.client.post(
+            '/genres',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        body = json.dumps({
+            'name': 'Singer1',
+            'genre_id': 1
+            })
+        self.client.post(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        for title in ['Song1', 'Song2']:
+            self.client.post(
+                '/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({
+                    'title': title,
+                    'singer_id': 1,
+                    'genre_id': 1
+                    }))
+
+        body = json.dumps({
+            'name': 'Playlist1'
+            })
+        self.client.post(
+            '/playlists',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        body = json.dumps({
+            'song_ids': [2, 5, 1, 4, 5]
+            })
+        response = self.client.post(
+            '/playlists/1/songs',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['missing_song_ids'], [5, 4])
+
+        body = json.dumps({
+            'song_ids': [2, 1]
+            })
+        response = self.client.post(
+            '/playlists/1/songs',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([song['id'] for song in response.json], [2, 1])
+
+        response = self.client.post(
+            '/playlists/2/songs',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        self.assertEqual(response.status_code, 404)
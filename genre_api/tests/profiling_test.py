@@ -0,0 +1,98 @@
+import unittest
+import os
+import pstats
+import tempfile
+from unittest import mock
+from peewee import SqliteDatabase
+from genre_api.api import create_app, create_api, create_routes
+from genre_api.models.genre import Genre
+from genre_api.models.table_version import TableVersion
+from genre_api.routes import profiling
+
+MODELS = [Genre, TableVersion]
+
+
+class TestProfiling(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def create_client(self):
+        app = create_app()
+        create_routes(create_api(app))
+        return app.test_client()
+
+    def test_profile_disabled(self):
+        with mock.patch.dict(profiling.PROFILING_CONFIG, {'enabled': False}):
+            client = self.create_client()
+            response = client.get('/genres', headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-File', response.headers)
+        # No hook runs.
+        self.assertNotIn(profiling.start_profile,
+                         client.application.before_request_funcs.get(None,
+                                                                     []))
+
+    def test_profile_without_token_disabled(self):
+        with mock.patch.dict(profiling.PROFILING_CONFIG,
+                             {'enabled': True, 'token': None}), \
+                self.assertLogs(level='WARNING'):
+            client = self.create_client()
+            response = client.get('/genres', headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-File', response.headers)
+        self.assertNotIn(profiling.start_profile,
+                         client.application.before_request_funcs.get(None,
+                                                                     []))
+
+    def test_profile_to_file(self):
+        with mock.patch.dict(profiling.PROFILING_CONFIG,
+                             {'enabled': True, 'token': 'secret',
+                              'directory': self.directory.name}):
+            client = self.create_client()
+            unprofiled = client.get('/genres/1',
+                                    headers={'X-Profile': 'wrong'})
+            response = client.get('/genres/1',
+                                  headers={'X-Profile': 'secret'})
+
+        self.assertNotIn('X-Profile-File', unprofiled.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['name'], 'Genre1')
+        file_name = response.headers['X-Profile-File']
+        self.assertRegex(file_name,
+                         r'^\d{8}T[\d.]+Z-GET-genres_genre_id\.prof$')
+        self.assertEqual(os.listdir(self.directory.name), [file_name])
+        stats = pstats.Stats(os.path.join(self.directory.name, file_name))
+        self.assertTrue(any(function_name == 'get' and 'genre' in path
+                            for path, _, function_name in stats.stats))
+
+    def test_profile_inline(self):
+        with mock.patch.dict(profiling.PROFILING_CONFIG,
+                             {'enabled': True, 'token': 'secret',
+                              'tracemalloc': True}):
+            client = self.create_client()
+            response = client.get('/genres/1',
+                                  headers={'X-Profile': 'secret',
+                                           'X-Profile-Output': 'inline'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, 'text/plain; charset=utf-8')
+        self.assertNotIn('ETag', response.headers)
+        summary = response.get_data(as_text=True)
+        self.assertIn('function calls', summary)
+        self.assertIn('Memory allocated by line:', summary)
+        self.assertFalse(profiling.profiling_lock.locked())
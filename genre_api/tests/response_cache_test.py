@@ -0,0 +1,185 @@
+import os
+import tempfile
+import time
+import unittest
+import pytest
+import json
+from unittest import mock
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.routes import response_cache
+from genre_api.routes.cache_backends import (
+    CachedResponse, MemoryCacheBackend, FileCacheBackend)
+from genre_api.scripts.calc_inferred_genre import calc_inferred_genre_engine
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestResponseCache(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+        for name in ['Singer1', 'Singer2']:
+            Singer.create(name=name, genre_id=1, inferred_genre_id=None)
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Song.create(title='Song2', singer_id=2, genre_id=1)
+        for name in ['Playlist1', 'Playlist2']:
+            Playlist.create(name=name, genre_id=None)
+
+        self.cache = response_cache.ResponseCache(
+            MemoryCacheBackend(1024 * 1024), ttl=60)
+        patcher = mock.patch.object(response_cache, 'response_cache',
+                                    self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def add_songs(self, playlist_id, song_ids):
+        return self.client.post(
+            f'/playlists/{playlist_id}/songs',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'song_ids': song_ids}))
+
+    def test_cached_response(self):
+        self.add_songs(1, [1])
+        response = self.client.get('/playlists/1/singers')
+
+        cached_response = self.client.get('/playlists/1/singers')
+
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(cached_response.data, response.data)
+        self.assertEqual(cached_response.headers['Content-Type'],
+                         'application/json')
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_add_songs_evicts_affected_keys(self):
+        self.add_songs(1, [1])
+        self.add_songs(2, [2])
+        for path in ['/playlists/1/singers', '/playlists/2/singers',
+                     '/songs/1/playlists', '/songs/2/playlists']:
+            self.client.get(path)
+
+        self.add_songs(1, [2])
+
+        response = self.client.get('/playlists/1/singers')
+        self.assertEqual([singer['id'] for singer in response.json], [1, 2])
+        response = self.client.get('/songs/2/playlists')
+        self.assertEqual([playlist['id'] for playlist in response.json],
+                         [1, 2])
+        self.assertEqual(self.cache.hits, 0)
+        # Neither Playlist2's singers nor Song1's playlists changed.
+        self.client.get('/playlists/2/singers')
+        self.client.get('/songs/1/playlists')
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_put_singer_evicts_listing_playlists(self):
+        self.add_songs(1, [1])
+        self.add_songs(2, [2])
+        self.client.get('/playlists/1/singers')
+        self.client.get('/playlists/2/singers')
+
+        self.client.put(
+            '/singers/1',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'name': 'Renamed', 'genre_id': 1,
+                             'inferred_genre_id': 1}))
+
+        response = self.client.get('/playlists/1/singers')
+        self.assertEqual(response.json[0]['name'], 'Renamed')
+        self.client.get('/playlists/2/singers')
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_script_write_evicts_listing_playlists(self):
+        self.add_songs(1, [1])
+        Singer.update(inferred_genre_id=None).where(Singer.id == 1).execute()
+        self.client.get('/playlists/1/singers')
+
+        calc_inferred_genre_engine()
+
+        response = self.client.get('/playlists/1/singers')
+        self.assertEqual(response.json[0]['inferred_genre_id'], 1)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_eviction_by_other_process_clears(self):
+        self.add_songs(1, [1])
+        self.client.get('/playlists/1/singers')
+        self.client.get('/songs/1/playlists')
+
+        # As done by the evictions of another worker process.
+        TableVersion.bump(response_cache.RESPONSE_CACHE_VERSION)
+
+        self.client.get('/songs/1/playlists')
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.evictions, 2)
+        self.client.get('/playlists/1/singers')
+        self.client.get('/songs/1/playlists')
+        self.assertEqual(self.cache.hits, 1)
+
+
+class TestCacheBackends(unittest.TestCase):
+    def test_memory_backend_lru(self):
+        backend = MemoryCacheBackend(max_size=10)
+        for tag in ['a', 'b']:
+            backend.set(tag, '', CachedResponse(200, [], b'12345'), 60, 0)
+        backend.get('a', '')
+
+        backend.set('c', '', CachedResponse(200, [], b'12345'), 60, 0)
+
+        self.assertIsNotNone(backend.get('a', ''))
+        self.assertIsNone(backend.get('b', ''))
+        self.assertEqual(backend.size(), 10)
+
+    def test_memory_backend_ttl_and_generation(self):
+        backend = MemoryCacheBackend(max_size=100)
+        backend.set('a', '', CachedResponse(200, [], b'1'), -1, 0)
+        self.assertIsNone(backend.get('a', ''))
+
+        generation = backend.generation()
+        backend.evict(['b'])
+        backend.set('b', '', CachedResponse(200, [], b'1'), 60, generation)
+        # Stored after an eviction it may predate: dropped.
+        self.assertIsNone(backend.get('b', ''))
+
+    def test_memory_backend_clear(self):
+        backend = MemoryCacheBackend(max_size=100)
+        generation = backend.generation()
+        backend.set('a', '', CachedResponse(200, [], b'1'), 60, generation)
+
+        self.assertEqual(backend.clear(), 1)
+        backend.set('b', '', CachedResponse(200, [], b'1'), 60, generation)
+        self.assertIsNone(backend.get('a', ''))
+        self.assertIsNone(backend.get('b', ''))
+        self.assertEqual(backend.size(), 0)
+
+    def test_file_backend_shared(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'cache.db')
+            worker1 = FileCacheBackend(cache_file, max_size=100)
+            worker2 = FileCacheBackend(cache_file, max_size=100)
+            response = CachedResponse(
+                200, [['Content-Type', 'application/json']], b'[]\n')
+
+            worker1.set('a', 'q', response, 60, worker1.generation())
+
+            self.assertEqual(worker2.get('a', 'q'), response)
+            self.assertEqual(worker2.evict(['a']), 1)
+            self.assertIsNone(worker1.get('a', 'q'))
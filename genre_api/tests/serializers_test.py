@@ -0,0 +1,50 @@
+import unittest
+import json
+from flask_restful import fields as flask_fields, marshal
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.routes.serializers import Serializer, get_serializer
+
+
+class TestSerializers(unittest.TestCase):
+    def assert_same_as_marshal(self, resource_fields, rows):
+        serializer = Serializer(resource_fields)
+        for row in rows:
+            self.assertEqual(serializer.to_json(row),
+                             json.dumps(marshal(row, resource_fields)))
+            self.assertEqual(serializer.to_dict(row),
+                             dict(marshal(row, resource_fields)))
+        self.assertEqual(
+            serializer.dumps(rows),
+            json.dumps(marshal(rows, resource_fields)) + '\n')
+
+    def test_model_serializers(self):
+        rows = [{
+            'id': 1,
+            'name': 'Name "1"\n',
+            'title': 'Titre é',
+            'singer_id': None,
+            'genre_id': '2',
+            'inferred_genre_id': 3
+            },
+            {
+            'id': 2,
+            'name': None
+            }]
+        for model in [Genre, Singer, Song, Playlist]:
+            self.assert_same_as_marshal(model.resource_fields, rows)
+
+    def test_other_fields(self):
+        resource_fields = {
+            'song_ids': flask_fields.List(flask_fields.Integer()),
+            'label': flask_fields.String(attribute='name'),
+            'count': flask_fields.Integer(default=None)
+        }
+        rows = [{'song_ids': [1, '2'], 'name': 5}, {}]
+        self.assert_same_as_marshal(resource_fields, rows)
+
+    def test_get_serializer(self):
+        self.assertIs(get_serializer(Song.resource_fields),
+                      get_serializer(Song.resource_fields))
@@ -0,0 +1,74 @@
+import unittest
+import pytest
+import json
+import re
+from unittest import mock
+from genre_api.models.meta import TimedSqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.routes import server_timing
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestServerTiming(unittest.TestCase):
+    database = TimedSqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        Playlist.create(name='Playlist1', genre_id=None)
+        Song.insert_many([('Song', 1, 1)] * 200,
+                         fields=[Song.title, Song.singer_id, Song.genre_id])\
+            .execute()
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def get_query_count(self, response):
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[0-9.]+;desc="\d+ queries", '
+                                 r'serialize;dur=[0-9.]+$')
+        return int(re.search(r'(\d+) queries', timing).group(1))
+
+    def test_server_timing(self):
+        response = self.client.get('/songs/1')
+
+        self.assertEqual(response.status_code, 200)
+        # The table version and the song.
+        self.assertEqual(self.get_query_count(response), 2)
+
+    def test_add_songs_query_count(self):
+        # The statements do not grow with the number of songs added, once the
+        # playlist's genre counts exist.
+        query_counts = []
+        for song_ids in [[1], [2], list(range(3, 201))]:
+            response = self.client.post(
+                '/playlists/1/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'song_ids': song_ids}))
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(self.get_query_count(response))
+
+        self.assertEqual(query_counts[1], query_counts[2])
+
+    def test_query_budget(self):
+        with mock.patch.object(server_timing, 'QUERY_BUDGET', 1), \
+                self.assertLogs(level='WARNING') as logs:
+            self.client.get('/songs/1')
+
+        self.assertIn('GET /songs/1? ran 2 statements', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
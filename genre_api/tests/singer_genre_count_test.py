@@ -0,0 +1,98 @@
+import unittest
+import pytest
+import json
+from peewee import SqliteDatabase
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.check_genre_counts import check_singer_genre_counts
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestSingerGenreCount(unittest.TestCase):
+    database = SqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        for name in ['Genre1', 'Genre2']:
+            Genre.create(name=name)
+        for name in ['Singer1', 'Singer2']:
+            Singer.create(name=name, genre_id=1, inferred_genre_id=None)
+        Song.create(title='Song1', singer_id=1, genre_id=1)
+        Song.create(title='Song2', singer_id=1, genre_id=1)
+        Song.create(title='Song3', singer_id=2, genre_id=2)
+        for name in ['Playlist1', 'Playlist2']:
+            Playlist.create(name=name, genre_id=None)
+
+    def tearDown(self):
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def add_songs(self, playlist_id, song_ids):
+        return self.client.post(
+            f'/playlists/{playlist_id}/songs',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'song_ids': song_ids}))
+
+    def get_counts(self):
+        return sorted(SingerGenreCount.select(SingerGenreCount.singer_id,
+                                              SingerGenreCount.genre_id,
+                                              SingerGenreCount.playlist_count)
+                                      .tuples())
+
+    def get_inferred_genres(self):
+        return dict(Singer.select(Singer.id, Singer.inferred_genre_id)
+                          .tuples())
+
+    def test_add_songs_to_playlist(self):
+        self.add_songs(1, [1, 2])
+        self.add_songs(2, [1, 3])
+
+        self.assertEqual(self.get_counts(), [(1, 1, 2), (2, 1, 1)])
+        self.assertEqual(self.get_inferred_genres(), {1: 1, 2: 1})
+        self.assertEqual(check_singer_genre_counts(), [])
+
+    def test_add_songs_changing_playlist_genre(self):
+        Song.create(title='Song4', singer_id=2, genre_id=2)
+        self.add_songs(1, [1])
+        # Songs already in the playlist are not counted again.
+        self.add_songs(1, [3, 1, 4, 3])
+
+        # Playlist1 moves to Genre2, taking Singer1 along.
+        self.assertEqual(self.get_counts(), [(1, 2, 1), (2, 2, 1)])
+        self.assertEqual(self.get_inferred_genres(), {1: 2, 2: 2})
+        self.assertEqual(check_singer_genre_counts(), [])
+
+    def test_put_playlist_genre(self):
+        self.add_songs(1, [1, 3])
+        response = self.client.put(
+            '/playlists/1',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'name': 'Playlist1', 'genre_id': 2}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_counts(), [(1, 2, 1), (2, 2, 1)])
+        self.assertEqual(self.get_inferred_genres(), {1: 2, 2: 2})
+
+    def test_check_singer_genre_counts_repair(self):
+        self.add_songs(1, [1, 3])
+        SingerGenreCount.delete().where(SingerGenreCount.singer_id == 2)\
+                        .execute()
+        Singer.update(inferred_genre_id=None).execute()
+
+        differences = check_singer_genre_counts(repair=True)
+
+        self.assertEqual(differences, [((2, 1), None, 1)])
+        self.assertEqual(check_singer_genre_counts(), [])
+        self.assertEqual(self.get_inferred_genres(), {1: 1, 2: 1})
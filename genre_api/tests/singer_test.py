@@ -7,8 +7,12 @@ from genre_api.models.singer import Singer
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
 
-MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist]
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
 
 
 @pytest.mark.usefixtures('app_class')
@@ -156,3 +160,174 @@ class TestSinger(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, response_body)
+
+    def test_patch_singers_200(self):
+        body = [{
+            'name': 'Genre1'
+            },
+            {
+            'name': 'Genre2'
+            }]
+        for b in body:
+            self.client.post(
+                '/genres',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps(b))
+
+        body = [{
+            'name': 'Singer1',
+            'genre_id': 1
+            },
+            {
+            'name': 'Singer2',
+            'genre_id': 1
+            }]
+        for b in body:
+            self.client.post(
+                '/singers',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps(b))
+
+        body = json.dumps([{
+            'id': 1,
+            'inferred_genre_id': 2
+            },
+            {
+            'id': 2,
+            'name': 'Singer3',
+            'genre_id': 2
+            },
+            {
+            'id': 2,
+            'genre_id': 3
+            },
+            {
+            'id': 3,
+            'name': 'Singer4'
+            }])
+        response_body = [{
+            'id': 1,
+            'status': 200,
+            'message': 'Singer with ID 1 updated'
+            },
+            {
+            'id': 2,
+            'status': 200,
+            'message': 'Singer with ID 2 updated'
+            },
+            {
+            'id': 2,
+            'status': 404,
+            'message': 'Genre with ID 3 not found'
+            },
+            {
+            'id': 3,
+            'status': 404,
+            'message': 'Singer with ID 3 not found'
+            }]
+        response = self.client.patch(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, response_body)
+
+        response_body = [{
+            'id': 1,
+            'name': 'Singer1',
+            'genre_id': 1,
+            'inferred_genre_id': 2
+            },
+            {
+            'id': 2,
+            'name': 'Singer3',
+            'genre_id': 2,
+            'inferred_genre_id': 0
+            }]
+        response = self.client.get('/singers')
+
+        self.assertEqual(response.json, response_body)
+
+    def test_patch_singers_400(self):
+        body = json.dumps([{
+            'name': 'Singer1'
+            }])
+        response = self.client.patch(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_singers_bulk(self):
+        self.client.post(
+            '/genres/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Genre1'}, {'name': 'Genre2'}]))
+
+        response = self.client.post(
+            '/singers/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Singer1', 'genre_id': 2},
+                             {'name': 'Singer2', 'genre_id': 1}]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [
+            {'id': 1, 'name': 'Singer1', 'genre_id': 2,
+             'inferred_genre_id': 0},
+            {'id': 2, 'name': 'Singer2', 'genre_id': 1,
+             'inferred_genre_id': 0}
+        ])
+
+        response = self.client.post(
+            '/singers/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Singer3', 'genre_id': 1},
+                             {'name': 'Singer4', 'genre_id': 5},
+                             {'name': 'Singer5', 'genre_id': 3}]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['missing_genre_ids'], [5, 3])
+        self.assertEqual(Singer.select().count(), 2)
+
+    def test_get_singer_playlists(self):
+        self.client.post(
+            '/genres',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'name': 'Genre1'}))
+        self.client.post(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'name': 'Singer1', 'genre_id': 1}))
+
+        # A singer without songs is in no playlist.
+        response = self.client.get('/singers/1/playlists')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [])
+
+        for title in ['Song1', 'Song2']:
+            self.client.post(
+                '/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'title': title, 'singer_id': 1,
+                                 'genre_id': 1}))
+        for name in ['Playlist1', 'Playlist2']:
+            self.client.post(
+                '/playlists',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'name': name}))
+        for playlist_id, song_ids in [(2, [1, 2]), (1, [2])]:
+            self.client.post(
+                f'/playlists/{playlist_id}/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({'song_ids': song_ids}))
+
+        response = self.client.get('/singers/1/playlists')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([playlist['id'] for playlist in response.json],
+                         [1, 2])
+        self.assertEqual(self.client.get('/singers/2/playlists').status_code,
+                         404)
@@ -0,0 +1,89 @@
+import unittest
+import pytest
+import os
+import tempfile
+from genre_api.models.meta import TimedSqliteDatabase
+from genre_api.models.slow_query_log import SlowQueryLog
+from genre_api.models.genre import Genre
+from genre_api.models.singer import Singer
+from genre_api.models.song import Song
+from genre_api.models.playlist import Playlist
+from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
+from genre_api.scripts.slow_query_report import (
+    normalize_statement, read_slow_queries, aggregate_slow_queries)
+
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
+
+
+@pytest.mark.usefixtures('app_class')
+class TestSlowQueryLog(unittest.TestCase):
+    database = TimedSqliteDatabase(':memory:')
+
+    def setUp(self):
+        self.database.bind(MODELS, bind_refs=False, bind_backrefs=False)
+        self.database.connect()
+        self.database.create_tables(MODELS)
+
+        Genre.create(name='Genre1')
+        Singer.create(name='Singer1', genre_id=1, inferred_genre_id=None)
+        for title in ['Song1', 'Song2']:
+            Song.create(title=title, singer_id=1, genre_id=1)
+        Playlist.create(name='Playlist1', genre_id=1)
+        for song_id in [1, 2]:
+            SongToPlaylist.create(song_id=song_id, playlist_id=1)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.directory.name, 'slow_queries.log')
+        # Every statement is slow.
+        self.database.slow_query_log = SlowQueryLog(self.log_path, 0)
+
+    def tearDown(self):
+        for handler in self.database.slow_query_log.logger.handlers:
+            handler.close()
+        self.database.slow_query_log = None
+        self.directory.cleanup()
+        self.database.drop_tables(MODELS)
+        self.database.close()
+
+    def test_slow_query_log(self):
+        for _ in range(2):
+            response = self.client.get('/playlists/1/songs')
+            self.assertEqual(response.status_code, 200)
+
+        entries = [entry for entry in read_slow_queries([self.log_path])
+                   if 'songtoplaylist' in entry['sql']]
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['route'], '/playlists/<playlist_id>/songs')
+        self.assertEqual(entries[0]['method'], 'GET')
+        # The playlist id, and the page size plus one.
+        self.assertEqual(entries[0]['params'], [1, 101])
+        self.assertTrue(any('songtoplaylist_playlist_id_song_id' in line
+                            for line in entries[0]['plan']))
+
+        aggregates = aggregate_slow_queries(entries)
+
+        self.assertEqual(len(aggregates), 1)
+        self.assertEqual(aggregates[0]['count'], 2)
+        self.assertEqual(aggregates[0]['routes'],
+                         ['GET /playlists/<playlist_id>/songs'])
+        self.assertEqual(aggregates[0]['total_ms'],
+                         sum(entry['duration_ms'] for entry in entries))
+
+    def test_normalize_statement(self):
+        self.assertEqual(
+            normalize_statement('SELECT "id" FROM "song"\n'
+                                'WHERE ("id" IN (?, ?, ?)) LIMIT 10'),
+            'SELECT "id" FROM "song" WHERE ("id" IN (?, ...)) LIMIT ?')
+        self.assertEqual(normalize_statement("DELETE FROM genre "
+                                             "WHERE name = 'Rock'"),
+                         'DELETE FROM genre WHERE name = ?')
+        self.assertEqual(
+            normalize_statement('INSERT INTO "genre" ("id", "name") '
+                                'VALUES (?, ?), (?, ?)'),
+            normalize_statement('INSERT INTO "genre" ("id", "name") '
+                                'VALUES (?, ?)'))
@@ -7,8 +7,12 @@ from genre_api.models.singer import Singer
 from genre_api.models.song import Song
 from genre_api.models.playlist import Playlist
 from genre_api.models.song_to_playlist import SongToPlaylist
+from genre_api.models.singer_genre_count import SingerGenreCount
+from genre_api.models.playlist_genre_count import PlaylistGenreCount
+from genre_api.models.table_version import TableVersion
 
-MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist]
+MODELS = [Genre, Singer, Song, Playlist, SongToPlaylist, SingerGenreCount,
+          PlaylistGenreCount, TableVersion]
 
 
 @pytest.mark.usefixtures('app_class')
@@ -146,3 +150,96 @@ class TestSong(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, response_body)
+
+    def test_get_song_stream(self):
+        body = json.dumps({
+            'name': 'Genre1'
+            })
+        self.client.post(
+            '/genres',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        body = json.dumps({
+            'name': 'Singer1',
+            'genre_id': 1
+            })
+        self.client.post(
+            '/singers',
+            headers={'Content-Type': 'application/json'},
+            data=body)
+
+        for title in ['Song1', 'Song2', 'Song3']:
+            self.client.post(
+                '/songs',
+                headers={'Content-Type': 'application/json'},
+                data=json.dumps({
+                    'title': title,
+                    'singer_id': 1,
+                    'genre_id': 1
+                    }))
+
+        response = self.client.get('/songs')
+        streamed_response = self.client.get('/songs?stream=1&limit=1')
+
+        self.assertEqual(streamed_response.status_code, 200)
+        self.assertEqual(streamed_response.data, response.data)
+
+        response = self.client.get(
+            '/songs?after=aWQ6MQ==',
+            headers={'Accept': 'application/x-ndjson'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(
+            [json.loads(line) for line in response.data.splitlines()],
+            [{
+                'id': 2,
+                'title': 'Song2',
+                'singer_id': 1,
+                'genre_id': 1
+                },
+                {
+                'id': 3,
+                'title': 'Song3',
+                'singer_id': 1,
+                'genre_id': 1
+                }])
+
+    def test_get_song_stream_empty(self):
+        response = self.client.get('/songs?stream=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [])
+
+    def test_post_songs_bulk(self):
+        self.client.post(
+            '/genres/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Genre1'}]))
+        self.client.post(
+            '/singers/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'name': 'Singer1', 'genre_id': 1}]))
+
+        songs = [{'title': f'Song{index}', 'singer_id': 1, 'genre_id': 1}
+                 for index in range(1, 501)]
+        response = self.client.post(
+            '/songs/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps(songs))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [dict(song, id=index)
+                                         for index, song
+                                         in enumerate(songs, 1)])
+
+        response = self.client.post(
+            '/songs/bulk',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps([{'title': 'Song', 'singer_id': 2,
+                              'genre_id': 1}]))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['missing_singer_ids'], [2])
+        self.assertEqual(Song.select().count(), 500)